@@ -0,0 +1,136 @@
+# benchmarks/bench_import.py
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==============================================================================
+# Benchmark thời gian import `plot_templates`
+# Mỗi phép đo chạy trong một process Python MỚI (giống một lệnh CLI hay một
+# worker vừa được spawn), lặp lại `--repeat` lần và lấy trung vị.
+#
+#   python benchmarks/bench_import.py
+#   python benchmarks/bench_import.py --src /path/to/other/checkout/src   # so sánh
+#   python benchmarks/bench_import.py --importtime 15                     # module chậm nhất
+# ==============================================================================
+
+DEFAULT_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+HEAVY_MODULES = ('pandas', 'seaborn', 'scipy', 'sklearn', 'matplotlib.pyplot')
+
+# Các đoạn code được đo; {src} và {out} được thay khi chạy
+CASES = {
+    'import plot_templates': (
+        "import sys; sys.path.insert(0, {src!r})\n"
+        "import plot_templates\n"
+    ),
+    'import + dual-axis plot': (
+        "import sys; sys.path.insert(0, {src!r})\n"
+        "import matplotlib; matplotlib.use('Agg')\n"
+        "import plot_templates\n"
+        "plot_templates.plot_dual_axis([1, 2, 3], [1, 3, 2], 'a', 'C0', [2, 1, 3], 'b', 'C1',\n"
+        "                              'x', 't', {out!r})\n"
+    ),
+}
+# In ra các module nặng đã được nạp (dòng cuối stdout), để kiểm tra import lười
+_REPORT_MODULES = (
+    "import json\n"
+    "print(json.dumps([m for m in {heavy!r} if m in sys.modules]))\n"
+)
+
+
+def _run(code, python=sys.executable, extra_args=()):
+    """Chạy `code` trong process mới. Returns: (giây, stdout, stderr)."""
+    # Đo quanh cả subprocess: gồm cả thời gian khởi động interpreter
+    start = time.perf_counter()
+    proc = subprocess.run([python, *extra_args, '-c', code], capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark case failed:\n{proc.stderr}")
+    return elapsed, proc.stdout, proc.stderr
+
+
+def measure(src=DEFAULT_SRC, repeat=5, python=sys.executable):
+    """
+    Đo từng case trong `CASES`.
+
+    Args:
+        src (str, optional): Thư mục `src` cần đo. Mặc định là `src/` của repo này.
+        repeat (int, optional): Số lần chạy mỗi case. Mặc định là 5.
+        python (str, optional): Interpreter dùng để chạy. Mặc định là interpreter hiện tại.
+
+    Returns:
+        dict: {case: {'median_s', 'min_s', 'runs_s', 'heavy_modules'}}.
+    """
+    src = os.path.abspath(src)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'figure.pdf')
+        for name, template in CASES.items():
+            code = template.format(src=src, out=out) + _REPORT_MODULES.format(heavy=HEAVY_MODULES)
+            _run(code, python)  # Lần chạy "làm nóng" cache của hệ điều hành (không tính)
+            runs, loaded = [], []
+            for _ in range(repeat):
+                elapsed, stdout, _ = _run(code, python)
+                runs.append(elapsed)
+                loaded = json.loads(stdout.strip().splitlines()[-1])
+            results[name] = {
+                'median_s': statistics.median(runs),
+                'min_s': min(runs),
+                'runs_s': runs,
+                'heavy_modules': loaded,
+            }
+    return results
+
+
+def slowest_imports(src=DEFAULT_SRC, top=15, python=sys.executable):
+    """Các module có thời gian import tích lũy lớn nhất (theo `python -X importtime`)."""
+    code = CASES['import plot_templates'].format(src=os.path.abspath(src))
+    _, _, stderr = _run(code, python, extra_args=('-X', 'importtime'))
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def format_report(results):
+    lines = [f"{'case':<28} {'median':>9} {'min':>9}  heavy modules loaded"]
+    for name, r in results.items():
+        heavy = ', '.join(r['heavy_modules']) or '-'
+        lines.append(f"{name:<28} {r['median_s']:8.3f}s {r['min_s']:8.3f}s  {heavy}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold import time of plot_templates.')
+    parser.add_argument('--src', default=DEFAULT_SRC, help='src/ directory to benchmark (default: this checkout).')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh processes per case (median is reported).')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='Also list the N slowest imports (cumulative).')
+    parser.add_argument('--json', default=None, help='Optional path to write the results as JSON.')
+    args = parser.parse_args(argv)
+
+    results = measure(args.src, args.repeat)
+    print(format_report(results))
+
+    if args.importtime:
+        print("\nSlowest imports (cumulative):")
+        for cumulative, self_us, module in slowest_imports(args.src, args.importtime):
+            print(f"  {cumulative / 1e6:8.3f}s  (self {self_us / 1e6:.3f}s)  {module}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,390 @@
+# benchmarks/bench_templates.py
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# ==============================================================================
+# Benchmark các template trong plot_templates.py
+# Mỗi "case" là một template với dữ liệu tổng hợp ở một cỡ ('small', 'medium',
+# 'large'). Với mỗi case, đo:
+#   - draw_s:   từ lúc gọi template tới lúc figure sẵn sàng để lưu (chuẩn bị dữ liệu
+#               + tạo artist). Constrained layout được giải lúc lưu, nên tính vào save.
+#   - save:     thời gian và kích thước file cho từng định dạng (pdf, png, svg...).
+# Các thời gian lấy từ span của instrumentation.py (span gốc của template và giai
+# đoạn 'savefig'); mỗi định dạng là một lần gọi template riêng.
+#   - rss:      bộ nhớ đỉnh (peak RSS) của process và mức tăng so với trước khi vẽ.
+# Mỗi case chạy trong một process riêng để peak RSS không bị các case trước ảnh hưởng.
+#
+#   python benchmarks/bench_templates.py                       # small + medium, ghi JSON
+#   python benchmarks/bench_templates.py --sizes large --templates plot_heatmap
+#   python benchmarks/bench_templates.py compare old.json new.json   # so sánh hai lần chạy
+# ==============================================================================
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SIZES = ('small', 'medium', 'large')
+DEFAULT_FORMATS = ('pdf', 'png', 'svg')
+
+
+# ==============================================================================
+# Dữ liệu tổng hợp cho từng template
+# Mỗi hàm nhận `n` (cỡ dữ liệu) và một Generator, trả về kwargs cho template
+# (không gồm output_path).
+# ==============================================================================
+def _line_data(n, rng):
+    import pandas as pd
+    x = np.arange(n)
+    walks = np.cumsum(rng.normal(size=(3, n)), axis=1)
+    data = pd.DataFrame({'step': x, 'a': walks[0], 'b': walks[1], 'c': walks[2],
+                         'a_std': np.abs(rng.normal(1, 0.2, n))})
+    return dict(data=data, x_col='step', y_cols=['a', 'b', 'c'], y_labels=['A', 'B', 'C'],
+                x_label='Step', y_label='Value', title='Line', y_error_cols={'a': 'a_std'})
+
+
+def _grouped_bar_data(n, rng):
+    import pandas as pd
+    data = pd.DataFrame({'category': [f'cat {i}' for i in range(n)]})
+    for col in ('m1', 'm2', 'm3'):
+        data[col] = rng.uniform(60, 100, n)
+        data[f'{col}_err'] = rng.uniform(0.5, 2, n)
+    return dict(data=data, category_col='category', value_cols=['m1', 'm2', 'm3'],
+                value_labels=['M1', 'M2', 'M3'], error_cols=['m1_err', 'm2_err', 'm3_err'],
+                y_label='Score', title='Grouped bars')
+
+
+def _stacked_bar_data(n, rng):
+    import pandas as pd
+    n_components = max(3, min(30, n // 10))
+    components = [f'part {j}' for j in range(n_components)]
+    data = pd.DataFrame(rng.uniform(1, 10, (n, n_components)), columns=components)
+    data.insert(0, 'category', [f'cat {i}' for i in range(n)])
+    return dict(data=data, category_col='category', component_cols=components,
+                y_label='Time (ms)', title='Stacked bars')
+
+
+def _heatmap_data(n, rng):
+    labels = [f'f{i}' for i in range(n)]
+    return dict(matrix_data=rng.uniform(-1, 1, (n, n)), x_tick_labels=labels, y_tick_labels=labels,
+                y_label='Feature', x_label='Feature', title='Heatmap', value_format='.2f', cmap='RdBu_r')
+
+
+def _distribution_data(n, rng):
+    return dict(data=rng.normal(size=n), x_label='Value', title='Distribution')
+
+
+def _distribution_comparison_data(n, rng):
+    import pandas as pd
+    groups = np.repeat(['A', 'B', 'C', 'D'], n // 4)
+    values = rng.normal(size=len(groups)) + np.repeat(np.arange(4), n // 4)
+    data = pd.DataFrame({'group': groups, 'value': values})
+    return dict(data=data, x_col='group', y_col='value', y_label='Value', x_label='Group',
+                title='Violin')
+
+
+def _scattered(n, rng):
+    x, y = rng.uniform(-2, 2, n), rng.uniform(-2, 2, n)
+    return x, y, np.sin(x) * np.cos(y) + 0.05 * rng.normal(size=n)
+
+
+def _contour_data(n, rng):
+    x, y, z = _scattered(n, rng)
+    return dict(x_data=x, y_data=y, z_data=z, x_label='x', y_label='y', title='Contour', cbar_label='z')
+
+
+def _contour_grid_data(n, rng):
+    x, y, z = _scattered(n, rng)
+    fields = np.stack([z, z ** 2, np.abs(z), -z])
+    return dict(x_data=x, y_data=y, z_fields=fields, x_label='x', y_label='y',
+                titles=['z', 'z^2', '|z|', '-z'])
+
+
+def _tsne_data(n, rng):
+    centers = rng.normal(scale=5, size=(5, 50))
+    labels = rng.integers(0, 5, n)
+    features = centers[labels] + rng.normal(size=(n, 50))
+    return dict(features=features, labels=np.array([f'class {c}' for c in labels]), title='t-SNE')
+
+
+def _dual_axis_data(n, rng):
+    x = np.arange(n)
+    return dict(x_data=x, y1_data=np.cumsum(rng.normal(size=n)), y1_label='Loss', y1_color='C0',
+                y2_data=np.cumsum(rng.normal(size=n)), y2_label='Accuracy', y2_color='C1',
+                x_label='Step', title='Dual axis')
+
+
+def _clear_embedding_cache():
+    # Không để cache embedding trong bộ nhớ làm các lần lặp sau nhanh giả tạo
+    from embeddings import clear_embedding_cache
+    clear_embedding_cache()
+
+
+# template -> (hàm tạo dữ liệu, cỡ n cho small/medium/large, hàm reset trước mỗi lần chạy)
+CASES = {
+    'plot_line_comparison': (_line_data, (1_000, 100_000, 1_000_000), None),
+    'plot_grouped_bar_chart': (_grouped_bar_data, (5, 50, 300), None),
+    'plot_stacked_bar_chart': (_stacked_bar_data, (5, 50, 300), None),
+    'plot_heatmap': (_heatmap_data, (10, 60, 500), None),
+    'plot_distribution': (_distribution_data, (1_000, 100_000, 1_000_000), None),
+    'plot_distribution_comparison': (_distribution_comparison_data, (400, 10_000, 100_000), None),
+    'plot_contour': (_contour_data, (500, 10_000, 100_000), None),
+    'plot_contour_grid': (_contour_grid_data, (500, 10_000, 100_000), None),
+    'plot_tsne': (_tsne_data, (300, 1_000, 3_000), _clear_embedding_cache),
+    'plot_dual_axis': (_dual_axis_data, (100, 10_000, 1_000_000), None),
+}
+
+
+# ==============================================================================
+# Chạy một case (trong process con)
+# ==============================================================================
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(template_name, size, formats=DEFAULT_FORMATS, repeat=1, dpi=None, seed=0):
+    """
+    Đo một template ở một cỡ dữ liệu, trong process hiện tại.
+
+    Args:
+        template_name (str): Tên template trong `CASES`.
+        size (str): 'small', 'medium' hoặc 'large'.
+        formats (tuple, optional): Các định dạng lưu. Mặc định là ('pdf', 'png', 'svg').
+        repeat (int, optional): Số lần đo; kết quả là trung vị. Mặc định là 1.
+        dpi (float, optional): Ghi đè savefig.dpi (mặc định theo publication style: 600).
+        seed (int, optional): Seed cho dữ liệu tổng hợp.
+
+    Returns:
+        dict: Kết quả của case (xem mô tả ở đầu file).
+    """
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'src'))
+    import matplotlib
+    matplotlib.use('Agg')
+    from instrumentation import disable_instrumentation, enable_instrumentation
+    from publication_style import set_publication_style
+    import plot_templates
+
+    make_data, sizes, reset = CASES[template_name]
+    n = sizes[SIZES.index(size)]
+    template = getattr(plot_templates, template_name)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        set_publication_style()
+    if dpi is not None:
+        matplotlib.rcParams['savefig.dpi'] = dpi
+
+    # Thời gian vẽ / lưu lấy từ các giai đoạn do template tự ghi (xem instrumentation.py):
+    # span gốc mang tên template, giai đoạn 'savefig' gồm cả constrained layout.
+    tracer = enable_instrumentation()
+
+    def timed_call(kwargs, path):
+        tracer.clear()
+        template(**kwargs, output_path=path)
+        durations = {span.path: span.duration for span in tracer.spans}
+        save_s = durations[(template_name, 'savefig')]
+        return durations[(template_name,)] - save_s, save_s
+
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        try:
+            # Làm nóng: import lười (seaborn, scipy...) và font cache, trên dữ liệu cỡ nhỏ nhất
+            template(**make_data(sizes[0], np.random.default_rng(seed)),
+                     output_path=os.path.join(tmp, 'warmup.pdf'))
+            kwargs = make_data(n, rng)
+            runs = []
+            for _ in range(repeat):
+                # Mỗi định dạng được vẽ và lưu một lần riêng (như khi chỉ cần một file), nên
+                # thời gian lưu của mọi định dạng đều gồm cả giải constrained layout
+                run = {'draw_s': [], 'save': {}}
+                for fmt in formats:
+                    if reset is not None:
+                        reset()
+                    # Figure đã vẽ chỉ được giải phóng bởi GC vòng (cyclic GC): dọn trước mỗi lần
+                    # đo để peak RSS phản ánh một figure, không cộng dồn các lần chạy trước
+                    gc.collect()
+                    rss_before = rss_before if runs or run['save'] else _peak_rss_mb()
+                    path = os.path.join(tmp, f'{template_name}.{fmt}')
+                    draw_s, save_s = timed_call(kwargs, path)
+                    run['draw_s'].append(draw_s)
+                    run['save'][fmt] = {'seconds': save_s, 'bytes': os.path.getsize(path)}
+                runs.append(run)
+        finally:
+            disable_instrumentation()
+
+    peak = _peak_rss_mb()
+    return {
+        'template': template_name,
+        'size': size,
+        'n': n,
+        'repeat': repeat,
+        'draw_s': statistics.median(draw for r in runs for draw in r['draw_s']),
+        'save': {fmt: {'seconds': statistics.median(r['save'][fmt]['seconds'] for r in runs),
+                       'bytes': runs[-1]['save'][fmt]['bytes']} for fmt in formats},
+        'rss_peak_mb': peak,
+        'rss_growth_mb': peak - rss_before,
+    }
+
+
+def _run_isolated(template_name, size, formats, repeat, dpi):
+    """Chạy `run_case` trong một process Python mới và đọc kết quả JSON từ stdout."""
+    cmd = [sys.executable, os.path.abspath(__file__), '_case', template_name, size,
+           '--formats', ','.join(formats), '--repeat', str(repeat)]
+    if dpi is not None:
+        cmd += ['--dpi', str(dpi)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'template': template_name, 'size': size, 'error': proc.stderr.strip().splitlines()[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# ==============================================================================
+# Kết quả: ghi, in và so sánh
+# ==============================================================================
+def _metadata(formats, dpi):
+    import matplotlib
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'matplotlib': matplotlib.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'formats': list(formats),
+        'dpi': dpi,
+    }
+
+
+def format_row(r):
+    if 'error' in r:
+        return f"{r['template']:<30} {r['size']:<7} ERROR: {r['error']}"
+    saves = '  '.join(f"{fmt} {s['seconds']:6.2f}s {s['bytes'] / 1024:8.0f}KB" for fmt, s in r['save'].items())
+    return (f"{r['template']:<30} {r['size']:<7} n={r['n']:<9} draw {r['draw_s']:6.2f}s  {saves}  "
+            f"peak {r['rss_peak_mb']:6.0f}MB (+{r['rss_growth_mb']:.0f})")
+
+
+def _metrics(r):
+    """Các chỉ số so sánh được của một kết quả: {tên: giá trị}."""
+    values = {'draw_s': r['draw_s'], 'rss_peak_mb': r['rss_peak_mb']}
+    for fmt, s in r['save'].items():
+        values[f'save_{fmt}_s'] = s['seconds']
+        values[f'{fmt}_bytes'] = s['bytes']
+    return values
+
+
+def compare(old, new, threshold=0.10):
+    """
+    So sánh hai file kết quả.
+
+    Args:
+        old, new (dict): Nội dung JSON của hai lần chạy.
+        threshold (float, optional): Thay đổi tương đối tối thiểu để đánh dấu. Mặc định là 10%.
+
+    Returns:
+        tuple: (lines, n_regressions) - bảng so sánh dạng text và số chỉ số bị chậm/lớn hơn.
+    """
+    old_results = {(r['template'], r['size']): r for r in old['results'] if 'error' not in r}
+    lines = [f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}  "
+             f"(flag changes > {threshold:.0%})"]
+    regressions = 0
+    for r in new['results']:
+        key = (r['template'], r['size'])
+        if 'error' in r or key not in old_results:
+            continue
+        old_metrics, new_metrics = _metrics(old_results[key]), _metrics(r)
+        for name, value in new_metrics.items():
+            before = old_metrics.get(name)
+            if not before:
+                continue
+            change = value / before - 1
+            flag = ''
+            if change > threshold:
+                flag, regressions = '  <-- slower/larger', regressions + 1
+            elif change < -threshold:
+                flag = '  faster/smaller'
+            lines.append(f"{key[0]:<30} {key[1]:<7} {name:<14} {before:12.3f} -> {value:12.3f}  "
+                         f"{change:+7.1%}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+        parser.add_argument('old')
+        parser.add_argument('new')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative change to flag (default 0.10 = 10%%).')
+        args = parser.parse_args(argv[1:])
+        with open(args.old) as f_old, open(args.new) as f_new:
+            lines, regressions = compare(json.load(f_old), json.load(f_new), args.threshold)
+        print('\n'.join(lines))
+        print(f"{regressions} metric(s) regressed beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    if argv[:1] == ['_case']:
+        # Process con: chạy đúng một case và in kết quả JSON ở dòng cuối
+        parser = argparse.ArgumentParser()
+        parser.add_argument('template')
+        parser.add_argument('size')
+        parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS))
+        parser.add_argument('--repeat', type=int, default=1)
+        parser.add_argument('--dpi', type=float, default=None)
+        args = parser.parse_args(argv[1:])
+        result = run_case(args.template, args.size, tuple(args.formats.split(',')), args.repeat, args.dpi)
+        print(json.dumps(result))
+        return 0
+
+    parser = argparse.ArgumentParser(description='Benchmark every plot template over synthetic data.')
+    parser.add_argument('--templates', default=','.join(CASES),
+                        help='Comma-separated templates to run (default: all).')
+    parser.add_argument('--sizes', default='small,medium', help="Comma-separated sizes from 'small,medium,large'.")
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS), help='Comma-separated output formats.')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per case (median is reported).')
+    parser.add_argument('--dpi', type=float, default=None, help='Override savefig.dpi (publication style uses 600).')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Result JSON path (default: benchmarks/results/<commit>.json).')
+    args = parser.parse_args(argv)
+
+    templates, sizes = args.templates.split(','), args.sizes.split(',')
+    formats = tuple(args.formats.split(','))
+    for name in templates:
+        if name not in CASES:
+            parser.error(f"unknown template '{name}'")
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"unknown size '{size}'")
+
+    meta = _metadata(formats, args.dpi)
+    results = []
+    for name in templates:
+        for size in sizes:
+            result = _run_isolated(name, size, formats, args.repeat, args.dpi)
+            print(format_row(result), flush=True)
+            results.append(result)
+
+    output = args.output or os.path.join(REPO_ROOT, 'benchmarks', 'results', f"{meta['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"Results written to: {output}")
+    return 0 if all('error' not in r for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,8 +15,10 @@ sys.path.append(os.path.join(project_root, 'src'))
 
 # Import hàm và các biến màu từ module của chúng ta
 from publication_style import set_publication_style, CONTEXT_COLORS
+from render_log import enable_console_logging
 
 # Áp dụng style!
+enable_console_logging()  # In thông báo của thư viện (mặc định im lặng)
 set_publication_style(font_family='sans-serif') # Bạn có thể đổi thành 'serif' để thử
 
 # --- Tạo dữ liệu giả để vẽ ---
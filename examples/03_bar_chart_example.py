@@ -10,9 +10,11 @@ sys.path.append(os.path.join(project_root, 'src'))
 
 # Import các hàm cần thiết
 from publication_style import set_publication_style, CONTEXT_COLORS
+from render_log import enable_console_logging
 from plot_templates import plot_grouped_bar_chart
 
 # --- Bước 1: Thiết lập Style ---
+enable_console_logging()  # In thông báo của thư viện (mặc định im lặng)
 set_publication_style(font_family='sans-serif')
 
 # --- Bước 2: Chuẩn bị dữ liệu ---
@@ -12,10 +12,12 @@ sys.path.append(os.path.join(project_root, 'src'))
 
 # Import các hàm cần thiết
 from publication_style import set_publication_style, CONTEXT_COLORS
+from render_log import enable_console_logging
 from plot_templates import plot_distribution
 import matplotlib.pyplot as plt # Import thêm plt để vẽ so sánh
 
 # --- Bước 1: Thiết lập Style chung ---
+enable_console_logging()  # In thông báo của thư viện (mặc định im lặng)
 set_publication_style(font_family='sans-serif')
 
 # --- Bước 2: Tạo dữ liệu giả ---
@@ -11,9 +11,11 @@ sys.path.append(os.path.join(project_root, 'src'))
 
 # Import các hàm cần thiết
 from publication_style import set_publication_style, CONTEXT_COLORS
+from render_log import enable_console_logging
 from plot_templates import plot_line_comparison, plot_grouped_bar_chart
 
 # --- Bước 1: Thiết lập Style chung ---
+enable_console_logging()  # In thông báo của thư viện (mặc định im lặng)
 set_publication_style(font_family='sans-serif')
 
 # --- Ví dụ 1: Line Plot với dải lỗi (Training & Validation Curves) ---
@@ -13,9 +13,11 @@ sys.path.append(os.path.join(project_root, 'src'))
 
 # Import các hàm cần thiết
 from publication_style import set_publication_style, COLOR_PALETTE
+from render_log import enable_console_logging
 from plot_templates import plot_tsne
 
 # --- Bước 1: Thiết lập Style chung ---
+enable_console_logging()  # In thông báo của thư viện (mặc định im lặng)
 set_publication_style(font_family='sans-serif')
 
 # --- Bước 2: Tạo dữ liệu giả và các bộ đặc trưng "giả" ---
@@ -38,7 +40,8 @@ class_names = {0: 'Normal', 1: 'Congestion', 2: 'Handover', 3: 'Attack'}
 labels = pd.Series(labels_raw).map(class_names)
 
 # Phương pháp 1: Baseline (đặc trưng bị nhiễu, khó tách)
-noise = np.random.normal(0, 2.0, features_raw.shape)
+# Seed cố định: cùng dữ liệu ở mỗi lần chạy, nên embedding được lấy lại từ cache
+noise = np.random.default_rng(42).normal(0, 2.0, features_raw.shape)
 features_baseline = features_raw + noise
 
 # Phương pháp 2: SOTA (đặc trưng tốt hơn)
@@ -60,6 +63,8 @@ custom_palette = {
 }
 
 # --- Bước 4: Vẽ t-SNE cho từng phương pháp lên từng subplot ---
+# Embedding được cache trên đĩa: chạy lại script để chỉnh style sẽ không phải fit lại t-SNE
+embedding_cache = os.path.join(project_root, '.embedding_cache')
 
 # Subplot (a): Baseline
 plot_tsne(
@@ -68,6 +73,7 @@ plot_tsne(
     title='(a) Baseline Method (PCA)',
     output_path='', # Không cần
     palette=custom_palette,
+    cache_dir=embedding_cache,
     ax=axes[0]
 )
 
@@ -78,6 +84,7 @@ plot_tsne(
     title='(b) SOTA Method (GNN)',
     output_path='',
     palette=custom_palette,
+    cache_dir=embedding_cache,
     ax=axes[1]
 )
 
@@ -88,6 +95,7 @@ plot_tsne(
     title='(c) Our Proposed Method',
     output_path='',
     palette=custom_palette,
+    cache_dir=embedding_cache,
     ax=axes[2]
 )
 
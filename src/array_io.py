@@ -0,0 +1,189 @@
+# src/array_io.py
+
+import math
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+# ==============================================================================
+# Mảng lớn trên đĩa (memory-mapped arrays)
+# Ma trận tương quan hay kết quả quét tham số có thể lớn hơn RAM. Các hàm dưới
+# đây cho phép template nhận đường dẫn file .npy hoặc np.memmap, chỉ đọc từng
+# khối hàng cần thiết, và gộp khối (block aggregation) khi ma trận có nhiều ô
+# hơn số pixel mà hình có thể hiển thị.
+# ==============================================================================
+
+_BLOCK_BYTES = 64 * 1024 ** 2  # Bộ nhớ tạm tối đa cho mỗi khối hàng được đọc
+
+
+def load_array(source):
+    """
+    Chuẩn hóa đầu vào dạng mảng mà không đọc toàn bộ dữ liệu vào RAM.
+
+    Args:
+        source: Đường dẫn file .npy (mở dạng memory-map), np.memmap, np.ndarray
+                hoặc array-like khác (list, DataFrame...).
+
+    Returns:
+        np.ndarray: Mảng (có thể là memmap chỉ đọc).
+    """
+    if isinstance(source, str):
+        return np.load(source, mmap_mode='r')
+    if isinstance(source, np.ndarray):
+        return source
+    return np.asarray(source)
+
+
+def block_factors(shape, max_shape):
+    """Hệ số gộp nguyên (theo từng chiều) để `shape` không vượt quá `max_shape`."""
+    return tuple(max(1, math.ceil(n / m)) for n, m in zip(shape, max_shape))
+
+
+def block_reduce(array, factors, reducer: str = 'mean', row_order=None, col_order=None):
+    """
+    Gộp các khối `factors` (vd: (4, 4)) của một mảng 1-D hoặc 2-D thành một giá trị.
+    Mảng được đọc theo từng dải hàng nên hoạt động được với memmap lớn hơn RAM.
+    Khối ở biên (không đủ kích thước) được gộp với phần dữ liệu có sẵn.
+
+    Args:
+        array (np.ndarray): Mảng 1-D hoặc 2-D (có thể là memmap).
+        factors (tuple): Hệ số gộp cho mỗi chiều.
+        reducer (str, optional): 'mean', 'max', 'min' hoặc 'absmax' (giá trị có trị
+                                 tuyệt đối lớn nhất, hữu ích cho ma trận tương quan).
+                                 Mặc định là 'mean'.
+        row_order (array-like, optional): Hoán vị hàng áp dụng trước khi gộp (vd: thứ tự
+                                          phân cụm). Hàng được đọc theo từng dải của thứ tự
+                                          mới nên memmap không bị sao chép toàn bộ.
+        col_order (array-like, optional): Hoán vị cột áp dụng trước khi gộp.
+
+    Returns:
+        np.ndarray: Mảng đã gộp (float), luôn nằm trong RAM.
+    """
+    reducers = {'mean': np.nanmean, 'max': np.nanmax, 'min': np.nanmin, 'absmax': _nan_absmax}
+    if reducer not in reducers:
+        raise ValueError(f"reducer phải là một trong {tuple(reducers)}, nhận được '{reducer}'.")
+    reduce_fn = reducers[reducer]
+
+    if array.ndim == 1:
+        return block_reduce(array[:, None], (factors[0], 1), reducer, row_order)[:, 0]
+    if array.ndim != 2:
+        raise ValueError("block_reduce chỉ hỗ trợ mảng 1-D hoặc 2-D.")
+
+    fy, fx = factors
+    n_rows, n_cols = array.shape
+    out_rows, out_cols = math.ceil(n_rows / fy), math.ceil(n_cols / fx)
+    result = np.empty((out_rows, out_cols))
+
+    # Số hàng output xử lý mỗi lần, sao cho bộ nhớ tạm không quá _BLOCK_BYTES
+    row_bytes = fy * out_cols * fx * 8
+    step = max(1, _BLOCK_BYTES // row_bytes)
+    for out_start in range(0, out_rows, step):
+        out_stop = min(out_rows, out_start + step)
+        rows = slice(out_start * fy, out_stop * fy)
+        if row_order is not None:
+            # Đọc các hàng theo thứ tự tăng dần (truy cập đĩa tuần tự hơn), rồi sắp lại
+            wanted = np.asarray(row_order)[rows]
+            ascending = np.argsort(wanted)
+            chunk = np.empty((len(wanted), n_cols))
+            chunk[ascending] = array[wanted[ascending]]
+        else:
+            chunk = np.asarray(array[rows], dtype=float)
+        if col_order is not None:
+            chunk = chunk[:, col_order]
+        # Đệm NaN để kích thước chia hết cho hệ số gộp
+        padded = np.full(((out_stop - out_start) * fy, out_cols * fx), np.nan)
+        padded[:chunk.shape[0], :n_cols] = chunk
+        blocks = padded.reshape(out_stop - out_start, fy, out_cols, fx)
+        with warnings.catch_warnings():
+            # Khối toàn NaN (ngoài biên) -> NaN, không cần cảnh báo "empty slice"
+            warnings.simplefilter('ignore', RuntimeWarning)
+            result[out_start:out_stop] = reduce_fn(blocks, axis=(1, 3))
+    return result
+
+
+def _nan_absmax(blocks, axis):
+    """Giá trị (giữ dấu) có trị tuyệt đối lớn nhất trong mỗi khối, bỏ qua NaN."""
+    moved = np.moveaxis(blocks, (1, 3), (-2, -1))
+    flat = moved.reshape(moved.shape[:-2] + (-1,))
+    filled = np.where(np.isnan(flat), -np.inf, np.abs(flat))
+    idx = filled.argmax(axis=-1)
+    return np.take_along_axis(flat, idx[..., None], axis=-1)[..., 0]
+
+
+def save_npz_atomic(path, **arrays):
+    """Ghi file .npz qua file tạm để tránh để lại file hỏng khi bị ngắt giữa chừng."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ==============================================================================
+# Cache .npz trên đĩa (embedding, thứ tự phân cụm)
+# Các file `<prefix>-<hash>.npz` trong một thư mục cache được giới hạn giống
+# FigureCache: file quá tuổi bị xóa trước, rồi tới các file ít được dùng gần
+# đây nhất (theo mtime) cho tới khi tổng dung lượng dưới ngưỡng.
+# ==============================================================================
+def npz_cache_entries(cache_dir, prefix):
+    """Danh sách (mtime, size, path) của các file `<prefix>-*.npz` trong `cache_dir`."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not (name.startswith(f'{prefix}-') and name.endswith('.npz')):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue  # Một process khác vừa xóa file này
+        entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def evict_npz_cache(cache_dir, prefix, max_bytes, max_age_days):
+    """
+    Dọn các file `<prefix>-*.npz` trong `cache_dir`: xóa file quá tuổi, rồi xóa các
+    file cũ nhất cho tới khi tổng dung lượng dưới `max_bytes`.
+
+    Args:
+        cache_dir (str): Thư mục cache.
+        prefix (str): Tiền tố tên file, vd: 'embedding' hoặc 'cluster'.
+        max_bytes (int): Dung lượng tối đa. None để tắt.
+        max_age_days (float): Tuổi tối đa (ngày). None để tắt.
+    """
+    now = time.time()
+    kept = []
+    for mtime, size, path in npz_cache_entries(cache_dir, prefix):
+        if max_age_days is not None and now - mtime > max_age_days * 86400:
+            _remove(path)
+        else:
+            kept.append((mtime, size, path))
+
+    if max_bytes is not None:
+        total = sum(size for _, size, _ in kept)
+        for mtime, size, path in sorted(kept):
+            if total <= max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def clear_npz_cache(cache_dir, prefix):
+    """Xóa mọi file `<prefix>-*.npz` trong `cache_dir` (bỏ qua file vừa bị process khác xóa)."""
+    if cache_dir and os.path.isdir(cache_dir):
+        for _, _, path in npz_cache_entries(cache_dir, prefix):
+            _remove(path)
@@ -0,0 +1,295 @@
+# src/batch_render.py
+
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from figure_export import output_paths
+
+# ==============================================================================
+# Batch renderer
+# Vẽ nhiều figure song song trên một process pool. Mỗi "job" là một dict:
+#   {
+#       'template': 'plot_line_comparison',   # Tên hàm trong plot_templates.py
+#       'kwargs': {...},                      # Tham số truyền cho template
+#       'output_path': 'figures/02.pdf',      # Đường dẫn lưu file (hoặc danh sách, vd: [.pdf, .png])
+#       'data_path': 'data/sample.csv',       # (tùy chọn) CSV được load thành `data`
+#       'font_family': 'serif',               # (tùy chọn) style riêng cho job này
+#   }
+# Mỗi worker chỉ gọi `set_publication_style` MỘT lần lúc khởi động.
+# Với `pool_size`, mỗi worker dùng lại các figure cùng kích thước giữa các job (FigurePool).
+# Với `trace=True`, mỗi job được ghi thành một cây span (xem instrumentation.py) và trả
+# về trong kết quả ('spans'); `collect_trace` gom chúng để xuất Chrome trace / flame graph.
+#
+# `executor='thread'` vẽ trên một thread pool trong chính process hiện tại. Các
+# template không dùng pyplot (figure dựng trực tiếp trên canvas Agg), nên các thread
+# không tranh chấp "figure hiện tại"; phù hợp cho service chạy lâu, nơi chi phí khởi
+# động process và import lặp lại là đáng kể. Phần vẽ vẫn bị giới hạn bởi GIL.
+# ==============================================================================
+
+EXECUTORS = ('process', 'thread')
+
+
+def _worker_init(font_family, cache_options=None, pool_size=None, trace=False, log_level=None):
+    """Khởi tạo worker: áp dụng style một lần cho cả vòng đời process."""
+    import matplotlib
+    matplotlib.use('Agg')  # Worker không có màn hình
+    _configure(font_family, cache_options, pool_size, trace, log_level)
+
+
+def _configure(font_family, cache_options=None, pool_size=None, trace=False, log_level=None):
+    """Áp dụng style, cache, pool, tracer và logging cho process hiện tại (dùng chung bởi mọi thread)."""
+    if log_level is not None:
+        from render_log import enable_console_logging
+        enable_console_logging(level=log_level, fmt='[%(process)d] %(message)s')
+    from publication_style import set_publication_style
+    set_publication_style(font_family=font_family)
+    if cache_options is not None:
+        from figure_cache import enable_figure_cache
+        enable_figure_cache(**cache_options)
+    if pool_size:
+        from figure_pool import enable_figure_pool
+        enable_figure_pool(max_size=pool_size)
+    if trace:
+        from instrumentation import enable_instrumentation, get_tracer
+        if get_tracer() is None:
+            enable_instrumentation()
+    import plot_templates  # noqa: F401  (import trước để job đầu tiên không phải chịu chi phí import)
+
+
+@functools.lru_cache(maxsize=None)
+def template_names():
+    """
+    Tên các template có thể gọi qua job: các hàm `plot_*` trong plot_templates.py.
+    Được tính một lần cho mỗi process (worker), không phải cho mỗi job.
+    """
+    import plot_templates
+    return tuple(sorted(name for name, obj in vars(plot_templates).items()
+                        if name.startswith('plot_') and callable(obj)))
+
+
+def _resolve_job(job):
+    """Kiểm tra job và trả về (template_name, kwargs) sẵn sàng để gọi."""
+    if 'template' not in job:
+        raise ValueError("Job thiếu khóa 'template'.")
+    kwargs = dict(job.get('kwargs', {}))
+    if 'output_path' in job:
+        kwargs['output_path'] = job['output_path']
+    if job.get('data_path'):
+        import pandas as pd
+        from instrumentation import span
+        with span('read_csv'):
+            kwargs['data'] = pd.read_csv(job['data_path'])
+    return job['template'], kwargs
+
+
+def _run_job(index, job):
+    """Chạy một job trong worker. Không bao giờ raise: lỗi được trả về trong kết quả."""
+    start = time.perf_counter()
+    result = {
+        'index': index,
+        'template': job.get('template'),
+        'output_path': job.get('output_path'),
+        'ok': False,
+        'elapsed': 0.0,
+        'error': None,
+        'error_type': None,
+    }
+    from instrumentation import get_tracer
+    tracer = get_tracer()
+    if tracer is None:
+        _execute_job(job, result)
+    else:
+        with tracer.span('job', index=index, template=job.get('template')) as root:
+            _execute_job(job, result)
+        result['spans'] = [span.to_dict() for span in tracer.pop_tree(root)]
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+def _execute_job(job, result):
+    """Vẽ một job, ghi 'ok' / 'error' vào `result`."""
+    try:
+        import plot_templates
+        template_name, kwargs = _resolve_job(job)
+        if template_name not in template_names():
+            raise ValueError(f"Không tìm thấy template '{template_name}' trong plot_templates.")
+        template = getattr(plot_templates, template_name)
+        font_family = job.get('font_family')
+        if font_family is None:
+            template(**kwargs)
+        else:
+            # Style dựng sẵn: đổi style cho một job chỉ là một rc_context, không đọc lại file style
+            from publication_style import get_publication_style
+            with get_publication_style(font_family).context():
+                template(**kwargs)
+        result['ok'] = True
+        output_path = kwargs.get('output_path')
+        if output_path:
+            result['bytes'] = sum(os.path.getsize(path) for path in output_paths(output_path)
+                                  if os.path.exists(path))
+    except Exception as exc:
+        # Figure dang dở không đăng ký với pyplot: được giải phóng khi mất tham chiếu
+        result['error'] = traceback.format_exc()
+        result['error_type'] = type(exc).__name__
+
+
+def render_batch(jobs, max_workers=None, font_family='sans-serif', cache_options=None, pool_size=None,
+                 executor: str = 'process', trace: bool = False, log_level=None):
+    """
+    Vẽ một danh sách figure job song song trên một process pool (hoặc thread pool).
+
+    Args:
+        jobs (list): Danh sách các dict job (xem mô tả ở đầu file).
+        max_workers (int, optional): Số process tối đa. Mặc định là số CPU.
+        font_family (str, optional): Font family truyền cho `set_publication_style`.
+        cache_options (dict, optional): Nếu có, mỗi worker gọi `enable_figure_cache(**cache_options)`
+                                        để bỏ qua các figure không thay đổi.
+        pool_size (int, optional): Nếu có, mỗi worker bật một FigurePool giữ tối đa `pool_size`
+                                   figure rảnh để dùng lại giữa các job. Mặc định là None (tắt).
+        executor (str, optional): 'process' (mặc định) hoặc 'thread'. Với 'thread', style, cache
+                                  và pool được áp dụng một lần cho process hiện tại (thay đổi
+                                  rcParams của chính process gọi hàm) rồi các job chạy trên
+                                  `max_workers` thread.
+        trace (bool, optional): Ghi span cho từng giai đoạn của mỗi job; kết quả có thêm
+                                khóa 'spans' (dùng với `collect_trace`). Mặc định là False.
+        log_level (int | str, optional): Nếu có, mỗi worker in các thông báo của thư viện
+                                         (figure đã lưu, downsample...) từ mức này trở lên.
+                                         Mặc định là None (im lặng).
+
+    Returns:
+        list: Danh sách kết quả (theo đúng thứ tự của `jobs`), mỗi kết quả là dict
+              gồm 'template', 'output_path', 'ok', 'elapsed' (giây), 'bytes' (kích thước
+              file khi thành công), 'error' (traceback) và 'error_type' (tên lớp exception).
+              Một job lỗi không làm dừng cả batch.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"executor phải là một trong {EXECUTORS}, nhận được '{executor}'.")
+    if executor == 'thread' and any(job.get('font_family', font_family) != font_family for job in jobs):
+        # rcParams là trạng thái chung của process: các thread không thể dùng style khác nhau cùng lúc
+        raise ValueError("executor='thread' yêu cầu mọi job dùng cùng font_family với batch.")
+    results = [None] * len(jobs)
+    if not jobs:
+        return results
+
+    if executor == 'thread':
+        _configure(font_family, cache_options, pool_size, trace, log_level)
+        pool_executor = ThreadPoolExecutor(max_workers=max_workers)
+    else:
+        pool_executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_worker_init,
+                                            initargs=(font_family, cache_options, pool_size, trace, log_level))
+    with pool_executor:
+        futures = {pool_executor.submit(_run_job, i, job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as exc:
+                # Worker bị chết (vd: segfault -> BrokenProcessPool) hoặc kết quả không gửi về
+                # được (vd: lỗi pickle) -> vẫn ghi nhận lỗi cho job này
+                results[i] = {
+                    'index': i,
+                    'template': jobs[i].get('template'),
+                    'output_path': jobs[i].get('output_path'),
+                    'ok': False,
+                    'elapsed': 0.0,
+                    'error': traceback.format_exc(),
+                    'error_type': type(exc).__name__,
+                }
+    return results
+
+
+def collect_trace(results):
+    """
+    Gom span của mọi job (từ `render_batch(..., trace=True)`) vào một Tracer.
+
+    Returns:
+        instrumentation.Tracer: Dùng `write_chrome_trace`, `write_folded` hoặc `format_summary`.
+    """
+    from instrumentation import Tracer
+    tracer = Tracer()
+    for r in results:
+        tracer.extend(r.get('spans', ()))
+    return tracer
+
+
+def format_report(results):
+    """Tạo bảng tóm tắt dạng text từ kết quả của `render_batch`."""
+    lines = []
+    for r in results:
+        status = 'OK  ' if r['ok'] else 'FAIL'
+        target = ', '.join(output_paths(r['output_path'])) if r['output_path'] else None
+        lines.append(f"[{status}] {r['elapsed']:8.3f}s  {r['template']} -> {target}")
+        if not r['ok'] and r['error']:
+            lines.append('        ' + r['error'].strip().splitlines()[-1])
+    n_ok = sum(r['ok'] for r in results)
+    total = sum(r['elapsed'] for r in results)
+    total_mb = sum(r.get('bytes', 0) for r in results) / 1024 ** 2
+    lines.append(f"{n_ok}/{len(results)} figures rendered ({total_mb:.2f} MB), total job time {total:.3f}s")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render many figures in parallel from a JSON job list.')
+    parser.add_argument('jobs_file', help='JSON file containing a list of figure jobs.')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of worker processes (or threads).')
+    parser.add_argument('--executor', default='process', choices=EXECUTORS,
+                        help='Render on worker processes (default) or on threads in this process.')
+    parser.add_argument('--font-family', default='sans-serif', choices=['serif', 'sans-serif'])
+    parser.add_argument('--report', default=None, help='Optional path to write the per-job results as JSON.')
+    parser.add_argument('--cache-dir', default=None, help='Skip figures whose inputs are unchanged (content-addressed cache).')
+    parser.add_argument('--force', action='store_true', help='Re-render every figure and refresh the cache.')
+    parser.add_argument('--figure-pool', type=int, default=None, metavar='N',
+                        help='Reuse up to N idle figures of the same size per worker.')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Log every saved figure and library notice from the workers.')
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help='Write a Chrome trace (JSON) of per-stage timings for every job.')
+    parser.add_argument('--folded', default=None, metavar='PATH',
+                        help='Write per-stage timings as folded stacks for flame graph tools.')
+    args = parser.parse_args(argv)
+
+    with open(args.jobs_file) as f:
+        jobs = json.load(f)
+
+    # Các đường dẫn tương đối trong file job được hiểu là tương đối với vị trí file job
+    base_dir = os.path.dirname(os.path.abspath(args.jobs_file))
+    for job in jobs:
+        if isinstance(job.get('output_path'), list):
+            job['output_path'] = [os.path.join(base_dir, path) for path in job['output_path']]
+        for key in ('output_path', 'data_path'):
+            if isinstance(job.get(key), str):
+                job[key] = os.path.join(base_dir, job[key])
+
+    cache_options = None
+    if args.cache_dir:
+        cache_options = {'cache_dir': args.cache_dir, 'force': args.force}
+
+    results = render_batch(jobs, max_workers=args.workers, font_family=args.font_family,
+                           cache_options=cache_options, pool_size=args.figure_pool,
+                           executor=args.executor, trace=bool(args.trace or args.folded),
+                           log_level='INFO' if args.verbose else None)
+    print(format_report(results))
+
+    if args.trace or args.folded:
+        tracer = collect_trace(results)
+        print(tracer.format_summary())
+        if args.trace:
+            tracer.write_chrome_trace(args.trace)
+        if args.folded:
+            tracer.write_folded(args.folded)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# src/clustering.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from array_io import clear_npz_cache, evict_npz_cache, save_npz_atomic
+from content_hash import hash_content
+from render_log import get_logger
+
+# ==============================================================================
+# Sắp xếp hàng/cột theo phân cụm phân cấp (hierarchical clustering)
+# Dùng để đưa các đặc trưng tương quan với nhau lại gần nhau trên heatmap.
+# Linkage trên hàng nghìn đặc trưng tốn nhiều thời gian nên kết quả được ghi
+# nhớ (memoize) theo hash của ma trận và tham số, giống `embeddings.py`:
+# trong bộ nhớ của process và (tùy chọn) trên đĩa dưới dạng file .npz.
+#
+# Hai chế độ:
+#   - 'exact': scipy linkage trên toàn bộ các hàng (O(n^2) bộ nhớ).
+#   - 'approximate': chiếu ngẫu nhiên (random projection) các hàng xuống ít chiều,
+#     gom thành k cụm bằng k-means, linkage trên các tâm cụm, rồi sắp các hàng
+#     trong mỗi cụm theo hướng nối cụm trước và cụm sau. Đọc ma trận theo từng
+#     dải hàng nên dùng được với memmap lớn hơn RAM.
+# ==============================================================================
+
+CLUSTER_MODES = ('auto', 'exact', 'approximate')
+logger = get_logger('clustering')
+
+_MEMORY_CACHE_SIZE = 16
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()  # Template có thể được gọi song song từ nhiều thread
+_SKETCH_DIMS = 64                 # Số chiều sau khi chiếu ngẫu nhiên (chế độ approximate)
+_BLOCK_BYTES = 64 * 1024 ** 2     # Bộ nhớ tạm tối đa cho mỗi dải hàng được đọc
+# Giới hạn của cache trên đĩa (giống embeddings.py)
+DISK_CACHE_MAX_BYTES = 256 * 1024 ** 2
+DISK_CACHE_MAX_AGE_DAYS = 30
+
+
+def cluster_order(matrix, axis: int = 0, method: str = 'average', metric: str = 'euclidean',
+                  optimal_ordering: bool = False, mode: str = 'auto', max_exact: int = 2000,
+                  n_clusters: int = None, random_state: int = 42, cache_dir: str = None):
+    """
+    Tính thứ tự các hàng (axis=0) hoặc cột (axis=1) của `matrix` theo phân cụm phân cấp, có cache.
+
+    Args:
+        matrix (np.ndarray): Ma trận 2-D (có thể là memmap).
+        axis (int, optional): 0 để sắp hàng, 1 để sắp cột. Mặc định là 0.
+        method (str, optional): Phương pháp linkage của scipy ('average', 'complete',
+                                'single', 'ward'...). Mặc định là 'average'.
+        metric (str, optional): Khoảng cách giữa các hàng ('euclidean', 'correlation',
+                                'cosine'...). Mặc định là 'euclidean'.
+        optimal_ordering (bool, optional): Sắp lại lá của cây để các hàng kề nhau giống nhau
+                                           nhất (chậm hơn đáng kể). Mặc định là False.
+        mode (str, optional): 'exact', 'approximate' hoặc 'auto' (approximate khi số hàng
+                              vượt `max_exact`). Mặc định là 'auto'.
+        max_exact (int, optional): Ngưỡng số hàng cho chế độ 'auto'. Mặc định là 2000.
+        n_clusters (int, optional): Số cụm k-means ở chế độ approximate. Mặc định là
+                                    min(512, n / 2).
+        random_state (int, optional): Seed cho chế độ approximate. Mặc định là 42.
+        cache_dir (str, optional): Thư mục lưu kết quả dạng .npz. Nếu None, chỉ cache
+                                   trong bộ nhớ của process hiện tại.
+
+    Returns:
+        tuple: (order, linkage)
+            - order (np.ndarray): Hoán vị các chỉ số hàng/cột.
+            - linkage (np.ndarray): Ma trận linkage của scipy (trên các hàng ở chế độ
+                                    exact, trên các tâm cụm ở chế độ approximate).
+
+    Ghi chú:
+        Chế độ approximate luôn dùng khoảng cách Euclid trong không gian đã chiếu;
+        với metric='correlation' các hàng được chuẩn hóa (trừ trung bình, chia độ dài)
+        trước, nên khoảng cách Euclid tương đương khoảng cách tương quan.
+    """
+    if mode not in CLUSTER_MODES:
+        raise ValueError(f"mode phải là một trong {CLUSTER_MODES}, nhận được '{mode}'.")
+    if matrix.ndim != 2:
+        raise ValueError("cluster_order chỉ hỗ trợ ma trận 2-D.")
+    n_items = matrix.shape[axis]
+    if mode == 'auto':
+        mode = 'approximate' if n_items > max_exact else 'exact'
+
+    params = {'axis': axis, 'method': method, 'metric': metric, 'optimal_ordering': optimal_ordering,
+              'mode': mode, 'n_clusters': n_clusters, 'random_state': random_state}
+    key = hash_content('cluster-order', matrix, params)
+
+    # --- 1. Cache trong bộ nhớ ---
+    with _cache_lock:
+        cached = _memory_cache.get(key)
+        if cached is not None:
+            _memory_cache.move_to_end(key)
+    if cached is not None:
+        order, linkage = cached
+        return order.copy(), linkage.copy()
+
+    # --- 2. Cache trên đĩa ---
+    cache_path = os.path.join(cache_dir, f"cluster-{key}.npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as stored:
+            order, linkage = stored['order'], stored['linkage']
+        os.utime(cache_path)  # Đánh dấu "vừa được dùng" cho chính sách LRU
+    else:
+        # --- 3. Không có cache: tính linkage ---
+        start = time.perf_counter()
+        if mode == 'exact':
+            order, linkage = _exact_order(matrix, axis, method, metric, optimal_ordering)
+            detail = 'exact'
+        else:
+            k = n_clusters or max(2, min(512, n_items // 2))
+            order, linkage = _approximate_order(matrix, axis, method, metric, optimal_ordering,
+                                                k, random_state)
+            detail = f"approximate, {k} clusters"
+        name = 'rows' if axis == 0 else 'columns'
+        logger.info("Clustered %d %s (%s, %s/%s) in %.2fs", n_items, name, detail, method, metric,
+                    time.perf_counter() - start)
+        if cache_path:
+            save_npz_atomic(cache_path, order=order, linkage=linkage)
+            evict_npz_cache(cache_dir, 'cluster', DISK_CACHE_MAX_BYTES, DISK_CACHE_MAX_AGE_DAYS)
+
+    with _cache_lock:
+        _memory_cache[key] = (order, linkage)
+        if len(_memory_cache) > _MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return order.copy(), linkage.copy()
+
+
+def clear_cluster_cache(cache_dir: str = None):
+    """Xóa cache phân cụm trong bộ nhớ và (nếu có) các file .npz trong `cache_dir`."""
+    with _cache_lock:
+        _memory_cache.clear()
+    clear_npz_cache(cache_dir, 'cluster')
+
+
+def is_symmetric(matrix, n_samples: int = 1000, random_state: int = 0):
+    """
+    Kiểm tra nhanh ma trận vuông có đối xứng không bằng cách so sánh ngẫu nhiên
+    `n_samples` cặp (i, j) / (j, i); không đọc toàn bộ memmap.
+    """
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        return False
+    rng = np.random.default_rng(random_state)
+    i, j = rng.integers(0, matrix.shape[0], size=(2, n_samples))
+    return np.allclose(np.asarray(matrix[i, j], dtype=float), np.asarray(matrix[j, i], dtype=float),
+                       equal_nan=True)
+
+
+# ==============================================================================
+# Các chế độ tính
+# ==============================================================================
+def _exact_order(matrix, axis, method, metric, optimal_ordering):
+    from scipy.cluster.hierarchy import leaves_list, linkage
+
+    data = np.asarray(matrix, dtype=float)
+    data = data if axis == 0 else data.T
+    linkage_matrix = linkage(data, method=method, metric=metric, optimal_ordering=optimal_ordering)
+    return leaves_list(linkage_matrix), linkage_matrix
+
+
+def _approximate_order(matrix, axis, method, metric, optimal_ordering, n_clusters, random_state):
+    from scipy.cluster.hierarchy import leaves_list, linkage
+
+    rng = np.random.default_rng(random_state)
+    sketch = _sketch(matrix, axis, standardize=(metric == 'correlation'), rng=rng)
+    n_clusters = min(n_clusters, len(sketch))
+    assignment, centroids = _kmeans(sketch, n_clusters, rng)
+
+    # Chỉ giữ các cụm có phần tử (k-means có thể để trống vài cụm)
+    used = np.unique(assignment)
+    centroids = centroids[used]
+    linkage_matrix = linkage(centroids, method=method, metric='euclidean',
+                             optimal_ordering=optimal_ordering)
+    cluster_sequence = used[leaves_list(linkage_matrix)]
+
+    # Trong mỗi cụm: sắp theo hình chiếu lên hướng từ tâm cụm trước tới tâm cụm sau,
+    # để chuyển tiếp giữa các cụm kề nhau mượt hơn
+    centroid_of = dict(zip(used, centroids))
+    members = np.argsort(assignment, kind='stable')
+    bounds = np.searchsorted(assignment[members], cluster_sequence)
+    counts = np.bincount(assignment, minlength=assignment.max() + 1)[cluster_sequence]
+    order = []
+    for pos, (cluster, start, count) in enumerate(zip(cluster_sequence, bounds, counts)):
+        rows = members[start:start + count]
+        prev_c = centroid_of[cluster_sequence[max(pos - 1, 0)]]
+        next_c = centroid_of[cluster_sequence[min(pos + 1, len(cluster_sequence) - 1)]]
+        order.append(rows[np.argsort(sketch[rows] @ (next_c - prev_c), kind='stable')])
+    return np.concatenate(order), linkage_matrix
+
+
+def _sketch(matrix, axis, standardize, rng):
+    """
+    Chiếu ngẫu nhiên Gaussian các hàng (axis=0) hoặc cột (axis=1) xuống `_SKETCH_DIMS`
+    chiều. Ma trận được đọc theo dải hàng trong cả hai trường hợp; khi axis=1 kết quả
+    được cộng dồn (M.T @ R = tổng các dải). Nếu số chiều gốc đã nhỏ, trả lại dữ liệu gốc.
+    """
+    n_rows, n_cols = matrix.shape
+    n_features = n_cols if axis == 0 else n_rows
+    n_items = n_rows if axis == 0 else n_cols
+    project = n_features > _SKETCH_DIMS
+    dims = _SKETCH_DIMS if project else n_features
+    projection = rng.normal(size=(n_features, dims)) / np.sqrt(dims) if project else None
+
+    # Chuẩn hóa cho 'correlation': cần trung bình và độ dài của mỗi hàng/cột
+    if standardize and axis == 1:
+        col_sum, col_sq = np.zeros(n_cols), np.zeros(n_cols)
+        for start, band in _row_bands(matrix):
+            col_sum += band.sum(axis=0)
+            col_sq += np.square(band).sum(axis=0)
+        col_mean = col_sum / n_rows
+        col_norm = np.sqrt(np.maximum(col_sq - n_rows * col_mean ** 2, 0)) + 1e-12
+
+    sketch = np.zeros((n_items, dims))
+    for start, band in _row_bands(matrix):
+        if axis == 0:
+            if standardize:
+                band = band - band.mean(axis=1, keepdims=True)
+                band /= np.linalg.norm(band, axis=1, keepdims=True) + 1e-12
+            sketch[start:start + len(band)] = band @ projection if project else band
+        else:
+            if standardize:
+                band = (band - col_mean) / col_norm
+            part = projection[start:start + len(band)] if project else np.eye(n_rows)[start:start + len(band)]
+            sketch += band.T @ part
+    return sketch
+
+
+def _row_bands(matrix):
+    """Duyệt ma trận (có thể là memmap) theo dải hàng kiểu float, mỗi dải tối đa `_BLOCK_BYTES`."""
+    step = max(1, _BLOCK_BYTES // (matrix.shape[1] * 8))
+    for start in range(0, matrix.shape[0], step):
+        band = np.asarray(matrix[start:start + step], dtype=float)
+        yield start, np.nan_to_num(band)
+
+
+def _kmeans(data, k, rng, n_iter: int = 15):
+    """K-means (Lloyd) thuần NumPy, khởi tạo bằng k hàng ngẫu nhiên. Trả về (assignment, centroids)."""
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    assignment = np.zeros(len(data), dtype=np.int64)
+    for _ in range(n_iter):
+        # Gán cụm theo từng khối để ma trận khoảng cách tạm không quá lớn
+        c_sq = np.square(centroids).sum(axis=1)
+        for start in range(0, len(data), 65536):
+            block = data[start:start + 65536]
+            distances = c_sq[None, :] - 2 * block @ centroids.T
+            assignment[start:start + len(block)] = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.column_stack([np.bincount(assignment, weights=data[:, d], minlength=k)
+                                for d in range(data.shape[1])])
+        nonempty = counts > 0
+        # Cụm rỗng giữ nguyên tâm cũ
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return assignment, centroids
@@ -0,0 +1,111 @@
+# src/content_hash.py
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+# ==============================================================================
+# Hàm băm nội dung (Content hashing)
+# Tạo một "dấu vân tay" ổn định cho tham số của template (DataFrame, ndarray,
+# dict, list, số, chuỗi...). Hai lời gọi có cùng nội dung -> cùng một hash,
+# bất kể object có phải là cùng một instance hay không.
+#
+# Đường dẫn tới file .npy (template mở chúng bằng `array_io.load_array`) được
+# băm theo NỘI DUNG mảng, đọc theo từng dải như memmap: ghi đè file bằng
+# `np.save` làm đổi hash dù đường dẫn không đổi.
+# ==============================================================================
+
+_HASH_BLOCK_BYTES = 64 * 1024 ** 2  # Kích thước mỗi dải khi băm mảng lớn (vd: memmap)
+
+
+def _update(h, obj):
+    """Đưa `obj` vào đối tượng hash `h` một cách đệ quy và xác định (deterministic)."""
+    # Ghi thêm tên kiểu để [1, 2] và (1, 2) hay 1 và '1' không bị trùng hash
+    h.update(type(obj).__name__.encode())
+
+    if isinstance(obj, str) and obj.endswith('.npy') and os.path.isfile(obj):
+        _update_npy_file(h, obj)
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, bytes):
+        h.update(obj)
+    elif isinstance(obj, np.ndarray):
+        h.update(str(obj.dtype).encode())
+        h.update(repr(obj.shape).encode())
+        if obj.dtype == object:
+            for item in obj.ravel():
+                _update(h, item)
+        elif obj.ndim == 0:
+            h.update(np.ascontiguousarray(obj).view(np.uint8).data)
+        else:
+            # Băm theo từng dải hàng: memmap lớn không bị đọc (sao chép) hết vào RAM.
+            # Kết quả giống hệt băm toàn bộ bytes liền nhau vì SHA-256 là streaming.
+            row_bytes = max(1, obj[:1].nbytes)
+            step = max(1, _HASH_BLOCK_BYTES // row_bytes)
+            for start in range(0, len(obj), step):
+                h.update(np.ascontiguousarray(obj[start:start + step]).view(np.uint8).data)
+    elif isinstance(obj, np.generic):
+        h.update(repr(obj.item()).encode())
+    elif isinstance(obj, dict):
+        # Sắp xếp theo repr của key để thứ tự chèn không ảnh hưởng đến hash
+        for key in sorted(obj, key=repr):
+            _update(h, key)
+            _update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            _update(h, item)
+    elif isinstance(obj, (set, frozenset)):
+        for item in sorted(obj, key=repr):
+            _update(h, item)
+    elif _is_pandas(obj):
+        import pandas as pd
+        _update(h, [str(c) for c in getattr(obj, 'columns', [getattr(obj, 'name', None)])])
+        dtypes = obj.dtypes.tolist() if hasattr(obj, 'columns') else [obj.dtype]
+        _update(h, [str(t) for t in dtypes])
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().view(np.uint8).data)
+    else:
+        # Trường hợp còn lại (colormap, hàm...): dùng pickle. Nếu không pickle được
+        # thì raise TypeError để nơi gọi biết rằng không thể cache object này.
+        try:
+            h.update(pickle.dumps(obj, protocol=4))
+        except Exception as exc:
+            raise TypeError(f"Không thể băm object kiểu {type(obj).__name__}") from exc
+
+
+def _update_npy_file(h, path):
+    """Băm nội dung của file .npy (qua memmap); file không đọc được thì băm kích thước và mtime."""
+    h.update(repr(path).encode())
+    try:
+        array = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        st = os.stat(path)
+        h.update(repr((st.st_size, st.st_mtime_ns)).encode())
+        return
+    _update(h, array)
+
+
+def _is_pandas(obj):
+    module = type(obj).__module__
+    return module.startswith('pandas') and hasattr(obj, 'dtypes')
+
+
+def hash_content(*objs):
+    """
+    Tính hash SHA-256 (dạng hex) cho nội dung của các object truyền vào.
+
+    Args:
+        *objs: Các object cần băm (DataFrame, Series, ndarray, dict, list, scalar...).
+
+    Returns:
+        str: Chuỗi hex 64 ký tự.
+
+    Raises:
+        TypeError: Nếu có object không thể băm một cách ổn định.
+    """
+    h = hashlib.sha256()
+    for obj in objs:
+        _update(h, obj)
+    return h.hexdigest()
@@ -0,0 +1,124 @@
+# src/data_loading.py
+
+import numpy as np
+import pandas as pd
+
+from streaming_histogram import HistogramAccumulator
+
+# ==============================================================================
+# Đọc dữ liệu CSV theo từng khối (streaming / chunked)
+# Các file log training hoặc latency có thể nặng hàng GB. Thay vì
+# `pd.read_csv` toàn bộ file, các hàm dưới đây:
+#   - chỉ đọc những cột mà template cần (`usecols`),
+#   - đọc file theo từng khối `chunksize` dòng,
+#   - tính histogram / trung bình theo bin một cách tăng dần (incremental),
+# nên bộ nhớ đỉnh chỉ phụ thuộc vào `chunksize` và số bin, không phụ thuộc kích thước file.
+# ==============================================================================
+
+DEFAULT_CHUNKSIZE = 500_000
+
+
+def iter_columns(path: str, columns: list, chunksize: int = DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """
+    Duyệt qua file CSV theo từng khối, chỉ giữ lại các cột cần thiết.
+
+    Args:
+        path (str): Đường dẫn file CSV.
+        columns (list): Danh sách tên cột cần đọc.
+        chunksize (int, optional): Số dòng mỗi khối. Mặc định là 500,000.
+        **read_csv_kwargs: Các tham số khác cho `pd.read_csv` (vd: sep, dtype).
+
+    Yields:
+        pd.DataFrame: Từng khối dữ liệu với đúng các cột trong `columns`.
+    """
+    columns = list(dict.fromkeys(columns))  # Bỏ trùng, giữ thứ tự
+    with pd.read_csv(path, usecols=columns, chunksize=chunksize, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            yield chunk[columns]
+
+
+def column_range(path: str, column: str, chunksize: int = DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """Tìm (min, max) của một cột bằng một lượt đọc streaming (bỏ qua NaN)."""
+    lo, hi = np.inf, -np.inf
+    for chunk in iter_columns(path, [column], chunksize, **read_csv_kwargs):
+        values = chunk[column].to_numpy(dtype=float)
+        values = values[np.isfinite(values)]
+        if values.size:
+            lo, hi = min(lo, values.min()), max(hi, values.max())
+    if lo > hi:
+        raise ValueError(f"Cột '{column}' trong '{path}' không có giá trị hợp lệ nào.")
+    return lo, hi
+
+
+def load_line_data(path: str, x_col: str, y_cols: list, y_error_cols: dict = None,
+                   n_bins: int = None, chunksize: int = DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """
+    Đọc dữ liệu cho `plot_line_comparison` từ một file CSV lớn.
+
+    Args:
+        path (str): Đường dẫn file CSV.
+        x_col (str): Tên cột trục X.
+        y_cols (list): Danh sách tên cột trục Y.
+        y_error_cols (dict, optional): Map cột Y -> cột sai số (như trong `plot_line_comparison`).
+        n_bins (int, optional): Nếu có, gộp dữ liệu thành `n_bins` bin đều theo X và
+                                trả về giá trị trung bình mỗi bin (tính tăng dần, bộ nhớ
+                                cố định). Nếu None, trả về toàn bộ các dòng nhưng chỉ
+                                với các cột cần thiết.
+        chunksize (int, optional): Số dòng mỗi khối. Mặc định là 500,000.
+        **read_csv_kwargs: Các tham số khác cho `pd.read_csv`.
+
+    Returns:
+        pd.DataFrame: DataFrame có thể truyền thẳng vào `plot_line_comparison`.
+    """
+    columns = [x_col] + list(y_cols) + list((y_error_cols or {}).values())
+    columns = list(dict.fromkeys(columns))
+
+    if n_bins is None:
+        chunks = list(iter_columns(path, columns, chunksize, **read_csv_kwargs))
+        return pd.concat(chunks, ignore_index=True)
+
+    # Lượt 1: chỉ đọc cột X để biết khoảng giá trị
+    x_min, x_max = column_range(path, x_col, chunksize, **read_csv_kwargs)
+    edges = np.linspace(x_min, x_max, n_bins + 1)
+
+    # Lượt 2: cộng dồn tổng và số lượng theo bin
+    sums = np.zeros((len(columns), n_bins))
+    counts = np.zeros((len(columns), n_bins))
+    for chunk in iter_columns(path, columns, chunksize, **read_csv_kwargs):
+        x = chunk[x_col].to_numpy(dtype=float)
+        bin_idx = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_bins - 1)
+        for i, col in enumerate(columns):
+            values = chunk[col].to_numpy(dtype=float)
+            valid = np.isfinite(values) & np.isfinite(x)
+            sums[i] += np.bincount(bin_idx[valid], weights=values[valid], minlength=n_bins)
+            counts[i] += np.bincount(bin_idx[valid], minlength=n_bins)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    result = pd.DataFrame({col: means[i] for i, col in enumerate(columns)})
+    # Bỏ các bin rỗng (không có điểm X nào)
+    return result[counts[0] > 0].reset_index(drop=True)
+
+
+def stream_histogram(path: str, column: str, bins: int = 30, range: tuple = None,
+                     chunksize: int = DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """
+    Tính histogram của một cột trong file CSV lớn mà không load toàn bộ file.
+
+    Args:
+        path (str): Đường dẫn file CSV.
+        column (str): Tên cột cần tính histogram.
+        bins (int, optional): Số bin. Mặc định là 30.
+        range (tuple, optional): (min, max) của histogram. Nếu None, sẽ đọc thêm
+                                 một lượt để tìm khoảng giá trị.
+        chunksize (int, optional): Số dòng mỗi khối. Mặc định là 500,000.
+        **read_csv_kwargs: Các tham số khác cho `pd.read_csv`.
+
+    Returns:
+        tuple: (counts, bin_edges) - có thể truyền thẳng vào `plot_distribution`.
+    """
+    if range is None:
+        range = column_range(path, column, chunksize, **read_csv_kwargs)
+    accumulator = HistogramAccumulator(bins=bins, range=range)
+    accumulator.update_from_csv(path, column, chunksize, **read_csv_kwargs)
+    return accumulator.histogram()
@@ -0,0 +1,312 @@
+# src/embeddings.py
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from array_io import clear_npz_cache, evict_npz_cache, save_npz_atomic
+from content_hash import hash_content
+from render_log import get_logger
+
+# ==============================================================================
+# Tính embedding 2-D tách biệt khỏi việc vẽ
+# Kết quả được ghi nhớ (memoize) theo hash của ma trận đặc trưng và tham số:
+# trong bộ nhớ của process, và (tùy chọn) trên đĩa dưới dạng file .npz.
+# Nhờ đó việc đổi title, nhãn hay bảng màu của một figure t-SNE chỉ tốn vài
+# mili-giây thay vì phải chạy lại toàn bộ thuật toán.
+#
+# Pipeline gồm các giai đoạn (stage), mỗi giai đoạn được đo thời gian và bộ nhớ:
+#   1. subsample  - lấy mẫu ngẫu nhiên (hoặc phân tầng theo nhãn) khi dữ liệu quá lớn
+#   2. pca        - giảm chiều bằng PCA trước khi chạy thuật toán chính
+#   3. <method>   - thuật toán nhúng 2-D: 'tsne', 'opentsne' hoặc 'pca'
+# ==============================================================================
+
+EMBEDDING_METHODS = ('tsne', 'opentsne', 'pca')
+logger = get_logger('embeddings')
+
+_MEMORY_CACHE_SIZE = 16
+# Giới hạn của cache trên đĩa (giống FigureCache): file quá tuổi bị xóa trước, rồi tới
+# các file ít được dùng gần đây nhất cho tới khi tổng dung lượng dưới ngưỡng
+DISK_CACHE_MAX_BYTES = 256 * 1024 ** 2
+DISK_CACHE_MAX_AGE_DAYS = 30
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()  # Template có thể được gọi song song từ nhiều thread
+
+
+def compute_embedding(features, labels=None, method: str = 'tsne', perplexity: float = 30.0,
+                      pca_components: int = None, max_samples: int = None, stratify: bool = True,
+                      random_state: int = 42, cache_dir: str = None,
+                      **method_kwargs):
+    """
+    Chiếu `features` xuống 2 chiều với backend được chọn, có cache.
+
+    Args:
+        features (np.array): Mảng 2D chứa các vector đặc trưng (n_samples, n_features).
+        labels (array-like, optional): Nhãn của mỗi mẫu, dùng khi lấy mẫu phân tầng.
+        method (str, optional): 'tsne' (sklearn), 'opentsne' (FFT-accelerated, cần cài
+                                gói `openTSNE`) hoặc 'pca' (thuần NumPy, rất nhanh).
+                                Mặc định là 'tsne'.
+        perplexity (float, optional): Tham số perplexity cho t-SNE. Mặc định là 30.0.
+        pca_components (int, optional): Nếu có, giảm chiều bằng PCA xuống số chiều này
+                                        trước khi chạy t-SNE. Mặc định là None (không giảm).
+        max_samples (int, optional): Số mẫu tối đa. Nếu dữ liệu lớn hơn, lấy mẫu ngẫu nhiên.
+        stratify (bool, optional): Lấy mẫu phân tầng theo `labels` (giữ tỉ lệ các lớp).
+                                   Mặc định là True.
+        random_state (int, optional): Seed để kết quả lặp lại được. Mặc định là 42.
+        cache_dir (str, optional): Thư mục lưu embedding dạng .npz. Nếu None,
+                                   chỉ cache trong bộ nhớ của process hiện tại.
+        **method_kwargs: Các tham số khác cho thuật toán nhúng.
+
+    Returns:
+        tuple: (embedding, indices, stages)
+            - embedding (np.array): Mảng (n_used, 2) chứa tọa độ 2-D.
+            - indices (np.array): Chỉ số các mẫu gốc tương ứng với từng hàng của embedding.
+            - stages (list): Mỗi phần tử là dict {'stage', 'seconds', 'peak_mb', 'growth_mb', 'shape'}.
+    """
+    if method not in EMBEDDING_METHODS:
+        raise ValueError(f"method phải là một trong {EMBEDDING_METHODS}, nhận được '{method}'.")
+
+    features = np.asarray(features)
+    labels_arr = None if labels is None else np.asarray(labels)
+    params = {'method': method, 'perplexity': perplexity, 'pca_components': pca_components,
+              'max_samples': max_samples, 'stratify': stratify, 'random_state': random_state}
+    params.update(method_kwargs)
+    # Nhãn chỉ ảnh hưởng đến kết quả khi lấy mẫu phân tầng
+    uses_labels = max_samples is not None and stratify and labels_arr is not None
+    key = hash_content('embedding', features, labels_arr if uses_labels else None, params)
+
+    # --- 1. Cache trong bộ nhớ ---
+    with _cache_lock:
+        cached = _memory_cache.get(key)
+        if cached is not None:
+            _memory_cache.move_to_end(key)
+    if cached is not None:
+        embedding, indices = cached
+        return embedding.copy(), indices.copy(), [_cache_stage('memory-cache', embedding)]
+
+    # --- 2. Cache trên đĩa ---
+    cache_path = os.path.join(cache_dir, f"embedding-{key}.npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as stored:
+            embedding, indices = stored['embedding'], stored['indices']
+        os.utime(cache_path)  # Đánh dấu "vừa được dùng" cho chính sách LRU
+        stages = [_cache_stage('disk-cache', embedding)]
+    else:
+        # --- 3. Không có cache: chạy pipeline ---
+        embedding, indices, stages = _run_pipeline(
+            features, labels_arr if uses_labels else None, params, method_kwargs)
+        if cache_path:
+            save_npz_atomic(cache_path, embedding=embedding, indices=indices)
+            evict_embedding_cache(cache_dir)
+
+    with _cache_lock:
+        _memory_cache[key] = (embedding, indices)
+        if len(_memory_cache) > _MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return embedding.copy(), indices.copy(), stages
+
+
+def compute_tsne_embedding(features, perplexity: float = 30.0, random_state: int = 42,
+                           cache_dir: str = None, **tsne_kwargs):
+    """
+    Chạy t-SNE (sklearn) trên toàn bộ `features`, có cache.
+
+    Returns:
+        np.array: Mảng (n_samples, 2) chứa tọa độ t-SNE.
+    """
+    embedding, _, _ = compute_embedding(features, method='tsne', perplexity=perplexity,
+                                        random_state=random_state, cache_dir=cache_dir, **tsne_kwargs)
+    return embedding
+
+
+def format_stage_report(stages):
+    """Tạo bảng text ngắn gọn từ danh sách stage trả về bởi `compute_embedding`."""
+    lines = []
+    for st in stages:
+        if st['peak_mb'] is None:
+            mem = 'peak RSS n/a'
+        else:
+            mem = f"peak RSS {st['peak_mb']:8.1f} MB (+{st['growth_mb']:.1f})"
+        lines.append(f"  {st['stage']:<14} {st['seconds']:8.3f}s  {mem}  shape={st['shape']}")
+    return '\n'.join(lines)
+
+
+def evict_embedding_cache(cache_dir: str, max_bytes: int = None, max_age_days: float = None):
+    """
+    Dọn các file .npz trong `cache_dir` (xem `array_io.evict_npz_cache`). Được gọi sau mỗi lần ghi cache.
+
+    Args:
+        cache_dir (str): Thư mục cache embedding.
+        max_bytes (int, optional): Dung lượng tối đa. Mặc định là DISK_CACHE_MAX_BYTES.
+        max_age_days (float, optional): Tuổi tối đa (ngày). Mặc định là DISK_CACHE_MAX_AGE_DAYS.
+    """
+    evict_npz_cache(cache_dir, 'embedding',
+                    DISK_CACHE_MAX_BYTES if max_bytes is None else max_bytes,
+                    DISK_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days)
+
+
+def clear_embedding_cache(cache_dir: str = None):
+    """
+    Xóa cache embedding trong bộ nhớ và (nếu có) các file .npz trong `cache_dir`.
+    """
+    with _cache_lock:
+        _memory_cache.clear()
+    clear_npz_cache(cache_dir, 'embedding')
+
+
+# ==============================================================================
+# Các giai đoạn của pipeline
+# ==============================================================================
+def _run_pipeline(features, labels, params, method_kwargs):
+    stages = []
+    rng = np.random.default_rng(params['random_state'])
+    indices = np.arange(features.shape[0])
+    data = features
+
+    # --- Giai đoạn 1: Lấy mẫu ---
+    max_samples = params['max_samples']
+    if max_samples is not None and features.shape[0] > max_samples:
+        with _Stage('subsample', stages) as st:
+            indices = _subsample_indices(features.shape[0], max_samples, labels, rng)
+            data = features[indices]
+            st.shape = data.shape
+
+    # --- Giai đoạn 2: PCA giảm chiều ---
+    pca_components = params['pca_components']
+    if params['method'] != 'pca' and pca_components is not None and data.shape[1] > pca_components:
+        with _Stage('pca', stages) as st:
+            data = pca_project(data, pca_components)
+            st.shape = data.shape
+
+    # --- Giai đoạn 3: Thuật toán nhúng 2-D ---
+    method = params['method']
+    logger.info("Running %s embedding on %d samples x %d features...", method, *data.shape)
+    with _Stage(method, stages) as st:
+        if method == 'tsne':
+            embedding = _tsne_sklearn(data, params, method_kwargs)
+        elif method == 'opentsne':
+            embedding = _tsne_opentsne(data, params, method_kwargs)
+        else:
+            embedding = pca_project(data, 2)
+        st.shape = embedding.shape
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(format_stage_report(stages))
+    return np.asarray(embedding, dtype=float), indices, stages
+
+
+def _subsample_indices(n_samples, max_samples, labels, rng):
+    """
+    Chọn đúng `max_samples` chỉ số; nếu có nhãn thì giữ tỉ lệ từng lớp. Mỗi lớp có ít nhất
+    1 mẫu khi số lớp không vượt quá `max_samples`; nếu nhiều lớp hơn, chọn ngẫu nhiên
+    `max_samples` lớp (theo tỉ lệ kích thước), mỗi lớp một mẫu.
+    """
+    if labels is None:
+        return np.sort(rng.choice(n_samples, size=max_samples, replace=False))
+
+    classes, inverse = np.unique(labels, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(classes))
+    if len(classes) <= max_samples:
+        quotas = 1 + _largest_remainder(counts - 1, max_samples - len(classes))
+    else:
+        quotas = np.zeros(len(classes), dtype=int)
+        quotas[rng.choice(len(classes), size=max_samples, replace=False, p=counts / n_samples)] = 1
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    chosen = [rng.choice(order[start:start + count], size=quota, replace=False)
+              for start, count, quota in zip(starts, counts, quotas)]
+    return np.sort(np.concatenate(chosen))
+
+
+def _largest_remainder(weights, total):
+    """Chia `total` thành các phần nguyên tỉ lệ với `weights` (làm tròn theo phần dư lớn nhất)."""
+    if total == 0:
+        return np.zeros(len(weights), dtype=int)
+    exact = weights * total / weights.sum()
+    quotas = np.floor(exact).astype(int)
+    quotas[np.argsort(quotas - exact, kind='stable')[:total - quotas.sum()]] += 1
+    return quotas
+
+
+def pca_project(data, n_components):
+    """
+    PCA thuần NumPy: chiếu `data` lên `n_components` thành phần chính.
+    Dùng phân rã trị riêng của ma trận hiệp phương sai (n_features x n_features),
+    nên chi phí tuyến tính theo số mẫu.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    centered = data - data.mean(axis=0)
+    cov = centered.T @ centered / max(1, data.shape[0] - 1)
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    components = eigvecs[:, ::-1][:, :n_components]
+    # Cố định dấu của mỗi thành phần để kết quả ổn định giữa các lần chạy
+    signs = np.sign(components[np.abs(components).argmax(axis=0), np.arange(components.shape[1])])
+    signs[signs == 0] = 1
+    return centered @ (components * signs)
+
+
+def _tsne_sklearn(data, params, method_kwargs):
+    from sklearn.manifold import TSNE
+    tsne_params = {'perplexity': params['perplexity'], 'random_state': params['random_state'],
+                   'init': 'pca', 'learning_rate': 'auto'}
+    tsne_params.update(method_kwargs)
+    return TSNE(n_components=2, **tsne_params).fit_transform(data)
+
+
+def _tsne_opentsne(data, params, method_kwargs):
+    try:
+        from openTSNE import TSNE as OpenTSNE
+    except ImportError as exc:
+        raise ImportError("method='opentsne' cần gói openTSNE: pip install openTSNE") from exc
+    tsne_params = {'perplexity': params['perplexity'], 'random_state': params['random_state'],
+                   'negative_gradient_method': 'fft', 'n_jobs': -1}
+    tsne_params.update(method_kwargs)
+    return np.asarray(OpenTSNE(n_components=2, **tsne_params).fit(data))
+
+
+class _Stage:
+    """
+    Context manager đo thời gian và bộ nhớ của một giai đoạn.
+    Bộ nhớ được đo bằng đỉnh RSS của process (gần như không tốn chi phí, khác với
+    tracemalloc vốn làm t-SNE chậm đi khoảng 2 lần): 'peak_mb' là đỉnh RSS sau giai
+    đoạn, 'growth_mb' là phần đỉnh RSS tăng thêm trong giai đoạn đó.
+    """
+
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = stages
+        self.shape = None
+
+    def __enter__(self):
+        self._rss_start = _peak_rss_mb()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        peak_mb = _peak_rss_mb()
+        growth_mb = None if peak_mb is None else peak_mb - self._rss_start
+        self.stages.append({'stage': self.name, 'seconds': seconds, 'peak_mb': peak_mb,
+                            'growth_mb': growth_mb, 'shape': self.shape})
+        return False
+
+
+def _peak_rss_mb():
+    """Đỉnh RSS của process (MB), hoặc None nếu hệ điều hành không hỗ trợ (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _cache_stage(name, embedding):
+    return {'stage': name, 'seconds': 0.0, 'peak_mb': _peak_rss_mb(), 'growth_mb': 0.0,
+            'shape': embedding.shape}
@@ -0,0 +1,282 @@
+# src/figure_cache.py
+
+import filecmp
+import functools
+import inspect
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from content_hash import hash_content
+from figure_export import completed_save, get_async_writer, output_paths
+from render_log import log_render
+
+# ==============================================================================
+# Figure cache (content-addressed)
+# Bỏ qua việc vẽ lại một figure khi template, tham số, dữ liệu đầu vào và
+# rcParams đang dùng (từ `set_publication_style`) đều không đổi. "Template" gồm
+# cả mã nguồn: key chứa hash của file nguồn định nghĩa template (vd:
+# plot_templates.py), nên sửa màu, layout hay helper trong file đó sẽ vẽ lại.
+#
+# Mỗi file đã vẽ được lưu một bản sao trong `cache_dir` với tên
+#   <template>-<hash>.<ext>
+# Khi gặp lại cùng một hash, file được chép lại vào `output_path` (nếu cần)
+# thay vì vẽ lại từ đầu.
+#
+# Cache là tùy chọn (opt-in): gọi `enable_figure_cache()` để bật.
+# ==============================================================================
+
+_active_cache = None
+
+
+class FigureCache:
+    """
+    Kho lưu trữ figure theo hash nội dung, có giới hạn dung lượng và tuổi.
+
+    Args:
+        cache_dir (str): Thư mục lưu các bản sao figure.
+        max_bytes (int, optional): Tổng dung lượng tối đa của cache. Khi vượt quá,
+                                   các file ít được dùng gần đây nhất sẽ bị xóa.
+                                   Mặc định là 512 MB.
+        max_age_days (float, optional): Các file không được dùng quá số ngày này sẽ bị xóa.
+                                        Mặc định là 30 ngày. None để tắt.
+        force (bool, optional): Nếu True, luôn vẽ lại và ghi đè cache (dùng để
+                                ép làm mới toàn bộ figure). Mặc định là False.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 ** 2, max_age_days=30, force=False):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()  # Cache dùng chung giữa các thread (thread executor, writer pool)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # --- Khóa (key) ---
+    def make_key(self, template_name, arguments, code_version=None):
+        """
+        Tính key cho một lời gọi template. Trả về None nếu có tham số không băm được
+        (khi đó lời gọi sẽ được vẽ bình thường, không qua cache).
+
+        Args:
+            template_name (str): Tên template.
+            arguments (dict): Tham số của lời gọi (không gồm output_path).
+            code_version (str, optional): Phiên bản mã nguồn của template (xem `template_version`).
+        """
+        import matplotlib
+        rc = {k: repr(v) for k, v in matplotlib.rcParams.items()}
+        try:
+            return hash_content(template_name, code_version, arguments, rc)
+        except TypeError:
+            return None
+
+    def _blob_path(self, template_name, key, output_path):
+        ext = os.path.splitext(output_path)[1] or '.pdf'
+        return os.path.join(self.cache_dir, f"{template_name}-{key}{ext}")
+
+    # --- Đọc / ghi ---
+    def restore(self, template_name, key, output_path):
+        """
+        Nếu cache có figure ứng với `key`, đảm bảo `output_path` chứa đúng file đó.
+        Với danh sách đường dẫn, chỉ là hit khi cache có đủ mọi định dạng; khi thiếu
+        một định dạng, không file nào được chép.
+
+        Returns:
+            bool: True nếu cache hit (không cần vẽ lại).
+        """
+        paths = output_paths(output_path)
+        blobs = [self._blob_path(template_name, key, path) for path in paths]
+        if self.force or not all(os.path.exists(blob) for blob in blobs):
+            with self._stats_lock:
+                self.misses += 1
+            return False
+
+        for blob, path in zip(blobs, paths):
+            if not (os.path.exists(path) and filecmp.cmp(blob, path, shallow=False)):
+                _atomic_copy(blob, path)
+            os.utime(blob)  # Đánh dấu "vừa được dùng" cho chính sách LRU
+        with self._stats_lock:
+            self.hits += 1
+        return True
+
+    def store(self, template_name, key, output_path):
+        """Lưu bản sao của `output_path` vào cache rồi dọn dẹp theo giới hạn."""
+        if not os.path.exists(output_path):
+            return
+        _atomic_copy(output_path, self._blob_path(template_name, key, output_path))
+        self.evict()
+
+    # --- Dọn dẹp ---
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # Một process khác vừa xóa file này
+            if os.path.isfile(path):
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Xóa các file quá tuổi, rồi xóa các file cũ nhất cho tới khi dưới `max_bytes`."""
+        entries = self._entries()
+        now = time.time()
+        kept = []
+        for mtime, size, path in entries:
+            if self.max_age_days is not None and now - mtime > self.max_age_days * 86400:
+                _remove(path)
+            else:
+                kept.append((mtime, size, path))
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in kept)
+            for mtime, size, path in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                _remove(path)
+                total -= size
+
+    def invalidate(self, template_name=None):
+        """
+        Xóa cache để ép vẽ lại.
+
+        Args:
+            template_name (str, optional): Chỉ xóa các figure của template này.
+                                           Mặc định là xóa toàn bộ.
+        """
+        for _, _, path in self._entries():
+            if template_name is None or os.path.basename(path).startswith(f"{template_name}-"):
+                _remove(path)
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+
+def _atomic_copy(src, dst):
+    """Chép file qua một file tạm rồi đổi tên, an toàn khi nhiều process cùng ghi."""
+    dst_dir = os.path.dirname(os.path.abspath(dst))
+    os.makedirs(dst_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dst_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ==============================================================================
+# Cache toàn cục cho các template
+# ==============================================================================
+def enable_figure_cache(cache_dir='.figure_cache', max_bytes=512 * 1024 ** 2, max_age_days=30, force=False):
+    """
+    Bật cache cho tất cả các template trong `plot_templates.py`.
+
+    Args:
+        cache_dir (str, optional): Thư mục lưu cache. Mặc định là '.figure_cache'.
+        max_bytes (int, optional): Dung lượng tối đa. Mặc định là 512 MB.
+        max_age_days (float, optional): Tuổi tối đa của một file (ngày). Mặc định là 30.
+        force (bool, optional): Luôn vẽ lại và làm mới cache. Mặc định là False.
+
+    Returns:
+        FigureCache: Cache vừa được bật.
+    """
+    global _active_cache
+    _active_cache = FigureCache(cache_dir, max_bytes=max_bytes, max_age_days=max_age_days, force=force)
+    return _active_cache
+
+
+def disable_figure_cache():
+    """Tắt cache; các template sẽ luôn vẽ lại."""
+    global _active_cache
+    _active_cache = None
+
+
+def get_figure_cache():
+    """Trả về cache đang bật, hoặc None."""
+    return _active_cache
+
+
+def template_version(func):
+    """
+    Hash mã nguồn của module định nghĩa `func` (gồm cả các helper trong cùng file).
+    Nếu không đọc được mã nguồn (vd: chỉ có .pyc), dùng bytecode của chính `func`.
+    """
+    try:
+        source = inspect.getsource(sys.modules[func.__module__])
+    except (KeyError, OSError, TypeError):
+        code = func.__code__
+        return hash_content(code.co_code, repr(code.co_consts))
+    return hash_content(source)
+
+
+def cached_template(func):
+    """
+    Decorator bọc một template: nếu cache đang bật và figure được lưu ra file
+    (không truyền `ax`), bỏ qua việc vẽ khi đã có kết quả trùng khớp.
+    Khi cache hit, template trả về None vì không có axis nào được tạo (hoặc một
+    Future đã hoàn tất khi lưu bất đồng bộ đang bật).
+    """
+    signature = inspect.signature(func)
+    version = []  # Tính lần đầu cần đến: không tốn chi phí lúc import khi cache tắt
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = _active_cache
+        if cache is None:
+            return func(*args, **kwargs)
+        if not version:
+            version.append(template_version(func))
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        output_path = arguments.get('output_path')
+        if arguments.get('ax') is not None or not output_path:
+            return func(*args, **kwargs)
+
+        # Tên file không ảnh hưởng đến nội dung figure -> không đưa vào key
+        arguments.pop('output_path')
+        key = cache.make_key(func.__name__, arguments, version[0])
+        if key is None:
+            return func(*args, **kwargs)
+
+        # Danh sách output_path (nhiều định dạng): mỗi đuôi file là một bản sao riêng trong cache,
+        # chỉ bỏ qua việc vẽ khi mọi file đều có sẵn
+        paths = output_paths(output_path)
+        if cache.restore(func.__name__, key, output_path):
+            for path in paths:
+                log_render(path, f"Cached figure reused: {path}", cached=True)
+            # Lưu bất đồng bộ: trả về Future như khi vẽ, để nơi gọi xử lý một kiểu kết quả
+            return completed_save(output_path) if get_async_writer() is not None else None
+
+        def store(future=None):
+            if future is not None and future.exception() is not None:
+                return
+            for path in paths:
+                cache.store(func.__name__, key, path)
+
+        result = func(*args, **kwargs)
+        if isinstance(result, Future):
+            result.add_done_callback(store)  # File chỉ có sau khi writer pool ghi xong
+        else:
+            store()
+        return result
+
+    return wrapper
@@ -0,0 +1,284 @@
+# src/figure_export.py
+
+import contextvars
+import os
+import pickle
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from instrumentation import span
+from render_log import get_logger
+
+# ==============================================================================
+# Xuất một figure ra nhiều định dạng
+# Bài báo cần PDF, slide cần PNG, web cần SVG. Thay vì gọi template ba lần
+# (chuẩn bị dữ liệu, tạo artist và giải layout ba lần), mọi template nhận
+# `output_path` là một danh sách:
+#
+#   plot_heatmap(..., output_path=['figures/04.pdf', 'figures/04.png', 'figures/04.svg'])
+#
+# Figure được dựng một lần. File đầu tiên được lưu như bình thường (giống hệt khi
+# chỉ lưu một file); các file sau dùng lại layout của file đầu (layout engine tạm
+# tắt), nên không giải lại constrained layout. Vì số đo chữ của mỗi renderer hơi
+# khác nhau, khung 'tight' của các file sau có thể lệch vài phần mười point so
+# với khi lưu riêng từng file.
+#
+# Lưu song song (opt-in, `enable_parallel_export()`): một figure không thể được lưu
+# đồng thời từ nhiều thread, nên mỗi file thêm được lưu từ một bản sao (pickle) của
+# figure đã dàn trang. Phần lớn việc vẽ vẫn giữ GIL; chỉ nén ảnh PNG / luồng PDF
+# chạy song song thật sự, nên chỉ có lợi trên máy nhiều nhân với file lớn.
+# ==============================================================================
+
+_export_executor = None
+_async_writer = None
+
+logger = get_logger('figure_export')
+
+
+def output_paths(output_path):
+    """Chuẩn hóa `output_path` (một đường dẫn hoặc danh sách) thành list các đường dẫn."""
+    if isinstance(output_path, (str, os.PathLike)):
+        return [output_path]
+    paths = list(output_path)
+    if not paths:
+        raise ValueError("output_path phải có ít nhất một đường dẫn.")
+    return paths
+
+
+def _clone(fig):
+    """Bản sao độc lập của figure (qua pickle), hoặc None nếu figure không pickle được."""
+    try:
+        return pickle.loads(pickle.dumps(fig))
+    except Exception:
+        return None
+
+
+def save_figure(fig, output_path, **savefig_kwargs):
+    """
+    Lưu figure ra một hoặc nhiều file, chỉ giải layout một lần.
+
+    Args:
+        fig (matplotlib.figure.Figure): Figure đã vẽ xong.
+        output_path (str | list): Đường dẫn, hoặc danh sách đường dẫn (định dạng theo đuôi file).
+        **savefig_kwargs: Tham số thêm cho `fig.savefig` (vd: dpi), áp dụng cho mọi file.
+
+    Returns:
+        list: Các đường dẫn đã ghi, theo thứ tự của `output_path`.
+    """
+    paths = output_paths(output_path)
+    fig.savefig(paths[0], **savefig_kwargs)
+    if len(paths) == 1:
+        return paths
+
+    # Giữ nguyên vị trí các axes vừa được layout engine tính cho file đầu tiên
+    engine = fig.get_layout_engine()
+    if engine is not None:
+        fig.set_layout_engine('none')
+    try:
+        executor = _export_executor
+        clones = [_clone(fig) for _ in paths[2:]] if executor is not None else []
+        if clones and all(clone is not None for clone in clones):
+            futures = [executor.submit(clone.savefig, path, **savefig_kwargs)
+                       for clone, path in zip(clones, paths[2:])]
+            fig.savefig(paths[1], **savefig_kwargs)
+            for future in futures:
+                future.result()
+        else:
+            for path in paths[1:]:
+                fig.savefig(path, **savefig_kwargs)
+    finally:
+        if engine is not None:
+            fig.set_layout_engine(engine)
+    return paths
+
+
+# ==============================================================================
+# Bật / tắt lưu song song
+# ==============================================================================
+def enable_parallel_export(max_workers=None):
+    """
+    Lưu song song các file thêm của một danh sách `output_path`: file thứ hai trên thread
+    gọi template, các file sau (mỗi file một bản sao của figure) trên một thread pool.
+
+    Args:
+        max_workers (int, optional): Số thread. Mặc định theo ThreadPoolExecutor.
+
+    Returns:
+        ThreadPoolExecutor: Pool vừa được bật.
+    """
+    global _export_executor
+    disable_parallel_export()
+    _export_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='figure-export')
+    return _export_executor
+
+
+def disable_parallel_export():
+    """Tắt lưu song song; mọi file được lưu lần lượt trên thread gọi template."""
+    global _export_executor
+    if _export_executor is not None:
+        _export_executor.shutdown(wait=True)
+    _export_executor = None
+
+
+def get_export_executor():
+    """Trả về thread pool đang bật, hoặc None."""
+    return _export_executor
+
+
+# ==============================================================================
+# Lưu bất đồng bộ
+# `savefig` ở 600 DPI thường là bước chậm nhất của một template, và nó chặn
+# template tiếp theo. Với `enable_async_save()`, template trả về ngay sau khi vẽ
+# xong các artist; giải layout, render, nén và ghi file chạy trên một writer pool
+# nền. Template khi đó trả về một `concurrent.futures.Future` (thay vì axis), cho
+# ra (output_path, tổng số byte đã ghi):
+#
+#   enable_async_save(max_workers=2, max_pending=8)
+#   future = plot_heatmap(..., output_path='figures/04.pdf')
+#   ...                                  # vẽ figure tiếp theo trong lúc chờ ghi
+#   path, n_bytes = future.result()      # ném lại lỗi của savefig nếu có
+#   wait_for_saves()                     # chờ mọi file trước khi đọc chúng
+#
+# Backpressure: mỗi figure chờ lưu giữ toàn bộ artist trong bộ nhớ, nên tối đa
+# `max_pending` figure được chờ cùng lúc; template tiếp theo bị chặn tới khi có chỗ.
+#
+# dpi, bbox và pad_inches được chốt từ rcParams lúc gửi figure đi. Các rcParams khác
+# (vd: pdf.fonttype) được đọc lúc ghi: đừng đổi style khi còn figure đang chờ lưu.
+# ==============================================================================
+def savefig_options():
+    """Các tham số lưu đọc từ rcParams (savefig.dpi, savefig.bbox, savefig.pad_inches) ở thời điểm gọi."""
+    import matplotlib
+    rc = matplotlib.rcParams
+    return {'dpi': rc['savefig.dpi'], 'bbox_inches': rc['savefig.bbox'], 'pad_inches': rc['savefig.pad_inches']}
+
+
+def saved_bytes(output_path):
+    """Tổng kích thước (byte) của các file trong `output_path`."""
+    return sum(os.path.getsize(path) for path in output_paths(output_path))
+
+
+def completed_save(output_path):
+    """Future đã hoàn tất cho một figure không cần ghi lại (vd: lấy từ FigureCache)."""
+    future = Future()
+    future.set_result((output_path, saved_bytes(output_path)))
+    return future
+
+
+class AsyncWriter:
+    """
+    Writer pool nền có giới hạn số công việc đang chờ.
+
+    Args:
+        max_workers (int, optional): Số thread ghi file. Mặc định là 2.
+        max_pending (int, optional): Số figure tối đa đang chờ hoặc đang được lưu. `submit`
+                                     bị chặn khi đã đủ. Mặc định là 8.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='figure-writer')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Chạy `fn(*args, **kwargs)` trên writer pool (với contextvars của thread gọi, để
+        render event giữ tên template). Chặn khi đã có `max_pending` công việc.
+
+        Returns:
+            concurrent.futures.Future: Kết quả của `fn`. Callback gắn vào future này chạy
+                                       trước khi công việc được tính là xong (xem `wait`).
+        """
+        self._slots.acquire()
+        future = Future()
+        try:
+            job = self._executor.submit(contextvars.copy_context().run, self._run, future, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(job)
+        job.add_done_callback(self._done)
+        return future
+
+    def _run(self, future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with span('async_save'):
+                result = fn(*args, **kwargs)
+        except BaseException as exc:
+            with self._lock:
+                self.failed += 1
+            logger.error("Asynchronous save failed: %r", exc)
+            future.set_exception(exc)
+        else:
+            with self._lock:
+                self.completed += 1
+            future.set_result(result)  # Callback của nơi gọi (vd: FigureCache.store) chạy ngay tại đây
+
+    def _done(self, job):
+        with self._lock:
+            self._pending.discard(job)
+        self._slots.release()
+
+    @property
+    def pending(self):
+        """Số figure đang chờ hoặc đang được lưu."""
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self):
+        """Chờ mọi figure đã gửi được ghi xong (lỗi nằm trong từng future, không bị ném ra)."""
+        with self._lock:
+            futures = list(self._pending)
+        wait(futures)
+
+    def shutdown(self):
+        """Chờ các figure còn lại rồi dừng các thread ghi."""
+        self._executor.shutdown(wait=True)
+
+    def __repr__(self):
+        return (f"AsyncWriter(pending={self.pending}, max_pending={self.max_pending}, "
+                f"completed={self.completed}, failed={self.failed})")
+
+
+def enable_async_save(max_workers=2, max_pending=8):
+    """
+    Bật lưu bất đồng bộ cho tất cả các template trong `plot_templates.py`.
+
+    Args:
+        max_workers (int, optional): Số thread ghi file. Mặc định là 2.
+        max_pending (int, optional): Số figure tối đa chờ lưu cùng lúc. Mặc định là 8.
+
+    Returns:
+        AsyncWriter: Writer pool vừa được bật.
+    """
+    global _async_writer
+    disable_async_save()
+    _async_writer = AsyncWriter(max_workers=max_workers, max_pending=max_pending)
+    return _async_writer
+
+
+def disable_async_save():
+    """Chờ các figure đang chờ lưu rồi tắt lưu bất đồng bộ; các template lại lưu trước khi trả về."""
+    global _async_writer
+    writer, _async_writer = _async_writer, None
+    if writer is not None:
+        writer.shutdown()
+
+
+def get_async_writer():
+    """Trả về writer pool đang bật, hoặc None."""
+    return _async_writer
+
+
+def wait_for_saves():
+    """Chờ mọi figure đang được lưu bất đồng bộ (không làm gì khi chế độ này tắt)."""
+    writer = _async_writer
+    if writer is not None:
+        writer.wait()
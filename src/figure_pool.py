@@ -0,0 +1,207 @@
+# src/figure_pool.py
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import matplotlib
+
+from render_log import get_logger
+
+# ==============================================================================
+# Figure pool
+# Mỗi template tạo một figure mới rồi hủy nó sau khi lưu. Trong các batch job
+# gồm nhiều figure nhỏ cùng kích thước, pool giữ lại các figure đã dùng (kèm
+# canvas và bộ đệm ảnh Agg của nó), xóa sạch nội dung và dùng lại cho lần vẽ sau.
+#
+# Đảm bảo không rò rỉ trạng thái giữa các lần vẽ:
+#   - Khi trả về pool, figure bị xóa sạch (toàn bộ axes, artist, legend, suptitle...).
+#   - Khi lấy ra, kích thước, dpi, màu nền và layout engine được đặt lại theo rcParams.
+#   - Key của pool gồm kích thước, layout và dấu vân tay rcParams: figure tạo
+#     dưới style khác sẽ không bao giờ được dùng lại.
+#   - Nếu một template thay đổi rcParams trong lúc vẽ, rcParams được khôi phục
+#     và figure đó bị bỏ đi thay vì quay lại pool.
+#
+# Pool là tùy chọn (opt-in): gọi `enable_figure_pool()` để bật.
+# Figure trong pool không được đăng ký với pyplot (không có cửa sổ, không chiếm
+# số figure của `plt.figure`), vì vậy hãy lưu bằng `fig.savefig`.
+# ==============================================================================
+
+_active_pool = None
+logger = get_logger('figure_pool')
+
+
+class FigurePool:
+    """
+    Pool giới hạn các figure đã dựng sẵn, nhóm theo (kích thước, layout, rcParams).
+
+    Args:
+        max_size (int, optional): Tổng số figure rảnh tối đa giữ trong pool. Khi vượt quá,
+                                  figure ít được dùng gần đây nhất bị bỏ đi. Mặc định là 8.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._idle = OrderedDict()  # key -> list các figure rảnh (LRU theo key)
+        # figure đang dùng -> (key, ảnh chụp rcParams lúc lấy ra); weak để figure của một
+        # lần vẽ bị lỗi (không bao giờ được trả lại) vẫn được giải phóng
+        self._in_use = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    # --- Khóa (key) ---
+    @staticmethod
+    def _rc_snapshot():
+        return dict(matplotlib.rcParams)
+
+    @staticmethod
+    def make_key(figsize, layout, rc):
+        fingerprint = hash(tuple(sorted((k, repr(v)) for k, v in rc.items())))
+        return (tuple(float(v) for v in figsize), layout, fingerprint)
+
+    # --- Lấy / trả figure ---
+    def acquire(self, figsize, layout='constrained', nrows=1, ncols=1, squeeze=True):
+        """
+        Lấy một figure sạch (từ pool nếu có, không thì tạo mới) và tạo lưới axes trên đó.
+
+        Args:
+            figsize (tuple): Kích thước figure (inch).
+            layout (str, optional): Layout engine ('constrained', 'tight' hoặc None).
+                                    Mặc định là 'constrained'.
+            nrows, ncols, squeeze: Như `plt.subplots`.
+
+        Returns:
+            tuple: (fig, axes) giống `plt.subplots`.
+        """
+        rc = self._rc_snapshot()
+        key = self.make_key(figsize, layout, rc)
+        with self._lock:
+            idle = self._idle.get(key)
+            fig = idle.pop() if idle else None
+            if idle is not None and not idle:
+                del self._idle[key]
+            if fig is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if fig is None:
+            fig = new_figure(figsize, layout)
+        else:
+            _reset_figure(fig, figsize, layout)
+        with self._lock:
+            self._in_use[fig] = (key, rc)
+        return fig, fig.subplots(nrows, ncols, squeeze=squeeze)
+
+    def owns(self, fig):
+        """True nếu `fig` được lấy từ pool này và chưa được trả lại."""
+        return fig in self._in_use
+
+    def discard(self, fig):
+        """Bỏ theo dõi `fig` mà không đưa lại vào pool (vd: figure được lưu trên thread khác)."""
+        with self._lock:
+            self._in_use.pop(fig, None)
+
+    def release(self, fig):
+        """
+        Trả figure về pool sau khi đã lưu. Nội dung figure bị xóa ngay để giải phóng
+        bộ nhớ của dữ liệu đã vẽ.
+        """
+        with self._lock:
+            entry = self._in_use.pop(fig, None)
+        if entry is None:
+            return
+        key, rc = entry
+        _clear_figure(fig)
+
+        if self._rc_snapshot() != rc:
+            # Template đã thay đổi rcParams: khôi phục và không dùng lại figure này
+            logger.warning("rcParams changed during a pooled render; restored and figure discarded")
+            matplotlib.rcParams.update(rc)
+            return
+
+        with self._lock:
+            self._idle.setdefault(key, []).append(fig)
+            self._idle.move_to_end(key)
+            while sum(len(figs) for figs in self._idle.values()) > self.max_size:
+                oldest_key = next(iter(self._idle))
+                self._idle[oldest_key].pop(0)
+                if not self._idle[oldest_key]:
+                    del self._idle[oldest_key]
+
+    def clear(self):
+        """Bỏ toàn bộ figure rảnh trong pool."""
+        with self._lock:
+            self._idle.clear()
+
+    def __len__(self):
+        return sum(len(figs) for figs in self._idle.values())
+
+    def __repr__(self):
+        return f"FigurePool(idle={len(self)}, max_size={self.max_size}, hits={self.hits}, misses={self.misses})"
+
+
+def new_figure(figsize, layout='constrained'):
+    """
+    Tạo figure không qua pyplot, gắn canvas Agg (lưu được mọi định dạng qua `savefig`).
+    An toàn khi gọi từ nhiều thread: không có figure manager hay "figure hiện tại" dùng chung.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize, layout=layout)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _clear_figure(fig):
+    """
+    Xóa toàn bộ nội dung figure. Axes được gỡ trực tiếp: `Figure.clear()` gọi `ax.clear()`
+    cho từng axes trước khi gỡ, tốn gần bằng việc tạo lại axes mới.
+    """
+    for ax in tuple(fig.axes):
+        fig.delaxes(ax)
+    fig.clear()
+
+
+def _reset_figure(fig, figsize, layout):
+    """Đặt lại các thuộc tính cấp figure mà `Figure.clear()` không đụng tới."""
+    rc = matplotlib.rcParams
+    fig.set_size_inches(figsize, forward=False)
+    fig.set_dpi(rc['figure.dpi'])
+    fig.set_facecolor(rc['figure.facecolor'])
+    fig.set_edgecolor(rc['figure.edgecolor'])
+    fig.set_frameon(rc['figure.frameon'])
+    fig.set_layout_engine(layout)  # Engine mới, đọc lại các padding từ rcParams
+
+
+# ==============================================================================
+# Bật / tắt pool cho các template
+# ==============================================================================
+def enable_figure_pool(max_size=8):
+    """
+    Bật pool cho tất cả các template trong `plot_templates.py`.
+
+    Args:
+        max_size (int, optional): Số figure rảnh tối đa. Mặc định là 8.
+
+    Returns:
+        FigurePool: Pool vừa được bật.
+    """
+    global _active_pool
+    _active_pool = FigurePool(max_size=max_size)
+    return _active_pool
+
+
+def disable_figure_pool():
+    """Tắt pool; các template sẽ tạo figure mới cho mỗi lần vẽ."""
+    global _active_pool
+    if _active_pool is not None:
+        _active_pool.clear()
+    _active_pool = None
+
+
+def get_figure_pool():
+    """Trả về pool đang bật, hoặc None."""
+    return _active_pool
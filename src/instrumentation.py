@@ -0,0 +1,374 @@
+# src/instrumentation.py
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# ==============================================================================
+# Instrumentation (đo thời gian từng giai đoạn)
+# Khi một figure chậm, cần biết thời gian nằm ở đâu: chuẩn bị dữ liệu (chuẩn hóa
+# DataFrame, nội suy griddata, t-SNE...), tạo artist, giải constrained layout hay
+# ghi file. Mỗi template được chia thành các "span" có tên:
+#
+#   plot_heatmap                (span gốc: toàn bộ lời gọi template)
+#   ├── figure                  (tạo figure và axes, hoặc lấy từ FigurePool)
+#   ├── data_prep               (sắp xếp, gộp khối, định dạng số...)
+#   ├── artists                 (tạo các artist trên axes)
+#   └── savefig                 (lưu file, gồm cả render)
+#       └── layout              (constrained layout, được giải trong lúc lưu)
+#
+# Span đã xong được giữ trong Tracer và gửi tới các callback đã đăng ký. Tracer
+# xuất được Chrome trace (JSON, mở bằng chrome://tracing hoặc Perfetto) và
+# "folded stacks" (cho flamegraph.pl / speedscope / inferno).
+#
+# Instrumentation là tùy chọn (opt-in): gọi `enable_instrumentation()` để bật.
+# Khi tắt, mỗi điểm đo chỉ tốn một phép kiểm tra None.
+# ==============================================================================
+
+_active_tracer = None
+_NULL_CONTEXT = contextlib.nullcontext()
+# (tên template, perf_counter lúc bắt đầu) của lời gọi template đang chạy (theo thread / task)
+_current_template = contextvars.ContextVar('current_template', default=None)
+
+
+class Span:
+    """
+    Một khoảng thời gian có tên.
+
+    Attributes:
+        name (str): Tên span (tên template, 'data_prep', 'artists', 'savefig', 'layout'...).
+        path (tuple): Tên các span từ gốc tới span này, vd: ('plot_heatmap', 'savefig', 'layout').
+        start (float): Thời điểm bắt đầu (giây, epoch).
+        duration (float): Thời gian (giây).
+        self_time (float): Thời gian không nằm trong span con nào.
+        attrs (dict): Thông tin thêm (vd: output_path).
+        pid, tid (int): Process và thread đã ghi span.
+    """
+
+    __slots__ = ('name', 'path', 'start', 'duration', 'self_time', 'attrs', 'pid', 'tid',
+                 'root', '_t0', '_child_time', '_is_stage')
+
+    def __init__(self, name, path, start, attrs, pid, tid, duration=0.0, self_time=0.0):
+        self.name = name
+        self.path = path
+        self.start = start
+        self.duration = duration
+        self.self_time = self_time
+        self.attrs = attrs
+        self.pid = pid
+        self.tid = tid
+        self.root = None
+        self._t0 = 0.0
+        self._child_time = 0.0
+        self._is_stage = False
+
+    def to_dict(self):
+        return {'name': self.name, 'path': list(self.path), 'start': self.start, 'duration': self.duration,
+                'self_time': self.self_time, 'attrs': self.attrs, 'pid': self.pid, 'tid': self.tid}
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(record['name'], tuple(record['path']), record['start'], record.get('attrs', {}),
+                   record['pid'], record['tid'], record['duration'], record['self_time'])
+
+    def __repr__(self):
+        return f"Span({'/'.join(self.path)}, {self.duration * 1000:.2f} ms)"
+
+
+class Tracer:
+    """
+    Ghi các span theo từng thread và giữ các span đã xong để xuất ra file.
+
+    Args:
+        callback (callable, optional): Được gọi với mỗi `Span` vừa xong (trên thread đã ghi nó).
+        max_spans (int, optional): Số span tối đa được giữ; span cũ nhất bị bỏ khi vượt quá.
+                                   Mặc định là 1.000.000.
+    """
+
+    def __init__(self, callback=None, max_spans=1_000_000):
+        self.spans = deque(maxlen=max_spans)
+        self._callbacks = [callback] if callback is not None else []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # perf_counter cho độ chính xác, quy về epoch để ghép được span từ nhiều process
+        self._epoch = time.time() - time.perf_counter()
+
+    # --- Callback ---
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    # --- Ghi span ---
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _begin(self, name, attrs, is_stage=False):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        t0 = time.perf_counter()
+        span = Span(name, (parent.path if parent else ()) + (name,), self._epoch + t0, attrs,
+                    os.getpid(), threading.get_ident())
+        span.root = parent.root if parent else span
+        span._t0 = t0
+        span._is_stage = is_stage
+        stack.append(span)
+        return span
+
+    def _end(self, span):
+        stack = self._stack()
+        if span not in stack:
+            return
+        # Đóng các giai đoạn còn mở bên trong span này trước
+        while stack[-1] is not span:
+            self._finish(stack.pop())
+        self._finish(stack.pop())
+
+    def _finish(self, span):
+        span.duration = time.perf_counter() - span._t0
+        span.self_time = span.duration - span._child_time
+        stack = self._stack()
+        if stack:
+            stack[-1]._child_time += span.duration
+        with self._lock:
+            self.spans.append(span)
+        for callback in self._callbacks:
+            callback(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """
+        Context manager ghi một span lồng trong span đang mở của thread hiện tại.
+
+        Args:
+            name (str): Tên span.
+            **attrs: Thông tin thêm, được ghi vào `Span.attrs` (và `args` của Chrome trace).
+        """
+        span = self._begin(name, attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self._end(span)
+
+    def stage(self, name):
+        """
+        Bắt đầu giai đoạn `name` của span đang mở, kết thúc giai đoạn trước đó (nếu có).
+        Giai đoạn cuối cùng kết thúc cùng với span chứa nó.
+        """
+        stack = self._stack()
+        if stack and stack[-1]._is_stage:
+            self._finish(stack.pop())
+        self._begin(name, {}, is_stage=True)
+
+    # --- Truy xuất ---
+    def pop_tree(self, root):
+        """Lấy ra (và xóa khỏi tracer) mọi span đã xong thuộc cây có gốc là `root`."""
+        with self._lock:
+            taken = [s for s in self.spans if s.root is root]
+            kept = [s for s in self.spans if s.root is not root]
+            self.spans.clear()
+            self.spans.extend(kept)
+        return taken
+
+    def extend(self, records):
+        """Thêm các span ghi ở nơi khác (vd: từ worker process), dạng `Span` hoặc dict."""
+        with self._lock:
+            self.spans.extend(r if isinstance(r, Span) else Span.from_dict(r) for r in records)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def summary(self):
+        """
+        Tổng hợp thời gian theo đường dẫn span.
+
+        Returns:
+            dict: {'plot_heatmap/savefig': {'count', 'total_s', 'mean_s', 'max_s'}}, sắp xếp theo đường dẫn.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        stats = {}
+        for span in spans:
+            entry = stats.setdefault('/'.join(span.path), {'count': 0, 'total_s': 0.0, 'max_s': 0.0})
+            entry['count'] += 1
+            entry['total_s'] += span.duration
+            entry['max_s'] = max(entry['max_s'], span.duration)
+        for entry in stats.values():
+            entry['mean_s'] = entry['total_s'] / entry['count']
+        return dict(sorted(stats.items()))
+
+    def format_summary(self):
+        lines = [f"{'span':<44} {'count':>6} {'total':>10} {'mean':>10} {'max':>10}"]
+        for path, s in self.summary().items():
+            lines.append(f"{path:<44} {s['count']:>6} {s['total_s']:9.3f}s {s['mean_s'] * 1000:8.1f}ms "
+                         f"{s['max_s'] * 1000:8.1f}ms")
+        return '\n'.join(lines)
+
+    # --- Xuất file ---
+    def to_chrome_trace(self):
+        """Các span dưới dạng Chrome Trace Event Format (sự kiện 'X' - complete event)."""
+        with self._lock:
+            spans = list(self.spans)
+        origin = min((s.start for s in spans), default=0.0)
+        events = [{
+            'name': s.name,
+            'cat': s.path[0],
+            'ph': 'X',
+            'ts': (s.start - origin) * 1e6,
+            'dur': s.duration * 1e6,
+            'pid': s.pid,
+            'tid': s.tid,
+            'args': s.attrs,
+        } for s in spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+    def folded_stacks(self):
+        """
+        Dòng "gốc;con;cháu <micro giây>" theo self time, định dạng đầu vào của flamegraph.pl.
+
+        Returns:
+            list: Các dòng, sắp xếp theo stack.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        totals = {}
+        for span in spans:
+            key = ';'.join(span.path)
+            totals[key] = totals.get(key, 0.0) + span.self_time
+        return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(totals.items())
+                if round(seconds * 1e6) > 0]
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            f.write('\n'.join(self.folded_stacks()) + '\n')
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __repr__(self):
+        return f"Tracer(spans={len(self)})"
+
+
+def print_span(span):
+    """Callback đơn giản: in mỗi span vừa xong, vd: 'plot_heatmap/savefig: 412.3 ms'."""
+    print(f"{'/'.join(span.path)}: {span.duration * 1000:.1f} ms")
+
+
+# ==============================================================================
+# Bật / tắt instrumentation cho các template
+# ==============================================================================
+def enable_instrumentation(callback=None, max_spans=1_000_000):
+    """
+    Bật ghi span cho tất cả các template trong `plot_templates.py`.
+
+    Args:
+        callback (callable, optional): Được gọi với mỗi `Span` vừa xong, vd: `print_span`.
+        max_spans (int, optional): Số span tối đa được giữ. Mặc định là 1.000.000.
+
+    Returns:
+        Tracer: Tracer vừa được bật.
+    """
+    global _active_tracer
+    _active_tracer = Tracer(callback=callback, max_spans=max_spans)
+    return _active_tracer
+
+
+def disable_instrumentation():
+    """Tắt instrumentation; các template không ghi span nữa."""
+    global _active_tracer
+    _active_tracer = None
+
+
+def get_tracer():
+    """Trả về tracer đang bật, hoặc None."""
+    return _active_tracer
+
+
+def span(name, **attrs):
+    """`Tracer.span` trên tracer đang bật; không làm gì khi instrumentation tắt."""
+    tracer = _active_tracer
+    if tracer is None:
+        return _NULL_CONTEXT
+    return tracer.span(name, **attrs)
+
+
+def mark_stage(name):
+    """`Tracer.stage` trên tracer đang bật; không làm gì khi instrumentation tắt."""
+    tracer = _active_tracer
+    if tracer is not None:
+        tracer.stage(name)
+
+
+@contextlib.contextmanager
+def _traced_layout(tracer, fig):
+    engine = fig.get_layout_engine()
+    execute = engine.execute
+
+    def timed_execute(figure):
+        with tracer.span('layout'):
+            return execute(figure)
+
+    engine.execute = timed_execute  # Chỉ thay trên engine của figure này
+    try:
+        yield
+    finally:
+        del engine.execute
+
+
+def trace_layout(fig):
+    """
+    Ghi thời gian giải layout engine của `fig` thành span 'layout' (trong lúc lưu).
+    Không làm gì khi instrumentation tắt hoặc figure không có layout engine.
+    """
+    tracer = _active_tracer
+    if tracer is None or fig.get_layout_engine() is None:
+        return _NULL_CONTEXT
+    return _traced_layout(tracer, fig)
+
+
+def current_template():
+    """(tên template, perf_counter lúc bắt đầu) của template đang chạy, hoặc None."""
+    return _current_template.get()
+
+
+def traced_template(func):
+    """
+    Decorator bọc một template trong một span gốc mang tên template. Các giai đoạn
+    bên trong được đánh dấu bằng `mark_stage`. Luôn ghi lại template đang chạy
+    (`current_template`), kể cả khi instrumentation tắt, để render event có tên và thời gian.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_template.set((func.__name__, time.perf_counter()))
+        try:
+            tracer = _active_tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            output_path = signature.bind_partial(*args, **kwargs).arguments.get('output_path')
+            attrs = {'output_path': output_path} if output_path is not None else {}
+            with tracer.span(func.__name__, **attrs):
+                return func(*args, **kwargs)
+        finally:
+            _current_template.reset(token)
+
+    return wrapper
@@ -0,0 +1,217 @@
+# src/interpolation.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ==============================================================================
+# Nội suy dữ liệu rời rạc (scattered data interpolation)
+# `griddata` tam giác hóa lại toàn bộ tập điểm ở mỗi lần gọi. Khi cùng một tập
+# điểm (x, y) được dùng cho nhiều trường Z hoặc nhiều độ phân giải lưới, phần
+# tốn kém nhất (tam giác Delaunay, KD-tree, trọng số trên lưới) chỉ cần tính một lần.
+# ==============================================================================
+
+INTERPOLATION_METHODS = ('linear', 'cubic', 'nearest', 'idw', 'rbf')
+_GRID_CACHE_SIZE = 4  # Số lưới (độ phân giải) giữ trọng số trong bộ nhớ
+
+
+class ScatteredInterpolator:
+    """
+    Bộ nội suy dựng một lần cho một tập điểm (x, y), dùng lại cho nhiều trường Z
+    và nhiều độ phân giải lưới.
+
+    Args:
+        x (array-like): Tọa độ X của các điểm mẫu.
+        y (array-like): Tọa độ Y của các điểm mẫu.
+        method (str, optional): Phương pháp nội suy:
+            - 'linear': nội suy tuyến tính trên tam giác Delaunay (trọng số barycentric
+                        được tính một lần cho mỗi lưới).
+            - 'cubic': Clough-Tocher (giống griddata 'cubic') trên tam giác đã dựng sẵn.
+            - 'nearest': giá trị của điểm gần nhất (KD-tree).
+            - 'idw': trung bình có trọng số nghịch đảo khoảng cách của `neighbors` điểm gần nhất.
+            - 'rbf': RBF chỉ dùng `neighbors` điểm gần nhất (scipy RBFInterpolator).
+            Mặc định là 'cubic'.
+        neighbors (int, optional): Số điểm lân cận cho 'idw' và 'rbf'. Mặc định là 16.
+        power (float, optional): Số mũ khoảng cách cho 'idw'. Mặc định là 2.
+        rbf_kernel (str, optional): Kernel cho 'rbf'. Mặc định là 'thin_plate_spline'.
+        smoothing (float, optional): Tham số làm trơn cho 'rbf'. Mặc định là 0.
+
+    Ghi chú:
+        'linear' và 'cubic' trả về NaN bên ngoài bao lồi (convex hull) của các điểm,
+        giống `griddata`; 'nearest', 'idw' và 'rbf' ngoại suy trên toàn lưới.
+    """
+
+    def __init__(self, x, y, method: str = 'cubic', neighbors: int = 16, power: float = 2.0,
+                 rbf_kernel: str = 'thin_plate_spline', smoothing: float = 0.0):
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError(f"method phải là một trong {INTERPOLATION_METHODS}, nhận được '{method}'.")
+        self.points = np.column_stack([np.asarray(x, dtype=float).ravel(),
+                                       np.asarray(y, dtype=float).ravel()])
+        self.method = method
+        self.neighbors = min(neighbors, len(self.points))
+        self.power = power
+        self.rbf_kernel = rbf_kernel
+        self.smoothing = smoothing
+        self._triangulation = None
+        self._tree = None
+        self._grid_weights = OrderedDict()
+        self._lock = threading.Lock()  # Một bộ nội suy có thể được dùng chung giữa các thread
+
+    # --- Cấu trúc dựng một lần ---
+    @property
+    def triangulation(self):
+        """Tam giác Delaunay của các điểm mẫu (dựng khi cần lần đầu)."""
+        if self._triangulation is None:
+            from scipy.spatial import Delaunay
+            self._triangulation = Delaunay(self.points)
+        return self._triangulation
+
+    @property
+    def tree(self):
+        """KD-tree của các điểm mẫu (dựng khi cần lần đầu)."""
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.points)
+        return self._tree
+
+    @property
+    def extent(self):
+        """(x_min, x_max, y_min, y_max) của các điểm mẫu."""
+        (x_min, y_min), (x_max, y_max) = self.points.min(axis=0), self.points.max(axis=0)
+        return x_min, x_max, y_min, y_max
+
+    def grid(self, resolution=100):
+        """
+        Lưới đều phủ các điểm mẫu.
+
+        Args:
+            resolution (int hoặc tuple): Số điểm lưới mỗi chiều, hoặc (nx, ny).
+
+        Returns:
+            tuple: (xi, yi) - hai vector tọa độ của lưới.
+        """
+        nx, ny = (resolution, resolution) if np.isscalar(resolution) else resolution
+        x_min, x_max, y_min, y_max = self.extent
+        return np.linspace(x_min, x_max, nx), np.linspace(y_min, y_max, ny)
+
+    # --- Nội suy ---
+    def __call__(self, z, resolution=100):
+        """
+        Nội suy `z` lên lưới đều.
+
+        Args:
+            z (array-like): Giá trị tại các điểm mẫu, dạng (n_points,) hoặc
+                            (n_fields, n_points) cho nhiều trường cùng lúc.
+            resolution (int hoặc tuple, optional): Độ phân giải lưới. Mặc định là 100.
+
+        Returns:
+            tuple: (xi, yi, zi) với zi có dạng (ny, nx) hoặc (n_fields, ny, nx).
+        """
+        xi, yi = self.grid(resolution)
+        return xi, yi, self.interpolate(z, xi, yi)
+
+    def interpolate(self, z, xi, yi):
+        """
+        Nội suy `z` lên lưới tạo bởi hai vector `xi`, `yi`. Trọng số trên lưới
+        (barycentric, KD-tree) được lưu lại và dùng lại cho các trường Z sau.
+
+        Returns:
+            np.ndarray: Dạng (len(yi), len(xi)) hoặc (n_fields, len(yi), len(xi)).
+        """
+        z = np.asarray(z, dtype=float)
+        single = z.ndim == 1
+        fields = z[None, :] if single else z
+        if fields.shape[-1] != len(self.points):
+            raise ValueError(f"z có {fields.shape[-1]} giá trị, nhưng có {len(self.points)} điểm mẫu.")
+
+        xi, yi = np.asarray(xi, dtype=float), np.asarray(yi, dtype=float)
+        shape = (len(yi), len(xi))
+        if self.method in ('linear', 'nearest', 'idw'):
+            result = self._interpolate_weighted(fields, xi, yi)
+        else:
+            targets = self._grid_points(xi, yi)
+            result = np.stack([self._interpolate_field(field, targets) for field in fields])
+        result = result.reshape((len(fields),) + shape)
+        return result[0] if single else result
+
+    def _grid_points(self, xi, yi):
+        grid_x, grid_y = np.meshgrid(xi, yi)
+        return np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+    def _interpolate_field(self, field, targets):
+        """'cubic' và 'rbf': hệ số phụ thuộc vào Z nên phải khớp lại cho mỗi trường."""
+        from scipy.interpolate import CloughTocher2DInterpolator, RBFInterpolator
+
+        if self.method == 'cubic':
+            return CloughTocher2DInterpolator(self.triangulation, field)(targets)
+        return RBFInterpolator(self.points, field, neighbors=self.neighbors,
+                               kernel=self.rbf_kernel, smoothing=self.smoothing)(targets)
+
+    def _interpolate_weighted(self, fields, xi, yi):
+        """'linear', 'nearest', 'idw': mỗi ô lưới là tổ hợp tuyến tính cố định của vài điểm mẫu."""
+        indices, weights = self._weights_for_grid(xi, yi)
+        # (n_fields, n_grid, k) * (n_grid, k) -> (n_fields, n_grid)
+        return np.einsum('fgk,gk->fg', fields[:, indices], weights)
+
+    def _weights_for_grid(self, xi, yi):
+        key = (xi.tobytes(), yi.tobytes())
+        with self._lock:
+            if key in self._grid_weights:
+                self._grid_weights.move_to_end(key)
+                return self._grid_weights[key]
+
+        targets = self._grid_points(xi, yi)
+        if self.method == 'linear':
+            indices, weights = self._barycentric(targets)
+        elif self.method == 'nearest':
+            _, idx = self.tree.query(targets, k=1)
+            indices, weights = idx[:, None], np.ones((len(targets), 1))
+        else:
+            indices, weights = self._idw(targets)
+
+        with self._lock:
+            self._grid_weights[key] = (indices, weights)
+            if len(self._grid_weights) > _GRID_CACHE_SIZE:
+                self._grid_weights.popitem(last=False)
+        return indices, weights
+
+    def _barycentric(self, targets):
+        """Chỉ số 3 đỉnh tam giác chứa mỗi điểm lưới và trọng số barycentric (NaN ngoài bao lồi)."""
+        tri = self.triangulation
+        simplex = tri.find_simplex(targets)
+        inside = simplex >= 0
+        simplex = np.where(inside, simplex, 0)
+        transform = tri.transform[simplex]
+        bary = np.einsum('gij,gj->gi', transform[:, :2], targets - transform[:, 2])
+        weights = np.column_stack([bary, 1 - bary.sum(axis=1)])
+        weights[~inside] = np.nan
+        return tri.simplices[simplex], weights
+
+    def _idw(self, targets):
+        distances, indices = self.tree.query(targets, k=self.neighbors)
+        if self.neighbors == 1:
+            distances, indices = distances[:, None], indices[:, None]
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / distances ** self.power
+        # Điểm lưới trùng đúng một điểm mẫu: lấy nguyên giá trị của điểm đó
+        exact = distances[:, 0] == 0
+        weights[exact] = 0.0
+        weights[exact, 0] = 1.0
+        weights /= weights.sum(axis=1, keepdims=True)
+        return indices, weights
+
+    def __getstate__(self):
+        # Chỉ pickle các điểm và tham số (vd: khi gửi sang worker của batch_render);
+        # tam giác, KD-tree và trọng số được dựng lại khi cần.
+        state = self.__dict__.copy()
+        state.update(_triangulation=None, _tree=None, _grid_weights=OrderedDict())
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"ScatteredInterpolator(n_points={len(self.points)}, method='{self.method}')"
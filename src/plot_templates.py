@@ -1,14 +1,37 @@
 # src/plot_templates.py (VERSION 2 - SUBPLOT ENABLED)
 
-import matplotlib.pyplot as plt
-import pandas as pd
+from __future__ import annotations
+
+import logging
+import os
+from typing import TYPE_CHECKING
+
+import matplotlib
 import numpy as np
-import seaborn as sns
+from matplotlib.font_manager import FontProperties
 from publication_style import CONTEXT_COLORS, COLOR_PALETTE
+from figure_cache import cached_template
+from figure_pool import get_figure_pool, new_figure
+from instrumentation import traced_template, mark_stage, trace_layout
+from figure_export import get_async_writer, output_paths, save_figure, saved_bytes, savefig_options
+from render_log import get_logger, log_render
+from streaming_histogram import HistogramAccumulator
+from array_io import load_array, block_factors, block_reduce
+from clustering import cluster_order, is_symmetric
+
+# seaborn (kéo theo scipy.stats) và pandas chiếm phần lớn thời gian import module này.
+# Chúng được import bên trong các template cần đến, nên một script chỉ vẽ biểu đồ
+# đường hay biểu đồ cột không phải trả chi phí đó.
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = get_logger('plot_templates')
 
 # src/plot_templates.py
 # (thêm vào cuối file)
 
+@traced_template
+@cached_template
 def plot_stacked_bar_chart(
     data: pd.DataFrame,
     category_col: str,
@@ -16,11 +39,12 @@ def plot_stacked_bar_chart(
     y_label: str,
     title: str,
 
-    output_path: str,
+    output_path: str | list,
     is_100_percent: bool = False,
     figsize: tuple = (8, 6),
     palette: dict = None,
-    ax=None
+    ax=None,
+    thin_labels: bool = True
 ):
     """
     Tạo và lưu biểu đồ cột xếp chồng (stacked bar chart).
@@ -31,16 +55,19 @@ def plot_stacked_bar_chart(
         component_cols (list): Danh sách tên các cột chứa giá trị của các thành phần.
         y_label (str): Nhãn cho trục Y.
         title (str): Tiêu đề biểu đồ.
-        output_path (str): Đường dẫn lưu file.
+        output_path (str | list): Đường dẫn lưu file, hoặc danh sách đường dẫn để lưu nhiều định dạng.
         is_100_percent (bool, optional): Nếu True, vẽ biểu đồ 100% stacked. 
                                          Mặc định là False.
         figsize (tuple, optional): Kích thước figure.
         palette (dict, optional): Dictionary map tên thành phần với màu sắc.
         ax (matplotlib.axes.Axes, optional): Subplot axis để vẽ lên.
+        thin_labels (bool, optional): Chỉ hiện mỗi k nhãn hạng mục khi chúng chồng lên nhau.
+                                      Mặc định là True.
     """
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
 
     # Chuẩn bị dữ liệu
+    mark_stage('data_prep')
     df_plot = data.set_index(category_col)[component_cols]
 
     if is_100_percent:
@@ -53,22 +80,26 @@ def plot_stacked_bar_chart(
         colors = [COLOR_PALETTE[c] for c in ['blue', 'green', 'orange', 'red', 'purple']]
         palette = {col: colors[i % len(colors)] for i, col in enumerate(component_cols)}
     
-    # Vẽ biểu đồ bằng pandas' plotting, nó xử lý việc xếp chồng rất tốt
-    df_plot.plot(
-        kind='bar',
-        stacked=True,
-        color=[palette.get(col) for col in component_cols],
-        ax=ax,
-        width=0.8 # Làm cho các cột rộng hơn một chút
-    )
-    
+    # Tính vị trí xếp chồng bằng NumPy (giá trị dương và âm xếp riêng, giống pandas)
+    # và vẽ mỗi thành phần bằng một PolyCollection
+    values = np.nan_to_num(df_plot.to_numpy(dtype=float))
+    x = np.arange(len(df_plot))
+    width = 0.8  # Làm cho các cột rộng hơn một chút
+    positive = np.cumsum(np.where(values > 0, values, 0), axis=1) - np.where(values > 0, values, 0)
+    negative = np.cumsum(np.where(values < 0, values, 0), axis=1) - np.where(values < 0, values, 0)
+    bottoms = np.where(values >= 0, positive, negative)
+    mark_stage('artists')
+    for j, col in enumerate(component_cols):
+        _draw_bar_series(ax, x, values[:, j], width, palette.get(col), label=col, bottom=bottoms[:, j])
+    ax.set_xlim(-0.25 - width / 2, len(x) - 1 + 0.25 + width / 2)
+
     # --- Tinh chỉnh ---
     ax.set_ylabel(y_label)
     ax.set_xlabel(category_col) # Tự động lấy tên cột làm nhãn X
     ax.set_title(title)
     
-    # Xoay nhãn trục X để dễ đọc
-    plt.setp(ax.get_xticklabels(), rotation=0, ha="center")
+    # Nhãn trục X nằm ngang, thưa bớt khi có quá nhiều hạng mục
+    _set_category_ticks(ax, x, df_plot.index, thin_labels)
     
     # Di chuyển legend ra ngoài biểu đồ để không che mất dữ liệu
     ax.legend(title='Components', bbox_to_anchor=(1.02, 1), loc='upper left')
@@ -77,15 +108,17 @@ def plot_stacked_bar_chart(
     ax.grid(axis='y', which='major', linestyle=':', linewidth=0.7)
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"Stacked bar chart saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "Stacked bar chart")
+        if saved is not None:
+            return saved
 
     return ax
 
 # src/plot_templates.py
 # (thêm vào cuối file)
 
+@traced_template
+@cached_template
 def plot_dual_axis(
     # Dữ liệu cho trục Y1 (trái)
     x_data,
@@ -99,7 +132,7 @@ def plot_dual_axis(
     # Các thông tin chung
     x_label: str,
     title: str,
-    output_path: str,
+    output_path: str | list,
     figsize: tuple = (7, 5),
     y1_style: dict = None,
     y2_style: dict = None,
@@ -119,13 +152,14 @@ def plot_dual_axis(
         y2_color (str): Màu cho trục và đường dữ liệu Y2.
         x_label (str): Nhãn cho trục X.
         title (str): Tiêu đề biểu đồ.
-        output_path (str): Đường dẫn lưu file.
+        output_path (str | list): Đường dẫn lưu file, hoặc danh sách đường dẫn để lưu nhiều định dạng.
         figsize (tuple, optional): Kích thước figure.
         y1_style (dict, optional): Dict chứa các kwargs cho plot Y1 (vd: linestyle, marker).
         y2_style (dict, optional): Dict chứa các kwargs cho plot Y2.
         ax (matplotlib.axes.Axes, optional): Subplot axis để vẽ lên.
     """
     fig, ax1, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
+    mark_stage('artists')
 
     # Đảm bảo các dict style tồn tại
     if y1_style is None: y1_style = {}
@@ -167,75 +201,110 @@ def plot_dual_axis(
     ax2.grid(False)
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"Dual-axis plot saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "Dual-axis plot")
+        if saved is not None:
+            return saved
 
     return ax1, ax2
 
 # src/plot_templates.py
 # (thêm vào cuối file)
-from sklearn.manifold import TSNE
+from embeddings import compute_embedding
 
+@traced_template
+@cached_template
 def plot_tsne(
     features,
     labels,
     title: str,
-    output_path: str,
+    output_path: str | list,
     palette: dict = None,
     figsize: tuple = (6, 6),
     perplexity: float = 30.0,
     ax=None,
+    embedding=None,
+    cache_dir: str = None,
+    method: str = 'tsne',
+    pca_components: int = None,
+    max_samples: int = None,
+    stratify: bool = True,
+    point_mode: str = 'auto',
+    point_threshold: int = 20000,
     **kwargs
 ):
     """
     Thực hiện t-SNE và vẽ kết quả lên một scatter plot.
+    Embedding được tính bởi `embeddings.compute_embedding` và được cache,
+    nên gọi lại với cùng `features` chỉ để đổi style sẽ không chạy lại t-SNE.
 
     Args:
         features (np.array): Mảng 2D chứa các vector đặc trưng (n_samples, n_features).
         labels (array-like): Nhãn (ground truth) của mỗi mẫu.
         title (str): Tiêu đề cho subplot.
-        output_path (str): Đường dẫn lưu file (chỉ dùng khi ax=None).
+        output_path (str | list): Đường dẫn lưu file, hoặc danh sách đường dẫn để lưu nhiều
+                                  định dạng (chỉ dùng khi ax=None).
         palette (dict, optional): Dictionary map nhãn với màu sắc.
         figsize (tuple, optional): Kích thước figure. Mặc định là (6, 6) (hình vuông).
         perplexity (float, optional): Tham số perplexity cho t-SNE. Mặc định là 30.0.
         ax (matplotlib.axes.Axes, optional): Subplot axis để vẽ lên.
+        embedding (np.array, optional): Tọa độ 2D đã tính sẵn (n_samples, 2). Nếu có,
+                                        bỏ qua bước t-SNE và `features` không được dùng.
+        cache_dir (str, optional): Thư mục lưu cache embedding trên đĩa (.npz).
+        method (str, optional): Backend nhúng: 'tsne' (sklearn), 'opentsne' (FFT, cần openTSNE)
+                                hoặc 'pca' (thuần NumPy). Mặc định là 'tsne'.
+        pca_components (int, optional): Giảm chiều bằng PCA trước khi chạy t-SNE
+                                        (vd: 50 cho dữ liệu lớn). Mặc định là None.
+        max_samples (int, optional): Số điểm tối đa được nhúng và vẽ; dữ liệu lớn hơn
+                                     sẽ được lấy mẫu ngẫu nhiên. Mặc định là None.
+        stratify (bool, optional): Lấy mẫu phân tầng theo nhãn. Mặc định là True.
+        point_mode (str, optional): Cách vẽ lớp điểm: 'vector', 'rasterize' (ảnh bitmap,
+                                    trục và chữ vẫn là vector), 'density' (ảnh mật độ tô
+                                    theo lớp chiếm đa số) hoặc 'auto' (rasterize khi số điểm
+                                    vượt `point_threshold`). Mặc định là 'auto'.
+        point_threshold (int, optional): Ngưỡng số điểm cho chế độ 'auto'. Mặc định là 20000.
         **kwargs: Các tham số khác cho plt.scatter (vd: s - kích thước điểm).
     """
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
 
-    # --- Bước 1: Chạy thuật toán t-SNE ---
-    print(f"Running t-SNE for '{title}' with perplexity={perplexity}...")
-    tsne = TSNE(n_components=2, perplexity=perplexity, random_state=42, init='pca', learning_rate='auto')
-    features_2d = tsne.fit_transform(features)
+    # --- Bước 1: Lấy embedding t-SNE (từ cache nếu có) ---
+    mark_stage('data_prep')
+    if embedding is None:
+        features_2d, indices, _ = compute_embedding(
+            features, labels=labels, method=method, perplexity=perplexity,
+            pca_components=pca_components, max_samples=max_samples, stratify=stratify,
+            cache_dir=cache_dir)
+        labels = np.asarray(labels)[indices]
+    else:
+        features_2d = np.asarray(embedding)
     
-    # Tạo DataFrame để dễ dàng vẽ với Seaborn
-    df_tsne = pd.DataFrame({
-        't-SNE-1': features_2d[:, 0],
-        't-SNE-2': features_2d[:, 1],
-        'label': labels
-    })
-
     # --- Bước 2: Vẽ Scatter Plot ---
-    # Lấy danh sách các lớp duy nhất để đảm bảo thứ tự nhất quán
-    unique_labels = sorted(df_tsne['label'].unique())
+    # Gom nhóm điểm theo nhãn MỘT lần: np.unique trả về các lớp đã sắp xếp
+    # (thứ tự legend nhất quán) và chỉ số lớp của từng điểm.
+    unique_labels, codes = np.unique(np.asarray(labels), return_inverse=True)
+    unique_labels = unique_labels.tolist()
+    n_points = len(codes)
     
     # Lấy bảng màu
     if palette is None:
         colors = [COLOR_PALETTE[c] for c in ['blue', 'green', 'orange', 'purple', 'red', 'olive']]
         palette = {label: colors[i % len(colors)] for i, label in enumerate(unique_labels)}
 
-    sns.scatterplot(
-        data=df_tsne,
-        x='t-SNE-1',
-        y='t-SNE-2',
-        hue='label',
-        hue_order=unique_labels, # Đảm bảo thứ tự legend
-        palette=palette,
-        ax=ax,
-        s=kwargs.get('s', 20),      # Kích thước điểm
-        alpha=kwargs.get('alpha', 0.8) # Độ trong suốt
-    )
+    mark_stage('artists')
+    mode = _resolve_point_mode(point_mode, n_points, point_threshold)
+    point_size = kwargs.get('s', 20)  # Kích thước điểm
+    if mode == 'density':
+        _draw_class_density(ax, features_2d, codes, unique_labels, palette, s=point_size)
+    else:
+        # Sắp xếp chỉ số theo lớp rồi cắt thành từng đoạn: mỗi lớp là một PathCollection,
+        # không cần DataFrame trung gian. Style giống sns.scatterplot (viền trắng mảnh).
+        order = np.argsort(codes, kind='stable')
+        bounds = np.cumsum(np.bincount(codes, minlength=len(unique_labels)))[:-1]
+        for label, idx in zip(unique_labels, np.split(order, bounds)):
+            ax.scatter(features_2d[idx, 0], features_2d[idx, 1], s=point_size,
+                       color=palette[label], label=label, edgecolor='w',
+                       linewidths=0.08 * np.sqrt(point_size),
+                       alpha=kwargs.get('alpha', 0.8), # Độ trong suốt
+                       rasterized=(mode == 'rasterize'))
     
     # --- Tinh chỉnh cho đẹp ---
     ax.set_title(title)
@@ -254,9 +323,10 @@ def plot_tsne(
     ax.legend(handles, labels, title='Classes', loc='best')
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"t-SNE plot saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "t-SNE plot",
+                             point_layer=(n_points, mode, point_mode, point_threshold))
+        if saved is not None:
+            return saved
 
     return ax
 
@@ -267,41 +337,504 @@ def plot_tsne(
 def _setup_ax_and_save(ax, figsize, output_path):
     """A helper to manage axis creation and figure saving."""
     if ax is None:
-        fig, ax = plt.subplots(figsize=figsize, layout='constrained')
+        fig, ax = _new_figure(figsize)
         save_and_close = True
     else:
         fig = ax.get_figure()
         save_and_close = False
     return fig, ax, save_and_close
 
+
+def _new_figure(figsize, nrows=1, ncols=1, squeeze=True):
+    """
+    Tạo figure (constrained layout) và lưới axes; lấy từ FigurePool nếu pool đang bật.
+    Figure được dựng trực tiếp trên canvas Agg, không qua pyplot: không có figure manager
+    và không đụng tới trạng thái toàn cục của pyplot, nên có thể vẽ song song trên nhiều thread.
+    """
+    mark_stage('figure')
+    pool = get_figure_pool()
+    if pool is not None:
+        return pool.acquire(figsize, 'constrained', nrows, ncols, squeeze=squeeze)
+    fig = new_figure(figsize, 'constrained')
+    return fig, fig.subplots(nrows, ncols, squeeze=squeeze)
+
+
+def _save_figure(fig, output_path, label, point_layer=None):
+    """
+    Lưu figure ra một hoặc nhiều file (`output_path` có thể là danh sách), ghi render event
+    cho từng file, rồi trả figure về FigurePool (nếu nó đến từ pool).
+
+    Khi lưu bất đồng bộ đang bật (`figure_export.enable_async_save`), figure được gửi sang
+    writer pool và hàm trả về ngay.
+
+    Args:
+        point_layer (tuple, optional): (n_points, mode, point_mode, threshold) cho
+                                       `_report_point_layer`, ghi log sau khi lưu xong.
+
+    Returns:
+        concurrent.futures.Future | None: Future cho ra (output_path, số byte) khi lưu bất
+                                          đồng bộ; None khi đã lưu xong.
+    """
+    mark_stage('savefig')
+    pool = get_figure_pool()
+    writer = get_async_writer()
+    if writer is not None:
+        # Figure đang chờ lưu không thể quay lại pool: pool sẽ xóa nội dung của nó
+        if pool is not None and pool.owns(fig):
+            pool.discard(fig)
+        return writer.submit(_write_figure, fig, output_path, label, point_layer, **savefig_options())
+
+    _write_figure(fig, output_path, label, point_layer)
+    if pool is not None and pool.owns(fig):
+        pool.release(fig)
+    # Figure không đăng ký với pyplot nên không cần plt.close: bỏ tham chiếu là đủ
+    return None
+
+
+def _write_figure(fig, output_path, label, point_layer=None, **savefig_kwargs):
+    """Ghi figure ra file và ghi render event. Trả về (output_path, tổng số byte)."""
+    with trace_layout(fig):
+        paths = save_figure(fig, output_path, **savefig_kwargs)
+    for path in paths:
+        log_render(path, f"{label} saved to: {path}")
+    if point_layer is not None:
+        _report_point_layer(output_path, *point_layer)
+    return output_path, saved_bytes(paths)
+
+# ==============================================================================
+# Helpers cho lớp điểm dày đặc (dense scatter)
+# Với hàng trăm nghìn điểm, vẽ dạng vector khiến file PDF nặng hàng chục MB.
+# Các helper này chuyển lớp điểm sang ảnh bitmap (rasterize) hoặc ảnh mật độ,
+# trong khi trục, nhãn và chữ vẫn giữ dạng vector.
+# ==============================================================================
+POINT_MODES = ('auto', 'vector', 'rasterize', 'density')
+
+
+def _resolve_point_mode(point_mode, n_points, threshold):
+    """Chọn cách vẽ lớp điểm: 'vector', 'rasterize' hoặc 'density'."""
+    if point_mode not in POINT_MODES:
+        raise ValueError(f"point_mode phải là một trong {POINT_MODES}, nhận được '{point_mode}'.")
+    if point_mode == 'auto':
+        return 'rasterize' if n_points > threshold else 'vector'
+    return point_mode
+
+
+def _draw_class_density(ax, points, codes, classes, palette, bins=300, s=20):
+    """
+    Gộp các điểm thành một ảnh 2-D: mỗi ô có màu của lớp chiếm đa số,
+    độ đậm tỉ lệ với log(mật độ). `codes[i]` là chỉ số lớp (trong `classes`) của điểm i.
+    Legend dùng các handle rỗng để giữ đúng màu từng lớp.
+    """
+    from matplotlib.colors import to_rgb
+
+    x, y = points[:, 0], points[:, 1]
+    x_range, y_range = (x.min(), x.max()), (y.min(), y.max())
+
+    # Histogram 3 chiều (lớp, x, y) trong một lần gọi
+    counts, _ = np.histogramdd(
+        np.column_stack([codes, x, y]),
+        bins=(len(classes), bins, bins),
+        range=((-0.5, len(classes) - 0.5), x_range, y_range))
+    total = counts.sum(axis=0)
+    dominant = counts.argmax(axis=0)
+
+    colors = np.array([to_rgb(palette[c]) for c in classes])
+    rgba = np.zeros(total.shape + (4,))
+    rgba[..., :3] = colors[dominant]
+    rgba[..., 3] = np.log1p(total) / np.log1p(total.max())
+
+    # histogramdd trả về [x, y] -> chuyển vị để hàng ứng với trục y
+    ax.imshow(rgba.transpose(1, 0, 2), extent=(*x_range, *y_range), origin='lower',
+              aspect='auto', interpolation='nearest')
+    for c in classes:
+        ax.scatter([], [], color=palette[c], s=s, label=c)
+
+
+def _report_point_layer(output_path, n_points, mode, point_mode, threshold):
+    """Ghi log chế độ vẽ lớp điểm và kích thước (các) file kết quả."""
+    if mode == 'vector' or not logger.isEnabledFor(logging.INFO):
+        return
+    reason = f"auto threshold {threshold}" if point_mode == 'auto' else 'forced'
+    for path in output_paths(output_path):
+        size_kb = os.path.getsize(path) / 1024
+        logger.info("  Point layer: %d points -> %s (%s); %s %.1f KB", n_points, mode, reason,
+                    os.path.basename(path), size_kb)
+
+
+# ==============================================================================
+# Helpers cho histogram đã tính sẵn (không có dữ liệu gốc)
+# ==============================================================================
+def _draw_binned_distribution(ax, accumulator, bins, show_hist, show_kde, color):
+    """Vẽ histogram (và KDE xấp xỉ) từ một HistogramAccumulator, cùng style với sns.histplot/kdeplot."""
+    import seaborn as sns
+
+    from matplotlib.colors import to_rgb, to_rgba
+
+    if show_hist:
+        counts, edges = accumulator.histogram(bins)
+        # Tâm bin với trọng số = số lượng -> giống hệt histogram của dữ liệu gốc.
+        # `bins` phải là list: seaborn so sánh `bins == "auto"` khi có weights.
+        # alpha=0.5 khi có KDE, giống mặc định của sns.histplot(kde=True).
+        sns.histplot(x=(edges[:-1] + edges[1:]) / 2, weights=counts, bins=edges.tolist(),
+                     color=color, alpha=0.5 if show_kde else 0.75, ax=ax)
+        if show_kde:
+            # Đổi đơn vị density -> số lượng, giống đường KDE của sns.histplot(kde=True)
+            grid, density = accumulator.kde()
+            ax.plot(grid, density * counts.sum() * np.diff(edges).mean(), color=color)
+    elif show_kde:
+        grid, density = accumulator.kde()
+        ax.fill_between(grid, density, facecolor=to_rgba(color, 0.5), edgecolor=to_rgb(color))
+
+
+# ==============================================================================
+# Helpers giảm số đỉnh (level-of-detail) cho đường rất dài
+# Một log training 10 triệu bước không cần 10 triệu đỉnh: ở độ phân giải khi lưu,
+# mỗi cột pixel chỉ hiển thị được đoạn từ giá trị nhỏ nhất tới lớn nhất.
+# Giữ lại min và max của mỗi cột pixel cho kết quả trông giống hệt bản đầy đủ.
+# ==============================================================================
+def _axes_pixel_size(ax):
+    """Kích thước (rộng, cao) tính bằng pixel của axis khi lưu với `savefig.dpi`."""
+    fig = ax.get_figure()
+    dpi = matplotlib.rcParams['savefig.dpi']
+    if dpi == 'figure':
+        dpi = fig.dpi
+    pos = ax.get_position()
+    width_px = pos.width * fig.get_figwidth() * dpi
+    height_px = pos.height * fig.get_figheight() * dpi
+    return max(1, int(np.ceil(width_px))), max(1, int(np.ceil(height_px)))
+
+
+def _visible_point_budget(ax):
+    """Số đỉnh tối đa có ý nghĩa: 2 đỉnh (min, max) cho mỗi cột pixel của axis khi lưu."""
+    return 2 * _axes_pixel_size(ax)[0]
+
+
+def _decimate_minmax(x, y, y_error, n_buckets):
+    """
+    Chia trục X thành `n_buckets` khoảng đều và giữ lại điểm nhỏ nhất và lớn nhất
+    của mỗi khoảng (theo đúng thứ tự X). Dải sai số được thay bằng bao (envelope)
+    của mỗi khoảng: min(y - err) và max(y + err), đặt tại cùng các điểm đã giữ,
+    nên đường trung bình và dải sai số luôn khớp nhau.
+
+    Returns:
+        tuple: (x, y, band, markevery) đã được giảm số điểm. `band` là (lower, upper)
+               hoặc None nếu không có `y_error`. `markevery` là danh sách vị trí marker
+               tương ứng với "mỗi 10 điểm" của dữ liệu gốc.
+    """
+    n = len(x)
+    # Chỉ giảm khi X tăng dần (chuỗi thời gian/epoch); trường hợp khác giữ nguyên
+    if n < 2 or not np.all(np.diff(x) >= 0) or x[-1] == x[0]:
+        band = None if y_error is None else (y - y_error, y + y_error)
+        return x, y, band, 10
+
+    bucket = ((x - x[0]) / (x[-1] - x[0]) * n_buckets).astype(np.int64)
+    np.minimum(bucket, n_buckets - 1, out=bucket)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+
+    def first_match(values, reduced):
+        # Vị trí đầu tiên trong mỗi khoảng có giá trị bằng giá trị rút gọn (argmin/argmax theo khoảng)
+        hits = np.flatnonzero(values == np.repeat(reduced, sizes))
+        segment = np.searchsorted(starts, hits, side='right') - 1
+        _, first = np.unique(segment, return_index=True)
+        return hits[first]
+
+    keep = np.union1d(first_match(y, np.fmin.reduceat(y, starts)),
+                      first_match(y, np.fmax.reduceat(y, starts)))
+    keep = np.union1d(keep, [0, n - 1])  # Luôn giữ điểm đầu và cuối
+
+    band = None
+    if y_error is not None:
+        segment_of_kept = np.searchsorted(starts, keep, side='right') - 1
+        lower = np.fmin.reduceat(y - y_error, starts)[segment_of_kept]
+        upper = np.fmax.reduceat(y + y_error, starts)[segment_of_kept]
+        band = (lower, upper)
+
+    # Marker: đặt tại đỉnh gần nhất với các điểm 0, 10, 20... của dữ liệu gốc
+    markevery = np.unique(np.minimum(np.searchsorted(keep, np.arange(0, n, 10)), len(keep) - 1)).tolist()
+    return x[keep], y[keep], band, markevery
+
+
+# ==============================================================================
+# Helpers cho ma trận lớn (memmap / file .npy)
+# ==============================================================================
+def _fit_matrix_to_axes(matrix_data, ax, reducer='mean', row_order=None, col_order=None):
+    """
+    Nếu `matrix_data` là đường dẫn .npy hoặc ndarray/memmap có nhiều ô hơn số pixel
+    của axis, gộp khối để mỗi ô còn lại ít nhất 1 pixel. DataFrame không bị gộp.
+    `row_order`/`col_order` (vd: thứ tự phân cụm) được áp dụng trước khi gộp.
+
+    Returns:
+        tuple: (matrix, (fy, fx)) với (fy, fx) là hệ số gộp theo hàng và cột.
+    """
+    if not isinstance(matrix_data, (str, np.ndarray)):
+        if not _is_dataframe(matrix_data):
+            matrix_data = np.asarray(matrix_data)
+        return _reorder_matrix(matrix_data, row_order, col_order), (1, 1)
+    matrix = load_array(matrix_data)
+    if matrix.ndim != 2:
+        return np.asarray(matrix), (1, 1)
+    width_px, height_px = _axes_pixel_size(ax)
+    factors = block_factors(matrix.shape, (height_px, width_px))
+    if factors == (1, 1):
+        return _reorder_matrix(np.asarray(matrix), row_order, col_order), factors
+    return block_reduce(matrix, factors, reducer, row_order, col_order), factors
+
+
+def _is_dataframe(obj):
+    """True nếu `obj` là pandas DataFrame (kiểm tra không cần import pandas)."""
+    return type(obj).__module__.startswith('pandas') and hasattr(obj, 'iloc') and hasattr(obj, 'columns')
+
+
+def _reorder_matrix(matrix, row_order, col_order):
+    """Hoán vị hàng/cột của ndarray hoặc DataFrame (None = giữ nguyên)."""
+    take = matrix.iloc if _is_dataframe(matrix) else matrix
+    if row_order is not None:
+        matrix = take[row_order]
+        take = matrix.iloc if _is_dataframe(matrix) else matrix
+    if col_order is not None:
+        matrix = take[:, col_order]
+    return matrix
+
+
+def _heatmap_cluster_orders(matrix_data, cluster, method, metric, optimal_ordering, mode, cache_dir):
+    """Thứ tự hàng/cột theo phân cụm cho `plot_heatmap`; ma trận đối xứng dùng chung một thứ tự."""
+    if cluster not in (True, 'rows', 'cols', 'both'):
+        raise ValueError(f"cluster phải là None, True, 'rows', 'cols' hoặc 'both', nhận được '{cluster}'.")
+    if isinstance(matrix_data, (str, np.ndarray)):
+        matrix = load_array(matrix_data)
+    else:
+        matrix = np.asarray(matrix_data, dtype=float)
+    options = dict(method=method, metric=metric, optimal_ordering=optimal_ordering, mode=mode,
+                   cache_dir=cache_dir)
+
+    row_order = col_order = None
+    if cluster in (True, 'rows', 'both'):
+        row_order, _ = cluster_order(matrix, axis=0, **options)
+    if cluster in (True, 'cols', 'both'):
+        if row_order is not None and is_symmetric(matrix):
+            col_order = row_order
+        else:
+            col_order, _ = cluster_order(matrix, axis=1, **options)
+    return row_order, col_order
+
+
+def _reorder_labels(labels, order, default=None):
+    """Sắp nhãn trục theo `order`; nhãn tự động ('auto'/True) được thay bằng chỉ số gốc."""
+    if order is None or labels is False:
+        return labels
+    if isinstance(labels, (str, bool, int)) or labels is None:
+        labels = default if default is not None else np.arange(len(order))
+    return [labels[i] for i in order]
+
+
+def _thin_labels(labels, factor, n_out, default=None):
+    """Nhãn cho ma trận đã gộp: nhãn đầu tiên của mỗi khối, `default` hoặc chỉ số hàng/cột gốc."""
+    if isinstance(labels, (str, bool, int)) or labels is None:
+        return default if default is not None else np.arange(n_out) * factor
+    return list(labels)[::factor]
+
+
+# ==============================================================================
+# Helpers cho số trong ô heatmap (annotation)
+# sns.heatmap(annot=True) tạo một đối tượng Text cho mỗi ô: ma trận 60x60 là 3600
+# Text, mỗi cái được đo và vẽ riêng. Với nhiều ô, các ký tự được chuyển thành
+# path một lần và vẽ theo nhóm: mỗi (ký tự, vị trí trong chuỗi) là một
+# PathCollection với offset tại tâm các ô, nên số artist chỉ phụ thuộc vào số
+# ký tự khác nhau chứ không phụ thuộc vào số ô (PDF cũng dùng lại glyph).
+# ==============================================================================
+_ANNOT_BATCH_MIN = 400   # Dưới ngưỡng này dùng Text của seaborn (text thật, chọn được trong PDF)
+_ANNOT_MIN_FONTSIZE = 4  # Cỡ chữ nhỏ nhất (pt) còn đọc được
+
+
+def _cell_size_pt(ax, shape):
+    """Kích thước (rộng, cao) tính bằng point của một ô khi ma trận `shape` lấp đầy axis."""
+    width_px, height_px = _axes_pixel_size(ax)
+    dpi = matplotlib.rcParams['savefig.dpi']
+    dpi = ax.get_figure().dpi if dpi == 'figure' else dpi
+    return width_px * 72 / dpi / shape[1], height_px * 72 / dpi / shape[0]
+
+
+def _annotation_fontsize(ax, shape, strings, fontsize=9):
+    """Cỡ chữ lớn nhất (<= `fontsize`) để chuỗi dài nhất vừa trong một ô; None nếu quá nhỏ để đọc."""
+    from matplotlib.textpath import text_to_path
+
+    cell_w_pt, cell_h_pt = _cell_size_pt(ax, shape)
+    # Độ rộng chuỗi tỉ lệ thuận với cỡ chữ: đo ở cỡ `fontsize` rồi co lại cho vừa ô
+    prop = FontProperties(size=fontsize)
+    max_width = max((text_to_path.get_text_width_height_descent(s, prop, ismath=False)[0]
+                     for s in strings), default=0)
+    size = min(fontsize, 0.75 * cell_h_pt, 0.9 * cell_w_pt * fontsize / max_width if max_width else fontsize)
+    return size if size >= _ANNOT_MIN_FONTSIZE else None
+
+
+def _draw_batched_annotations(ax, mesh, values, strings, fontsize):
+    """Vẽ tất cả số trong ô theo nhóm glyph, màu chữ giống seaborn (đen/trắng theo độ sáng ô)."""
+    from collections import defaultdict
+    from matplotlib.collections import PathCollection
+    from matplotlib.colors import to_rgba
+    from matplotlib.textpath import TextPath, text_to_path
+    from matplotlib.transforms import Affine2D
+    from seaborn.utils import relative_luminance
+
+    prop = FontProperties(size=fontsize)
+
+    def width(text):
+        return text_to_path.get_text_width_height_descent(text, prop, ismath=False)[0]
+
+    # Căn giữa theo chiều dọc bằng chiều cao chữ số, để các ô thẳng hàng với nhau
+    digit_extents = TextPath((0, 0), '0', prop=prop).get_extents()
+    y_shift = -(digit_extents.y0 + digit_extents.y1) / 2
+
+    # Gom các ô theo chuỗi, rồi theo (ký tự, vị trí x của ký tự so với tâm ô)
+    cells_by_text = defaultdict(list)
+    for idx, text in enumerate(strings):
+        if text is not None:
+            cells_by_text[text].append(idx)
+    advance = {}
+    cells_by_glyph = defaultdict(list)
+    for text, cells in cells_by_text.items():
+        x = -width(text) / 2
+        for char in text:
+            if char not in advance:
+                # Bước tiến của ký tự = độ rộng của 2 ký tự liền nhau trừ đi 1 ký tự
+                advance[char] = width(char * 2) - width(char)
+            if not char.isspace():
+                cells_by_glyph[(char, round(x, 2))].append(cells)
+            x += advance[char]
+
+    cell_colors = mesh.cmap(mesh.norm(values.ravel()))
+    text_colors = np.where((relative_luminance(cell_colors) > .408)[:, None],
+                           to_rgba('.15'), to_rgba('w'))
+    # Path tính bằng point -> pixel, theo dpi lúc lưu
+    transform = Affine2D().scale(1 / 72) + ax.get_figure().dpi_scale_trans
+    n_cols = values.shape[1]
+    collections = []
+    for (char, x), cell_lists in cells_by_glyph.items():
+        cells = np.concatenate(cell_lists)
+        glyph = TextPath((0, 0), char, prop=prop).transformed(Affine2D().translate(x, y_shift))
+        offsets = np.column_stack([cells % n_cols + 0.5, cells // n_cols + 0.5])
+        collection = PathCollection([glyph], offsets=offsets, offset_transform=ax.transData,
+                                    transform=transform, facecolors=text_colors[cells],
+                                    edgecolors='none', zorder=3)
+        ax.add_collection(collection, autolim=False)
+        collections.append(collection)
+    return collections
+
+
+# ==============================================================================
+# Helpers cho biểu đồ cột (bar chart)
+# ax.bar tạo một Rectangle cho mỗi cột và ax.bar_label một Text cho mỗi nhãn;
+# với hàng trăm hạng mục và hàng chục thành phần đó là hàng nghìn artist.
+# Ở đây mỗi chuỗi (series) là MỘT PolyCollection có đỉnh tính sẵn bằng NumPy,
+# cùng màu, viền và độ dày nét như ax.bar với rcParams hiện tại.
+# ==============================================================================
+def _draw_bar_series(ax, x, heights, width, color, label=None, bottom=0.0):
+    """
+    Vẽ một chuỗi cột dọc (tâm `x`, độ cao `heights`, đáy `bottom`) bằng một PolyCollection.
+    NaN được coi như cột cao 0, giống ax.bar / DataFrame.plot.
+
+    Returns:
+        PolyCollection: Collection đã thêm vào `ax` (dùng được làm handle cho legend).
+    """
+    from matplotlib.collections import PolyCollection
+
+    heights = np.nan_to_num(np.asarray(heights, dtype=float))
+    bottom = np.broadcast_to(np.asarray(bottom, dtype=float), heights.shape)
+    left, right, top = x - width / 2, x + width / 2, bottom + heights
+    # (n_bars, 4, 2): trái-dưới, trái-trên, phải-trên, phải-dưới
+    vertices = np.stack([np.column_stack([left, bottom]), np.column_stack([left, top]),
+                         np.column_stack([right, top]), np.column_stack([right, bottom])], axis=1)
+    collection = PolyCollection(vertices, facecolors=color, label=label)
+    # Giống Rectangle của ax.bar: đáy cột là "sticky", trục Y không thêm lề dưới đáy
+    collection.sticky_edges.y[:] = np.unique(bottom).tolist()
+    ax.add_collection(collection)
+    return collection
+
+
+def _draw_bar_labels(ax, x, values, ends, fmt='%.2f', fontsize=8, padding=3):
+    """Nhãn giá trị trên đầu cột (hoặc đầu thanh sai số), giống ax.bar_label."""
+    for xi, value, end in zip(x, values, ends):
+        if np.isnan(value):
+            continue
+        ax.annotate(fmt % value, xy=(xi, end), xytext=(0, padding if value >= 0 else -padding),
+                    textcoords='offset points', ha='center', va='bottom' if value >= 0 else 'top',
+                    fontsize=fontsize)
+
+
+def _label_step(ax, n_slots, labels, fontsize):
+    """
+    Bước thưa nhãn (1 = giữ tất cả) để các nhãn nằm ngang dài nhất không chồng nhau
+    khi `n_slots` nhãn chia đều chiều rộng của axis.
+    """
+    from matplotlib.textpath import text_to_path
+
+    if n_slots == 0:
+        return 1
+    prop = FontProperties(size=fontsize)
+    widest = max(text_to_path.get_text_width_height_descent(str(label), prop, ismath=False)[0]
+                 for label in labels)
+    slot_pt = _cell_size_pt(ax, (1, n_slots))[0]
+    return max(1, int(np.ceil(widest * 1.1 / slot_pt)))
+
+
+def _set_category_ticks(ax, x, categories, thin_labels=True):
+    """Đặt nhãn hạng mục trên trục X, thưa bớt (mỗi `step` nhãn) nếu chúng chồng lên nhau."""
+    categories = list(categories)
+    step = 1
+    if thin_labels:
+        tick_size = FontProperties(size=matplotlib.rcParams['xtick.labelsize']).get_size_in_points()
+        step = _label_step(ax, len(categories), categories, tick_size)
+    ax.set_xticks(x[::step], categories[::step])
+    return step
+
+
 # ==============================================================================
 # Refactored Plotting Functions
 # ==============================================================================
 
+@traced_template
+@cached_template
 def plot_line_comparison(data: pd.DataFrame, x_col: str, y_cols: list, y_labels: list,
-                         x_label: str, y_label: str, title: str, output_path: str,
+                         x_label: str, y_label: str, title: str, output_path: str | list,
                          y_error_cols: dict = None, figsize: tuple = (6, 4), ax=None, **kwargs):
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
 
     # ... (toàn bộ code vẽ bên trong hàm giữ nguyên, chỉ dùng `ax` đã được setup)
+    mark_stage('data_prep')
     linestyles = kwargs.get('linestyles', ['-', '--', ':', '-.'])
     markers = kwargs.get('markers', ['o', 's', '^', 'D'])
     colors = kwargs.get('colors', [CONTEXT_COLORS.get(c) for c in ['proposed', 'sota', 'baseline', 'method_A']])
 
+    # Giảm số đỉnh (level-of-detail) cho chuỗi dài: 'auto' = 2 điểm (min, max) cho mỗi
+    # cột pixel của trục khi lưu; số nguyên = giới hạn cụ thể; None = tắt.
+    max_points = kwargs.get('max_points', 'auto')
+    if max_points == 'auto':
+        max_points = _visible_point_budget(ax)
+
+    # Decimation của từng chuỗi được tính ngay trong vòng lặp vẽ (thuộc giai đoạn 'artists')
+    mark_stage('artists')
     for i, y_col in enumerate(y_cols):
         style_idx = i % len(linestyles)
         marker_idx = i % len(markers)
         color = colors[i % len(colors)]
         linewidth = 2.0 if i == 0 else 1.5
         x_data, y_data = data[x_col], data[y_col]
+        y_error = data[y_error_cols[y_col]] if y_error_cols and y_col in y_error_cols else None
+        markevery = 10
+
+        if max_points and len(x_data) > max_points:
+            x_data, y_data, band, markevery = _decimate_minmax(
+                x_data.to_numpy(), y_data.to_numpy(),
+                None if y_error is None else y_error.to_numpy(), max_points // 2)
+        elif y_error is not None:
+            band = (y_data - y_error, y_data + y_error)
         
         ax.plot(x_data, y_data, label=y_labels[i], color=color, linestyle=linestyles[style_idx],
-                marker=markers[marker_idx], markevery=10, linewidth=linewidth, zorder=i + 2)
+                marker=markers[marker_idx], markevery=markevery, linewidth=linewidth, zorder=i + 2)
         
-        if y_error_cols and y_col in y_error_cols:
-            error_col = y_error_cols[y_col]
-            y_error = data[error_col]
-            ax.fill_between(x_data, y_data - y_error, y_data + y_error, color=color, alpha=0.2, zorder=i + 1)
+        if y_error is not None:
+            ax.fill_between(x_data, *band, color=color, alpha=0.2, zorder=i + 1)
 
     ax.set_xlabel(x_label)
     ax.set_ylabel(y_label)
@@ -312,18 +845,21 @@ def plot_line_comparison(data: pd.DataFrame, x_col: str, y_cols: list, y_labels:
     if 'yscale' in kwargs: ax.set_yscale(kwargs['yscale'])
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"Line plot saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "Line plot")
+        if saved is not None:
+            return saved
     return ax
 
 
+@traced_template
+@cached_template
 def plot_grouped_bar_chart(data: pd.DataFrame, category_col: str, value_cols: list, value_labels: list,
-                           y_label: str, title: str, output_path: str, error_cols: list = None,
+                           y_label: str, title: str, output_path: str | list, error_cols: list = None,
                            figsize: tuple = (7, 5), ylim: tuple = None, ax=None, **kwargs):
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
 
     # ... (toàn bộ code vẽ bên trong hàm giữ nguyên)
+    mark_stage('data_prep')
     if error_cols and len(value_cols) != len(error_cols):
         raise ValueError("Số lượng cột giá trị và cột lỗi phải bằng nhau.")
     categories, n_categories, n_values = data[category_col], len(data[category_col]), len(value_cols)
@@ -331,17 +867,33 @@ def plot_grouped_bar_chart(data: pd.DataFrame, category_col: str, value_cols: li
     total_width, width = 0.8, 0.8 / n_values
     colors = kwargs.get('colors', [COLOR_PALETTE.get(c) for c in ['blue', 'green', 'orange']])
 
+    # Nhãn giá trị: 'auto' bỏ nhãn khi cột hẹp hơn chuỗi số (nhãn sẽ chồng lên nhau)
+    bar_labels = kwargs.get('bar_labels', 'auto')
+    if bar_labels == 'auto':
+        values_text = [f'{v:.2f}' for v in np.ravel(data[value_cols].to_numpy(dtype=float))]
+        bar_labels = _label_step(ax, n_categories * n_values, values_text, 8) == 1
+        if not bar_labels:
+            logger.info("Bars too narrow for value labels; bar labels skipped")
+
+    mark_stage('artists')
     for i, value_col in enumerate(value_cols):
         offset = width * (i - (n_values - 1) / 2)
-        measurements = data[value_col]
-        y_error = data[error_cols[i]] if error_cols else None
-        rects = ax.bar(x + offset, measurements, width, label=value_labels[i],
-                       color=colors[i % len(colors)], yerr=y_error, capsize=3)
-        ax.bar_label(rects, padding=3, fmt='%.2f', fontsize=8)
+        measurements = data[value_col].to_numpy(dtype=float)
+        y_error = data[error_cols[i]].to_numpy(dtype=float) if error_cols else None
+        color = colors[i % len(colors)]
+        _draw_bar_series(ax, x + offset, measurements, width, color, label=value_labels[i])
+        ends = measurements
+        if y_error is not None:
+            ax.errorbar(x + offset, measurements, yerr=y_error, fmt='none', ecolor='k', capsize=3,
+                        label='_nolegend_')
+            # Nhãn đặt ở đầu thanh sai số, giống ax.bar_label
+            ends = measurements + np.where(measurements >= 0, 1, -1) * np.abs(y_error)
+        if bar_labels:
+            _draw_bar_labels(ax, x + offset, measurements, ends, fmt='%.2f', fontsize=8)
 
     ax.set_ylabel(y_label)
     ax.set_title(title)
-    ax.set_xticks(x, categories)
+    _set_category_ticks(ax, x, categories, kwargs.get('thin_labels', True))
     ax.legend(title='Metrics')
 
     if ylim:
@@ -358,44 +910,120 @@ def plot_grouped_bar_chart(data: pd.DataFrame, category_col: str, value_cols: li
     ax.grid(axis='y', which='major', linestyle=':', linewidth=0.7)
     
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"Grouped bar chart saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "Grouped bar chart")
+        if saved is not None:
+            return saved
     return ax
 
 
+@traced_template
+@cached_template
 def plot_heatmap(matrix_data, x_tick_labels, y_tick_labels, y_label: str, x_label: str, title: str,
-                 output_path: str, figsize: tuple = (6, 5), cmap: str = 'Blues', show_values: bool = True,
-                 value_format: str = 'd', cbar_label: str = 'Count', ax=None):
+                 output_path: str | list, figsize: tuple = (6, 5), cmap: str = 'Blues', show_values: bool = True,
+                 value_format: str = 'd', cbar_label: str = 'Count', ax=None, reducer: str = 'mean',
+                 raster_threshold: int = 10000, cluster=None, cluster_method: str = 'average',
+                 cluster_metric: str = 'euclidean', optimal_ordering: bool = False,
+                 cluster_mode: str = 'auto', cache_dir: str = None):
+    import pandas as pd
+    import seaborn as sns
+
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
-    
+
+    # Sắp hàng/cột theo phân cụm phân cấp; linkage được cache theo hash của ma trận
+    mark_stage('data_prep')
+    row_order = col_order = None
+    if cluster:
+        row_order, col_order = _heatmap_cluster_orders(matrix_data, cluster, cluster_method, cluster_metric,
+                                                       optimal_ordering, cluster_mode, cache_dir)
+        is_frame = _is_dataframe(matrix_data)
+        y_tick_labels = _reorder_labels(y_tick_labels, row_order, matrix_data.index if is_frame else None)
+        x_tick_labels = _reorder_labels(x_tick_labels, col_order, matrix_data.columns if is_frame else None)
+
+    # Ma trận lớn (file .npy / memmap): chỉ đọc từng khối và gộp khối theo `reducer`
+    # khi số ô vượt quá số pixel hiển thị được. Khi đó bỏ số trong ô và đường kẻ ô.
+    matrix_data, (fy, fx) = _fit_matrix_to_axes(matrix_data, ax, reducer, row_order, col_order)
+    linewidths = .5
+    if (fy, fx) != (1, 1):
+        logger.info("Heatmap downsampled by block %s (%dx%d) to %s", reducer, fy, fx, matrix_data.shape)
+        show_values, linewidths = False, 0
+
+    # Ô nhỏ hơn cỡ chữ của nhãn trục: gắn nhãn (đã thưa nếu gộp khối) vào DataFrame
+    # để seaborn tự chọn số nhãn không chồng lên nhau, thay vì vẽ hàng nghìn nhãn.
+    values = np.asarray(matrix_data)
+    cell_w_pt, cell_h_pt = _cell_size_pt(ax, values.shape)
+    tick_pt = FontProperties(size=matplotlib.rcParams['ytick.labelsize']).get_size_in_points()
+    if (fy, fx) != (1, 1) or min(cell_w_pt, cell_h_pt) < tick_pt:
+        index = _thin_labels(y_tick_labels, fy, values.shape[0], getattr(matrix_data, 'index', None))
+        columns = _thin_labels(x_tick_labels, fx, values.shape[1], getattr(matrix_data, 'columns', None))
+        matrix_data = pd.DataFrame(values, index=index, columns=columns)
+        x_tick_labels = False if x_tick_labels is False else 'auto'
+        y_tick_labels = False if y_tick_labels is False else 'auto'
+
+    # Số trong ô: cỡ chữ thu nhỏ cho vừa ô, bỏ hẳn nếu ô quá nhỏ để đọc;
+    # nhiều ô thì vẽ gộp thành một PathCollection thay vì một Text mỗi ô.
+    n_cells = values.size
+    annot, annot_size, strings = show_values, 9, None
+    if show_values:
+        # Ước lượng độ dài chuỗi từ các giá trị cực trị trước khi định dạng toàn bộ ma trận
+        extremes = [v for v in (np.nanmin(values), np.nanmax(values)) if not pd.isna(v)]
+        annot_size = _annotation_fontsize(ax, values.shape, [format(v, value_format) for v in extremes])
+        if annot_size is None:
+            logger.info("Heatmap cells too small for values (%dx%d); annotations skipped", *values.shape)
+        else:
+            strings = [None if pd.isna(v) else format(v, value_format) for v in values.ravel()]
+        annot = annot_size is not None and n_cells < _ANNOT_BATCH_MIN
+
+    # Nhiều ô: lưới ô được vẽ thành một ảnh raster duy nhất (PDF nhỏ, lưu nhanh)
+    rasterize = n_cells > raster_threshold
+    if rasterize:
+        linewidths = 0
+
     # ... (toàn bộ code vẽ bên trong hàm giữ nguyên)
-    sns.heatmap(matrix_data, annot=show_values, fmt=value_format, cmap=cmap, linewidths=.5, ax=ax,
-                xticklabels=x_tick_labels, yticklabels=y_tick_labels, annot_kws={"size": 9},
-                cbar_kws={'label': cbar_label})
+    mark_stage('artists')
+    sns.heatmap(matrix_data, annot=annot, fmt=value_format, cmap=cmap, linewidths=linewidths, ax=ax,
+                xticklabels=x_tick_labels, yticklabels=y_tick_labels, annot_kws={"size": annot_size},
+                cbar_kws={'label': cbar_label}, rasterized=rasterize)
+    if show_values and annot_size is not None and not annot:
+        _draw_batched_annotations(ax, ax.collections[0], values.astype(float), strings, annot_size)
     ax.set_ylabel(y_label)
     ax.set_xlabel(x_label)
     ax.set_title(title)
-    plt.setp(ax.get_xticklabels(), rotation=30, ha="right", rotation_mode="anchor")
-    plt.setp(ax.get_yticklabels(), rotation=0)
+    for label in ax.get_xticklabels():
+        label.set(rotation=30, ha="right", rotation_mode="anchor")
+    for label in ax.get_yticklabels():
+        label.set_rotation(0)
     ax.tick_params(left=False, bottom=False)
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"Heatmap saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "Heatmap")
+        if saved is not None:
+            return saved
     return ax
 
 
-def plot_distribution(data: pd.Series, x_label: str, title: str, output_path: str,
+@traced_template
+@cached_template
+def plot_distribution(data, x_label: str, title: str, output_path: str | list,
                       figsize: tuple = (6, 4), bins: int = 30, show_kde: bool = True,
                       show_hist: bool = True, color: str = None, ax=None):
+    # Kiểm tra trước khi lấy figure (có thể từ FigurePool), để không giữ figure không bao giờ được trả lại
+    if not show_hist and not show_kde: return
+    import seaborn as sns
+
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
 
     # ... (toàn bộ code vẽ bên trong hàm giữ nguyên)
-    if not show_hist and not show_kde: return
+    mark_stage('data_prep')
     plot_color = color if color else CONTEXT_COLORS['blue']
-    if show_hist:
+    if isinstance(data, tuple):
+        # Histogram đã tính sẵn (counts, bin_edges), vd: từ data_loading.stream_histogram
+        data = HistogramAccumulator.from_histogram(*data)
+        bins = data.bins  # Giữ nguyên các bin của histogram đã tính sẵn
+    mark_stage('artists')  # seaborn tự chia bin và ước lượng KDE trong lúc vẽ
+    if isinstance(data, HistogramAccumulator):
+        # Dữ liệu dạng tích lũy: không cần giữ mẫu gốc trong bộ nhớ
+        _draw_binned_distribution(ax, data, bins, show_hist, show_kde, plot_color)
+    elif show_hist:
         sns.histplot(data, bins=bins, kde=show_kde, color=plot_color, ax=ax)
     elif show_kde:
         sns.kdeplot(data, color=plot_color, fill=True, alpha=0.5, ax=ax)
@@ -406,38 +1034,46 @@ def plot_distribution(data: pd.Series, x_label: str, title: str, output_path: st
     ax.grid(axis='y', which='major', linestyle=':', linewidth=0.7)
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"Distribution plot saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, "Distribution plot")
+        if saved is not None:
+            return saved
     return ax
 
 
+@traced_template
+@cached_template
 def plot_distribution_comparison(data: pd.DataFrame, x_col: str, y_col: str, y_label: str, x_label: str,
-                                 title: str, output_path: str, plot_type: str = 'violin',
+                                 title: str, output_path: str | list, plot_type: str = 'violin',
                                  figsize: tuple = (8, 5), palette: dict = None, ax=None):
+    import seaborn as sns
+
     fig, ax, save_and_close = _setup_ax_and_save(ax, figsize, output_path)
 
     # ... (toàn bộ code vẽ bên trong hàm giữ nguyên)
+    mark_stage('artists')
     plot_func = sns.violinplot if plot_type == 'violin' else sns.boxplot
     plot_func(x=x_col, y=y_col, data=data, palette=palette, ax=ax)
     ax.set_ylabel(y_label)
     ax.set_xlabel(x_label)
     ax.set_title(title)
     if len(data[x_col].unique()) > 4:
-        plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
+        for label in ax.get_xticklabels():
+            label.set(rotation=30, ha="right")
     ax.grid(axis='x', which='both', visible=False)
     ax.grid(axis='y', which='major', linestyle=':', linewidth=0.7)
 
     if save_and_close:
-        plt.savefig(output_path)
-        print(f"{plot_type.capitalize()} plot saved to: {output_path}")
-        plt.close(fig)
+        saved = _save_figure(fig, output_path, f"{plot_type.capitalize()} plot")
+        if saved is not None:
+            return saved
     return ax
 
 # src/plot_templates.py
 # (thêm vào cuối file)
-from scipy.interpolate import griddata
+from interpolation import ScatteredInterpolator
 
+@traced_template
+@cached_template
 def plot_contour(
     x_data,
     y_data,
@@ -445,14 +1081,18 @@ def plot_contour(
     x_label: str,
     y_label: str,
     title: str,
-    output_path: str,
+    output_path: str | list,
     cbar_label: str,
     figsize: tuple = (7, 5),
     cmap: str = 'viridis',
     is_gridded: bool = False,
     grid_resolution: int = 100,
     levels: int = 10,
-    show_points: bool = True
+    show_points: bool = True,
+    point_mode: str = 'auto',
+    point_threshold: int = 20000,
+    method: str = 'cubic',
+    interpolator: ScatteredInterpolator = None
 ):
     """
     Tạo và lưu biểu đồ đường viền (contour plot), có thể nội suy từ dữ liệu rời rạc.
@@ -464,7 +1104,7 @@ def plot_contour(
         x_label (str): Nhãn trục X.
         y_label (str): Nhãn trục Y.
         title (str): Tiêu đề biểu đồ.
-        output_path (str): Đường dẫn lưu file PDF.
+        output_path (str | list): Đường dẫn lưu file PDF, hoặc danh sách đường dẫn để lưu nhiều định dạng.
         cbar_label (str): Nhãn cho thanh màu.
         figsize (tuple, optional): Kích thước figure. Mặc định là (7, 5).
         cmap (str, optional): Tên colormap. Mặc định là 'viridis'.
@@ -474,25 +1114,59 @@ def plot_contour(
         levels (int, optional): Số lượng đường viền. Mặc định là 10.
         show_points (bool, optional): Có hiển thị các điểm dữ liệu gốc hay không. 
                                       Hữu ích khi is_gridded=False. Mặc định là True.
+        point_mode (str, optional): Cách vẽ các điểm gốc: 'vector', 'rasterize', 'density'
+                                    (gộp thành hexbin) hoặc 'auto' (rasterize khi số điểm
+                                    vượt `point_threshold`). Mặc định là 'auto'.
+        point_threshold (int, optional): Ngưỡng số điểm cho chế độ 'auto'. Mặc định là 20000.
+        method (str, optional): Phương pháp nội suy khi is_gridded=False: 'linear', 'cubic',
+                                'nearest', 'idw' hoặc 'rbf' (xem ScatteredInterpolator).
+                                Mặc định là 'cubic' (giống griddata trước đây).
+        interpolator (ScatteredInterpolator, optional): Bộ nội suy đã dựng sẵn cho đúng các
+                                điểm (x_data, y_data). Truyền vào để dùng lại tam giác
+                                Delaunay / KD-tree giữa nhiều lần vẽ; khi đó `method` bị bỏ qua.
     """
-    fig, ax = plt.subplots(figsize=figsize, layout='constrained')
+    fig, ax = _new_figure(figsize)
+    mark_stage('data_prep')
     
     xi, yi, zi = None, None, None
     
     if is_gridded:
-        # Dữ liệu đã là lưới, X và Y là vector, Z là ma trận
-        xi, yi = x_data, y_data
-        zi = z_data
+        # Dữ liệu đã là lưới, X và Y là vector, Z là ma trận.
+        # Z có thể là file .npy / memmap: gộp khối nếu lưới mịn hơn số pixel hiển thị.
+        xi, yi = load_array(x_data), load_array(y_data)
+        zi = load_array(z_data)
+        fy, fx = block_factors(zi.shape, _axes_pixel_size(ax)[::-1])
+        if (fy, fx) != (1, 1):
+            logger.info("Contour grid downsampled by block mean (%dx%d) from %s", fy, fx, zi.shape)
+            zi = block_reduce(zi, (fy, fx))
+            xi = block_reduce(xi, (fx,)) if xi.ndim == 1 else block_reduce(xi, (fy, fx))
+            yi = block_reduce(yi, (fy,)) if yi.ndim == 1 else block_reduce(yi, (fy, fx))
+        else:
+            xi, yi, zi = np.asarray(xi), np.asarray(yi), np.asarray(zi)
     else:
-        # Dữ liệu là các điểm rời rạc, cần nội suy
-        # Tạo một lưới đều
-        xi = np.linspace(min(x_data), max(x_data), grid_resolution)
-        yi = np.linspace(min(y_data), max(y_data), grid_resolution)
-        grid_x, grid_y = np.meshgrid(xi, yi)
-        
-        # Nội suy dữ liệu Z lên lưới
-        zi = griddata((x_data, y_data), z_data, (grid_x, grid_y), method='cubic')
+        # Dữ liệu là các điểm rời rạc, cần nội suy lên một lưới đều
+        if interpolator is None:
+            interpolator = ScatteredInterpolator(x_data, y_data, method=method)
+        xi, yi, zi = interpolator(z_data, grid_resolution)
+
+    mark_stage('artists')
+    _draw_contour(ax, xi, yi, zi, levels, cmap, cbar_label)
+
+    # Hiển thị các điểm dữ liệu gốc (nếu có)
+    mode = 'vector'
+    if not is_gridded and show_points:
+        mode = _draw_sample_points(ax, x_data, y_data, point_mode, point_threshold)
+
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    ax.set_title(title)
+    
+    return _save_figure(fig, output_path, "Contour plot",
+                        point_layer=(len(x_data), mode, point_mode, point_threshold))
+
 
+def _draw_contour(ax, xi, yi, zi, levels, cmap, cbar_label):
+    """Vẽ contour tô màu, đường viền có nhãn số và thanh màu của một trường Z đã ở dạng lưới."""
     # Vẽ contour plot dạng tô màu (filled)
     contourf = ax.contourf(xi, yi, zi, levels=levels, cmap=cmap, alpha=0.9)
     
@@ -502,20 +1176,117 @@ def plot_contour(
     # Thêm nhãn số lên các đường viền
     ax.clabel(contour_lines, inline=True, fontsize=8, fmt='%.1f')
     
-    # Hiển thị các điểm dữ liệu gốc (nếu có)
-    if not is_gridded and show_points:
-        ax.scatter(x_data, y_data, c='red', s=10, edgecolor='black', linewidth=0.5,
-                   label='Data Points', zorder=10)
-        ax.legend(loc='upper right')
-
-    ax.set_xlabel(x_label)
-    ax.set_ylabel(y_label)
-    ax.set_title(title)
-    
     # Thêm thanh màu (colorbar)
-    cbar = fig.colorbar(contourf, ax=ax)
+    cbar = ax.figure.colorbar(contourf, ax=ax)
     cbar.set_label(cbar_label)
-    
-    plt.savefig(output_path)
-    print(f"Contour plot saved to: {output_path}")
-    plt.close(fig)
+    return contourf
+
+
+def _draw_sample_points(ax, x_data, y_data, point_mode, point_threshold):
+    """Vẽ các điểm mẫu gốc lên contour; trả về chế độ vẽ đã chọn."""
+    mode = _resolve_point_mode(point_mode, len(x_data), point_threshold)
+    if mode == 'density':
+        ax.hexbin(x_data, y_data, gridsize=60, cmap='Greys', mincnt=1, alpha=0.6,
+                  linewidths=0, zorder=10, rasterized=True)
+        ax.scatter([], [], c='gray', s=10, edgecolor='black', linewidth=0.5,
+                   label='Data Points (density)')
+    else:
+        ax.scatter(x_data, y_data, c='red', s=10, edgecolor='black', linewidth=0.5,
+                   label='Data Points', zorder=10, rasterized=(mode == 'rasterize'))
+    ax.legend(loc='upper right')
+    return mode
+
+
+@traced_template
+@cached_template
+def plot_contour_grid(
+    x_data,
+    y_data,
+    z_fields,
+    x_label: str,
+    y_label: str,
+    titles: list,
+    output_path: str | list,
+    cbar_labels: list = None,
+    suptitle: str = None,
+    ncols: int = None,
+    figsize: tuple = None,
+    cmap='viridis',
+    grid_resolution: int = 100,
+    levels: int = 10,
+    show_points: bool = False,
+    point_mode: str = 'auto',
+    point_threshold: int = 20000,
+    method: str = 'linear',
+    interpolator: ScatteredInterpolator = None
+):
+    """
+    Vẽ nhiều contour (small multiples) cho nhiều đại lượng đo trên CÙNG một tập điểm
+    (x, y), vd: secret key rate, QBER và throughput của một lần quét tham số.
+    Tam giác hóa và trọng số nội suy trên lưới chỉ được tính một lần cho mọi trường.
+
+    Args:
+        x_data (array-like): Tọa độ X của các điểm mẫu.
+        y_data (array-like): Tọa độ Y của các điểm mẫu.
+        z_fields (array-like hoặc pd.DataFrame): Ma trận (n_fields, n_points), list các
+                                                 mảng Z, hoặc DataFrame mỗi cột là một trường.
+        x_label (str): Nhãn trục X (hiển thị ở hàng dưới cùng).
+        y_label (str): Nhãn trục Y (hiển thị ở cột đầu tiên).
+        titles (list): Tiêu đề của từng ô, theo thứ tự các trường.
+        output_path (str | list): Đường dẫn lưu file PDF, hoặc danh sách đường dẫn để lưu nhiều định dạng.
+        cbar_labels (list, optional): Nhãn thanh màu của từng ô. Mặc định dùng `titles`.
+        suptitle (str, optional): Tiêu đề chung của cả figure.
+        ncols (int, optional): Số cột của lưới ô. Mặc định là min(n_fields, 3).
+        figsize (tuple, optional): Kích thước figure. Mặc định là (4.2 * ncols, 3.4 * nrows).
+        cmap (str hoặc list, optional): Colormap chung hoặc một colormap cho mỗi trường.
+                                        Mặc định là 'viridis'.
+        grid_resolution (int, optional): Độ phân giải của lưới nội suy. Mặc định là 100.
+        levels (int, optional): Số lượng đường viền mỗi ô. Mặc định là 10.
+        show_points (bool, optional): Có vẽ các điểm mẫu lên mỗi ô hay không. Mặc định là False.
+        point_mode (str, optional): Cách vẽ các điểm mẫu (xem `plot_contour`). Mặc định là 'auto'.
+        point_threshold (int, optional): Ngưỡng số điểm cho chế độ 'auto'. Mặc định là 20000.
+        method (str, optional): Phương pháp nội suy (xem ScatteredInterpolator). Mặc định là
+                                'linear': mỗi trường chỉ tốn một phép nhân với trọng số
+                                barycentric đã tính sẵn.
+        interpolator (ScatteredInterpolator, optional): Bộ nội suy dựng sẵn cho (x_data, y_data).
+    """
+    mark_stage('data_prep')
+    if _is_dataframe(z_fields):
+        z_fields = z_fields.to_numpy().T
+    z_fields = np.atleast_2d(np.asarray(z_fields, dtype=float))
+    n_fields = len(z_fields)
+    if len(titles) != n_fields:
+        raise ValueError(f"Cần {n_fields} tiêu đề cho {n_fields} trường Z, nhận được {len(titles)}.")
+    cbar_labels = cbar_labels or titles
+    cmaps = [cmap] * n_fields if isinstance(cmap, str) else list(cmap)
+
+    # Nội suy tất cả các trường trong một lượt
+    if interpolator is None:
+        interpolator = ScatteredInterpolator(x_data, y_data, method=method)
+    xi, yi, zi = interpolator(z_fields, grid_resolution)
+
+    ncols = ncols or min(n_fields, 3)
+    nrows = int(np.ceil(n_fields / ncols))
+    figsize = figsize or (4.2 * ncols, 3.4 * nrows)
+    fig, axes = _new_figure(figsize, nrows, ncols, squeeze=False)
+    mark_stage('artists')
+
+    mode = 'vector'
+    for i, ax in enumerate(axes.flat):
+        if i >= n_fields:
+            ax.set_visible(False)  # Ô thừa ở hàng cuối
+            continue
+        _draw_contour(ax, xi, yi, zi[i], levels, cmaps[i], cbar_labels[i])
+        if show_points:
+            mode = _draw_sample_points(ax, x_data, y_data, point_mode, point_threshold)
+        ax.set_title(titles[i])
+        # Chỉ ghi nhãn trục ở hàng dưới cùng / cột đầu tiên để tiết kiệm không gian
+        if i + ncols >= n_fields:
+            ax.set_xlabel(x_label)
+        if i % ncols == 0:
+            ax.set_ylabel(y_label)
+    if suptitle:
+        fig.suptitle(suptitle)
+
+    return _save_figure(fig, output_path, f"Contour grid ({n_fields} fields)",
+                        point_layer=(len(x_data), mode, point_mode, point_threshold))
@@ -1,6 +1,14 @@
 # src/publication_style.py
 
-import matplotlib.pyplot as plt
+import functools
+from types import MappingProxyType
+
+import matplotlib
+import matplotlib.style
+
+from render_log import get_logger
+
+logger = get_logger('publication_style')
 
 # ==============================================================================
 # Bảng màu tùy chỉnh (Custom Color Palette)
@@ -48,77 +56,167 @@ CONTEXT_COLORS.update({
 
 
 # ==============================================================================
-# Hàm thiết lập style chính
+# Style dựng sẵn (precompiled style)
+# Thay vì gọi `plt.style.use` rồi ghi từng khóa rcParams mỗi lần, toàn bộ các
+# thông số được tính MỘT lần cho mỗi font family (seaborn 'ticks' làm nền, rồi
+# các giá trị riêng bên dưới), kiểm tra hợp lệ, và lưu trong một object bất biến.
+# Áp dụng style chỉ còn là một lệnh `rcParams.update`; đổi style tạm thời dùng
+# `style.context()` (rc_context của matplotlib, tự khôi phục khi thoát).
+#
+# Phạm vi: rcParams của matplotlib là trạng thái chung của cả process, nên cả
+# `apply()` lẫn `context()` đều có tác dụng cho toàn process, KHÔNG gắn với một
+# figure. `context()` chỉ an toàn khi một thread vẽ tại một thời điểm (vd: mỗi
+# worker process của batch_render chạy từng job một): trong khối `with`, mọi thread
+# khác cũng vẽ và lưu bằng style này, và lúc thoát, rcParams bị khôi phục về ảnh
+# chụp lúc vào, ghi đè cả thay đổi của thread khác. Các thread vẽ song song nên
+# dùng chung một style, áp dụng một lần lúc khởi động.
 # ==============================================================================
-def set_publication_style(font_family='sans-serif'):
-    """
-    Thiết lập các thông số rcParams của Matplotlib để tạo ra các figure
-    có chất lượng cao, sẵn sàng cho việc công bố khoa học.
+FONT_FAMILIES = ('serif', 'sans-serif')
+_BASE_STYLE = 'seaborn-v0_8-ticks'  # 'seaborn-v0_8-paper' cũng là một lựa chọn tốt
 
-    Args:
-        font_family (str): 'serif' (vd: Times New Roman) hoặc 
-                           'sans-serif' (vd: Arial).
-    """
-    
-    # Sử dụng một style cơ bản của Seaborn làm nền tảng
-    # 'seaborn-v0_8-paper' là một lựa chọn tốt, 'seaborn-v0_8-ticks' cũng là một lựa chọn tốt
-    plt.style.use('seaborn-v0_8-ticks')
-    
-    # --- 1. Font Settings ---
-    if font_family == 'serif':
-        plt.rcParams['font.family'] = 'serif'
-        plt.rcParams['font.serif'] = ['Times New Roman', 'DejaVu Serif']
-        plt.rcParams['mathtext.fontset'] = 'dejavuserif' # Font cho công thức toán
-    elif font_family == 'sans-serif':
-        plt.rcParams['font.family'] = 'sans-serif'
-        plt.rcParams['font.sans-serif'] = ['Arial', 'DejaVu Sans']
-        plt.rcParams['mathtext.fontset'] = 'dejavusans' # Font cho công thức toán
-    
+# --- 1. Font Settings ---
+_FONT_PARAMS = {
+    'serif': {
+        'font.family': 'serif',
+        'font.serif': ['Times New Roman', 'DejaVu Serif'],
+        'mathtext.fontset': 'dejavuserif',  # Font cho công thức toán
+    },
+    'sans-serif': {
+        'font.family': 'sans-serif',
+        'font.sans-serif': ['Arial', 'DejaVu Sans'],
+        'mathtext.fontset': 'dejavusans',  # Font cho công thức toán
+    },
+}
+
+_PUBLICATION_PARAMS = {
     # --- 2. Font Size Hierarchy ---
     # Dựa trên phân tích, chúng ta sẽ đặt các kích thước này
     # để đảm bảo dễ đọc sau khi chèn vào paper (thường font paper là 10pt).
-    plt.rcParams['font.size'] = 10           # Kích thước font cơ bản
-    plt.rcParams['axes.labelsize'] = 10      # Tên trục x, y
-    plt.rcParams['axes.titlesize'] = 11      # Tiêu đề của một subplot
-    plt.rcParams['xtick.labelsize'] = 9      # Số trên trục x
-    plt.rcParams['ytick.labelsize'] = 9      # Số trên trục y
-    plt.rcParams['legend.fontsize'] = 9      # Chú thích
-    plt.rcParams['figure.titlesize'] = 12    # Tiêu đề lớn của cả figure
-    
+    'font.size': 10,           # Kích thước font cơ bản
+    'axes.labelsize': 10,      # Tên trục x, y
+    'axes.titlesize': 11,      # Tiêu đề của một subplot
+    'xtick.labelsize': 9,      # Số trên trục x
+    'ytick.labelsize': 9,      # Số trên trục y
+    'legend.fontsize': 9,      # Chú thích
+    'figure.titlesize': 12,    # Tiêu đề lớn của cả figure
+
     # --- 3. Line and Marker Settings ---
-    plt.rcParams['lines.linewidth'] = 1.5    # Độ dày đường mặc định
-    plt.rcParams['lines.markersize'] = 5     # Kích thước marker mặc định
-    plt.rcParams['lines.markeredgewidth'] = 1.0 # Độ dày viền marker
-    
+    'lines.linewidth': 1.5,    # Độ dày đường mặc định
+    'lines.markersize': 5,     # Kích thước marker mặc định
+    'lines.markeredgewidth': 1.0,  # Độ dày viền marker
+
     # --- 4. Axes and Ticks Settings ---
-    plt.rcParams['axes.edgecolor'] = 'black' # Màu của các trục
-    plt.rcParams['axes.linewidth'] = 1.0     # Độ dày của các trục
-    
+    'axes.edgecolor': 'black',  # Màu của các trục
+    'axes.linewidth': 1.0,     # Độ dày của các trục
     # Bật các "ticks" (vạch nhỏ) vào trong để trông gọn gàng hơn
-    plt.rcParams['xtick.direction'] = 'in'
-    plt.rcParams['ytick.direction'] = 'in'
-    plt.rcParams['xtick.major.size'] = 5     # Độ dài vạch chính
-    plt.rcParams['ytick.major.size'] = 5
-    plt.rcParams['xtick.minor.size'] = 3     # Độ dài vạch phụ
-    plt.rcParams['ytick.minor.size'] = 3
-    
+    'xtick.direction': 'in',
+    'ytick.direction': 'in',
+    'xtick.major.size': 5,     # Độ dài vạch chính
+    'ytick.major.size': 5,
+    'xtick.minor.size': 3,     # Độ dài vạch phụ
+    'ytick.minor.size': 3,
     # Bật hiển thị ticks trên cả 4 cạnh để dễ dàng gióng hàng hơn
-    plt.rcParams['xtick.top'] = True
-    plt.rcParams['ytick.right'] = True
-    
+    'xtick.top': True,
+    'ytick.right': True,
+
     # --- 5. Legend Settings ---
-    plt.rcParams['legend.frameon'] = False   # Tắt khung viền của legend, trông hiện đại hơn
-    plt.rcParams['legend.loc'] = 'best'
-    
+    'legend.frameon': False,   # Tắt khung viền của legend, trông hiện đại hơn
+    'legend.loc': 'best',
+
     # --- 6. Grid Settings ---
-    plt.rcParams['axes.grid'] = True         # Bật lưới theo mặc định
-    plt.rcParams['grid.color'] = 'lightgray' # Màu lưới rất nhạt
-    plt.rcParams['grid.linestyle'] = ':'     # Kiểu lưới: chấm chấm
-    plt.rcParams['grid.linewidth'] = 0.6
-    
+    'axes.grid': True,         # Bật lưới theo mặc định
+    'grid.color': 'lightgray',  # Màu lưới rất nhạt
+    'grid.linestyle': ':',     # Kiểu lưới: chấm chấm
+    'grid.linewidth': 0.6,
+
     # --- 7. Figure Saving Settings ---
-    plt.rcParams['savefig.dpi'] = 600
-    plt.rcParams['savefig.format'] = 'pdf'
-    plt.rcParams['savefig.bbox'] = 'tight'   # Tự động cắt khoảng trắng thừa khi lưu
-    
-    print("Publication style set successfully.")
+    'savefig.dpi': 600,
+    'savefig.format': 'pdf',
+    'savefig.bbox': 'tight',   # Tự động cắt khoảng trắng thừa khi lưu
+}
+
+
+class PublicationStyle:
+    """
+    Bộ thông số rcParams bất biến, đã kiểm tra hợp lệ. Tạo bằng `get_publication_style()`.
+
+    Attributes:
+        name (str): Tên style (vd: 'publication-sans-serif').
+        params (Mapping): Các khóa rcParams và giá trị (chỉ đọc).
+    """
+
+    __slots__ = ('_name', '_params')
+
+    def __init__(self, name, params):
+        # matplotlib.RcParams kiểm tra và chuẩn hóa từng giá trị một lần, lúc dựng style
+        validated = matplotlib.RcParams(params)
+        self._name = name
+        self._params = MappingProxyType({key: validated[key] for key in params})
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def params(self):
+        return self._params
+
+    def apply(self):
+        """Áp dụng style cho toàn bộ process và mọi thread (giống `set_publication_style`, nhưng không in gì)."""
+        matplotlib.rcParams.update(self._params)
+
+    def context(self):
+        """
+        Context manager áp dụng style tạm thời (`matplotlib.rc_context`); rcParams được
+        khôi phục khi thoát khối `with`. Style có tác dụng cho cả process trong suốt khối
+        `with`, không riêng figure được vẽ bên trong: không dùng khi nhiều thread vẽ song song
+        với style khác nhau (xem ghi chú ở đầu mục).
+
+        Ví dụ:
+            with get_publication_style('serif').context():
+                plot_line_comparison(...)
+        """
+        return matplotlib.rc_context(self._params)
+
+    def __repr__(self):
+        return f"PublicationStyle('{self._name}', {len(self._params)} params)"
+
+
+@functools.lru_cache(maxsize=None)
+def get_publication_style(font_family='sans-serif'):
+    """
+    Trả về style dựng sẵn cho `font_family` (chỉ dựng ở lần gọi đầu tiên).
+
+    Args:
+        font_family (str): 'serif' (vd: Times New Roman) hoặc
+                           'sans-serif' (vd: Arial).
+
+    Returns:
+        PublicationStyle: Style bất biến, dùng chung cho mọi lần gọi.
+
+    Raises:
+        ValueError: Nếu `font_family` không thuộc FONT_FAMILIES.
+    """
+    if font_family not in FONT_FAMILIES:
+        raise ValueError(f"font_family phải là một trong {FONT_FAMILIES}, nhận được '{font_family}'.")
+    # Style nền đã được matplotlib đọc sẵn vào `style.library` khi import
+    params = dict(matplotlib.style.library[_BASE_STYLE])
+    params.update(_FONT_PARAMS[font_family])
+    params.update(_PUBLICATION_PARAMS)
+    return PublicationStyle(f'publication-{font_family}', params)
+
+
+# ==============================================================================
+# Hàm thiết lập style chính
+# ==============================================================================
+def set_publication_style(font_family='sans-serif'):
+    """
+    Thiết lập các thông số rcParams của Matplotlib để tạo ra các figure
+    có chất lượng cao, sẵn sàng cho việc công bố khoa học.
+
+    Args:
+        font_family (str): 'serif' (vd: Times New Roman) hoặc 
+                           'sans-serif' (vd: Arial).
+    """
+    get_publication_style(font_family).apply()
+    logger.info("Publication style set successfully.")
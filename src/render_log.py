@@ -0,0 +1,182 @@
+# src/render_log.py
+
+import logging
+import os
+import sys
+import threading
+import time
+
+from instrumentation import current_template
+
+# ==============================================================================
+# Logging cho các template
+# Mọi thông báo của thư viện (figure đã lưu, cache hit, downsample...) đi qua
+# logger 'pubfigures' thay vì print(). Mặc định logger này im lặng (NullHandler):
+# batch job hàng triệu figure không phải ghi ra terminal cho từng figure.
+#
+# Mỗi figure được lưu sinh ra một "render event" ở mức INFO trên logger
+# 'pubfigures.render'. LogRecord mang thuộc tính `render`:
+#   {'template': 'plot_heatmap', 'output_path': ..., 'bytes': 48213,
+#    'duration': 0.41, 'cached': False}
+# (`duration` tính từ lúc gọi template tới khi lưu xong). Khi mức INFO không được
+# bật và không có bộ gom nào, event bị bỏ qua trước khi tính kích thước file.
+#
+#   enable_console_logging()   # In thông báo ra terminal (như print() trước đây)
+#   stats = enable_render_stats()   # Gom số figure / byte / thời gian theo template
+#
+# Có thể dùng thẳng module `logging` chuẩn: logging.getLogger('pubfigures').addHandler(...)
+# ==============================================================================
+
+LOGGER_NAME = 'pubfigures'
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.addHandler(logging.NullHandler())
+render_logger = logging.getLogger(f'{LOGGER_NAME}.render')
+
+_console_handler = None
+_render_stats = None
+
+
+def get_logger(module_name):
+    """Logger con của 'pubfigures' cho một module, vd: 'pubfigures.plot_templates'."""
+    return logging.getLogger(f'{LOGGER_NAME}.{module_name}')
+
+
+def log_render(output_path, message, cached=False):
+    """
+    Ghi render event cho một figure vừa được lưu (hoặc lấy lại từ cache).
+
+    Args:
+        output_path (str): File đã ghi.
+        message (str): Thông báo dạng text, vd: "Heatmap saved to: figures/04.pdf".
+        cached (bool, optional): True nếu file được chép từ FigureCache thay vì vẽ.
+    """
+    enabled = render_logger.isEnabledFor(logging.INFO)
+    stats = _render_stats
+    if not enabled and stats is None:
+        return
+    template, start = current_template() or (None, None)
+    try:
+        size = os.path.getsize(output_path)
+    except OSError:
+        size = None
+    event = {
+        'template': template,
+        'output_path': output_path,
+        'bytes': size,
+        'duration': None if start is None else time.perf_counter() - start,
+        'cached': cached,
+    }
+    record = render_logger.makeRecord(render_logger.name, logging.INFO, '', 0, message, (), None,
+                                      extra={'render': event})
+    if stats is not None:
+        stats.handle(record)  # Gom trực tiếp: không phụ thuộc mức log đang cấu hình
+    if enabled:
+        render_logger.handle(record)
+
+
+class RenderStats(logging.Handler):
+    """
+    Handler gom các render event: số figure, tổng byte và tổng thời gian theo template.
+    Các record khác (không có thuộc tính `render`) bị bỏ qua. Bật bằng `enable_render_stats()`
+    hoặc gắn vào logger 'pubfigures.render' như một handler bình thường.
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def emit(self, record):
+        event = getattr(record, 'render', None)
+        if event is None:
+            return
+        with self._stats_lock:
+            entry = self._stats.setdefault(event['template'], {
+                'count': 0, 'cached': 0, 'bytes': 0, 'duration': 0.0, 'max_duration': 0.0})
+            entry['count'] += 1
+            entry['cached'] += bool(event['cached'])
+            entry['bytes'] += event['bytes'] or 0
+            duration = event['duration'] or 0.0
+            entry['duration'] += duration
+            entry['max_duration'] = max(entry['max_duration'], duration)
+
+    def summary(self):
+        """
+        Returns:
+            dict: {template: {'count', 'cached', 'bytes', 'duration', 'max_duration'}}.
+        """
+        with self._stats_lock:
+            return {template: dict(entry) for template, entry in self._stats.items()}
+
+    def reset(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def format_summary(self):
+        lines = [f"{'template':<30} {'figures':>8} {'cached':>7} {'total MB':>9} {'total s':>9} {'max s':>8}"]
+        for template, s in sorted(self.summary().items(), key=lambda item: str(item[0])):
+            lines.append(f"{str(template):<30} {s['count']:>8} {s['cached']:>7} {s['bytes'] / 1024 ** 2:9.2f} "
+                         f"{s['duration']:9.3f} {s['max_duration']:8.3f}")
+        return '\n'.join(lines)
+
+
+# ==============================================================================
+# Bật / tắt đầu ra
+# ==============================================================================
+def enable_console_logging(level=logging.INFO, stream=None, fmt='%(message)s'):
+    """
+    In các thông báo của thư viện ra terminal.
+
+    Args:
+        level (int | str, optional): Mức log tối thiểu (vd: logging.INFO hoặc 'INFO').
+                                     Mặc định là logging.INFO.
+        stream (file, optional): Luồng ghi. Mặc định là sys.stderr.
+        fmt (str, optional): Định dạng của `logging.Formatter`. Mặc định chỉ có nội dung thông báo.
+
+    Returns:
+        logging.Handler: Handler vừa được thêm.
+    """
+    global _console_handler
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    disable_console_logging()
+    _console_handler = logging.StreamHandler(stream or sys.stderr)
+    _console_handler.setLevel(level)
+    _console_handler.setFormatter(logging.Formatter(fmt))
+    logger.addHandler(_console_handler)
+    if not logger.isEnabledFor(level):
+        logger.setLevel(level)
+    return _console_handler
+
+
+def disable_console_logging():
+    """Gỡ handler của `enable_console_logging`."""
+    global _console_handler
+    if _console_handler is not None:
+        logger.removeHandler(_console_handler)
+    _console_handler = None
+
+
+def enable_render_stats():
+    """
+    Bắt đầu gom render event của process hiện tại. Không thay đổi mức log: các event
+    vẫn được gom khi không có gì được in ra.
+
+    Returns:
+        RenderStats: Handler đang gom (dùng `summary()` / `format_summary()`).
+    """
+    global _render_stats
+    _render_stats = RenderStats()
+    return _render_stats
+
+
+def disable_render_stats():
+    """Ngừng gom render event."""
+    global _render_stats
+    _render_stats = None
+
+
+def get_render_stats():
+    """Trả về bộ gom đang bật, hoặc None."""
+    return _render_stats
@@ -0,0 +1,372 @@
+# src/render_server.py
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch_render import _worker_init, _run_job, template_names
+from render_log import get_logger, enable_console_logging
+
+# ==============================================================================
+# Render server
+# Dashboard cần figure theo yêu cầu: chạy `batch_render` cho mỗi request sẽ phải
+# trả chi phí khởi động Python, import matplotlib/seaborn/sklearn và nạp font cache
+# mỗi lần. Server này giữ một process pool "ấm" (mỗi worker đã import
+# `plot_templates` và áp dụng `set_publication_style` lúc khởi động) và nhận job qua HTTP:
+#
+#   POST /render   body: một job JSON giống batch_render, thêm khóa tùy chọn
+#                  'format' ('pdf', 'png', 'svg'...; mặc định 'pdf'). Không cần 'output_path'.
+#                  -> 200 với nội dung file, hoặc 4xx/5xx với {"error": ...}
+#   GET  /metrics  -> JSON: độ sâu hàng đợi, số job đang chạy / xong / lỗi, và
+#                     độ trễ (p50, p95, max) của thời gian chờ, thời gian vẽ và tổng.
+#   GET  /health   -> {"status": "ok", "workers": N}
+#
+# Server chỉ nên lắng nghe trên localhost: job có thể đọc bất kỳ file nào mà
+# process có quyền đọc (qua 'data_path' hoặc đường dẫn .npy trong kwargs).
+# ==============================================================================
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'eps': 'application/postscript',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+}
+_LATENCY_WINDOW = 1000  # Số job gần nhất dùng để tính phân vị độ trễ
+# Lỗi do job gửi lên (tham số sai, thiếu cột...) -> 400 thay vì 500
+_CLIENT_ERRORS = ('ValueError', 'TypeError', 'KeyError')
+logger = get_logger('render_server')
+
+
+_WARM_TIMEOUT = 120.0  # Thời gian tối đa (giây) chờ mọi worker cùng khởi động
+_warm_barrier = None   # Barrier của pool hiện tại, được gán trong từng worker
+
+
+def _server_worker_init(barrier, *initargs):
+    """Initializer của worker: giữ barrier khởi động rồi khởi tạo như batch_render."""
+    global _warm_barrier
+    _warm_barrier = barrier
+    _worker_init(*initargs)
+
+
+def _warm(_):
+    """
+    Job khởi động, một job cho mỗi worker: nạp sẵn các thư viện mà `plot_templates` chỉ
+    import khi cần (pandas, seaborn, scipy, sklearn.manifold) và vẽ một figure nhỏ bỏ đi
+    (nạp font cache, renderer Agg và backend PDF), để request đầu tiên không phải trả các
+    chi phí này. Sau đó chờ ở barrier cho tới khi mọi worker đều đang chạy một job khởi
+    động, nên không worker nào nhận hai job và mỗi worker được làm ấm đúng một lần.
+    """
+    import pandas  # noqa: F401
+    import scipy.cluster.hierarchy  # noqa: F401
+    import scipy.interpolate  # noqa: F401
+    import scipy.spatial  # noqa: F401
+    import seaborn  # noqa: F401
+    import sklearn.manifold  # noqa: F401
+    from figure_pool import new_figure
+
+    fig = new_figure((2, 2))
+    ax = fig.subplots()
+    ax.plot([0, 1], [0, 1], label='warm-up')
+    ax.set_title('warm-up')
+    ax.legend()
+    for fmt in ('png', 'pdf'):
+        fig.savefig(io.BytesIO(), format=fmt)
+
+    if _warm_barrier is not None:
+        try:
+            _warm_barrier.wait(timeout=_WARM_TIMEOUT)
+        except threading.BrokenBarrierError:
+            logger.warning("Worker %d: not every worker started within %.0fs", os.getpid(), _WARM_TIMEOUT)
+    return os.getpid()
+
+
+def _render_to_bytes(job, submitted_at):
+    """
+    Chạy trong worker: vẽ job ra một file tạm rồi trả về nội dung file.
+
+    Returns:
+        tuple: (result, data) - `result` là dict kết quả của batch_render (thêm 'queued'
+               là số giây job chờ trong hàng đợi), `data` là bytes của file (None nếu lỗi).
+    """
+    queued = time.time() - submitted_at
+    fmt = job.get('format', 'pdf')
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        result = _run_job(0, dict(job, output_path=path))
+        data = None
+        if result['ok']:
+            with open(path, 'rb') as f:
+                data = f.read()
+    finally:
+        os.remove(path)
+    result['queued'] = queued
+    return result, data
+
+
+class RenderService:
+    """
+    Process pool ấm cộng với bộ đếm cho /metrics. Dùng được độc lập với HTTP server.
+
+    Args:
+        max_workers (int, optional): Số worker process. Mặc định là số CPU.
+        font_family (str, optional): Font family truyền cho `set_publication_style`.
+        cache_options (dict, optional): Tham số cho `enable_figure_cache` trong mỗi worker.
+        pool_size (int, optional): Kích thước FigurePool trong mỗi worker. Mặc định là None (tắt).
+        max_queue (int, optional): Số job tối đa đang chờ hoặc đang chạy; vượt quá thì
+                                   request bị từ chối ngay (HTTP 503). Mặc định là 64.
+        timeout (float, optional): Thời gian tối đa (giây) chờ một job. Mặc định là 120.
+    """
+
+    def __init__(self, max_workers=None, font_family='sans-serif', cache_options=None, pool_size=None,
+                 max_queue=64, timeout=120.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._initargs = (font_family, cache_options, pool_size)
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._latency = {name: deque(maxlen=_LATENCY_WINDOW) for name in ('queued', 'render', 'total')}
+        self._restart_lock = threading.Lock()
+        self._templates = frozenset(template_names())
+        self._executor = self._start_executor()
+
+    def _start_executor(self):
+        """Tạo process pool và khởi động sẵn tất cả worker."""
+        barrier = multiprocessing.Barrier(self.max_workers)
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_server_worker_init,
+                                       initargs=(barrier, *self._initargs))
+        pids = set(executor.map(_warm, range(self.max_workers)))
+        logger.info("Render service ready: %d warm workers", len(pids))
+        return executor
+
+    # --- Vẽ ---
+    def render(self, job):
+        """
+        Vẽ một job và trả về nội dung file.
+
+        Returns:
+            tuple: (status, data, result) - `status` là mã HTTP (200, 400, 503, 504, 500),
+                   `data` là bytes của file khi thành công. Template không tồn tại và lỗi
+                   ValueError / TypeError / KeyError của job trả về 400 với dòng thông báo cuối.
+        """
+        fmt = job.get('format', 'pdf')
+        if fmt not in CONTENT_TYPES:
+            return 400, None, {'error': f"format phải là một trong {tuple(CONTENT_TYPES)}, nhận được '{fmt}'."}
+        if 'template' not in job:
+            return 400, None, {'error': "Job thiếu khóa 'template'."}
+        if job['template'] not in self._templates:
+            return 400, None, {'error': f"Không tìm thấy template '{job['template']}' trong plot_templates."}
+
+        with self._lock:
+            if self._outstanding >= self.max_queue:
+                self.rejected += 1
+                return 503, None, {'error': f"Hàng đợi đầy ({self.max_queue} job)."}
+            self._outstanding += 1
+            executor = self._executor
+
+        start = time.time()
+        try:
+            future = executor.submit(_render_to_bytes, job, start)
+        except BrokenProcessPool:
+            self._release()
+            self._finish(ok=False)
+            self._restart(executor)
+            return 500, None, {'error': 'Worker process died; pool restarted.'}
+        # Job chỉ rời hàng đợi khi worker thật sự xong (kể cả khi request đã hết thời gian chờ)
+        future.add_done_callback(self._release)
+        try:
+            result, data = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # Bỏ job nếu nó chưa được giao cho worker
+            self._finish(ok=False)
+            return 504, None, {'error': f"Job vượt quá {self.timeout}s."}
+        except BrokenProcessPool:
+            # Một worker chết (vd: segfault): dựng lại pool cho các request sau
+            self._finish(ok=False)
+            self._restart(executor)
+            return 500, None, {'error': 'Worker process died; pool restarted.'}
+
+        total = time.time() - start
+        self._finish(ok=result['ok'], queued=result['queued'], render=result['elapsed'], total=total)
+        if not result['ok']:
+            if result.get('error_type') in _CLIENT_ERRORS:
+                # Chỉ trả về dòng thông báo cuối, không lộ traceback của worker
+                return 400, None, {'error': result['error'].strip().splitlines()[-1]}
+            return 500, None, {'error': result['error']}
+        return 200, data, result
+
+    def _release(self, future=None):
+        with self._lock:
+            self._outstanding -= 1
+
+    def _finish(self, ok, **latency):
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            for name, seconds in latency.items():
+                self._latency[name].append(seconds)
+
+    def _restart(self, broken):
+        # Các request đang dùng pool hỏng cũng nhận BrokenProcessPool và gọi vào đây;
+        # chỉ request đầu tiên dựng lại pool, pool mới thay thế pool cũ trong một bước
+        with self._restart_lock:
+            if self._executor is not broken:
+                return  # Một request khác đã dựng lại pool
+            broken.shutdown(wait=False, cancel_futures=True)
+            executor = self._start_executor()
+            with self._lock:
+                self._executor = executor
+
+    # --- Metrics ---
+    def metrics(self):
+        """Trạng thái hiện tại của service, dạng dict (xem /metrics)."""
+        with self._lock:
+            outstanding = self._outstanding
+            snapshot = {
+                'workers': self.max_workers,
+                'queue_depth': max(0, outstanding - self.max_workers),
+                'in_flight': min(outstanding, self.max_workers),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+            samples = {name: sorted(values) for name, values in self._latency.items()}
+        snapshot['latency_seconds'] = {name: _summarize(values) for name, values in samples.items()}
+        return snapshot
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def _summarize(sorted_values):
+    """p50 / p95 / max / mean của một danh sách đã sắp xếp."""
+    if not sorted_values:
+        return {'count': 0}
+    n = len(sorted_values)
+    return {
+        'count': n,
+        'mean': sum(sorted_values) / n,
+        'p50': sorted_values[int(0.50 * (n - 1))],
+        'p95': sorted_values[int(0.95 * (n - 1))],
+        'max': sorted_values[-1],
+    }
+
+
+# ==============================================================================
+# HTTP
+# ==============================================================================
+class _RenderHandler(BaseHTTPRequestHandler):
+    service = None  # Được gán bởi `serve()`
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.service.metrics())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'workers': self.service.max_workers})
+        else:
+            self._send_json(404, {'error': f"Không có endpoint {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/render':
+            self._send_json(404, {'error': f"Không có endpoint {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(job, dict):
+                raise ValueError('Job phải là một JSON object.')
+        except ValueError as e:
+            self._send_json(400, {'error': f"JSON không hợp lệ: {e}"})
+            return
+
+        status, data, result = self.service.render(job)
+        if status != 200:
+            self._send_json(status, result)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[job.get('format', 'pdf')])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Render-Seconds', f"{result['elapsed']:.4f}")
+        self.send_header('X-Queue-Seconds', f"{result['queued']:.4f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+def serve(host='127.0.0.1', port=8765, **service_options):
+    """
+    Khởi động service (worker ấm) rồi phục vụ HTTP cho tới khi bị ngắt (Ctrl+C).
+
+    Args:
+        host (str, optional): Địa chỉ lắng nghe. Mặc định là '127.0.0.1' (chỉ máy local).
+        port (int, optional): Cổng. Mặc định là 8765.
+        **service_options: Tham số cho `RenderService`.
+    """
+    # Khởi động worker TRƯỚC khi HTTP server tạo thread (an toàn khi fork)
+    service = RenderService(**service_options)
+    handler = type('RenderHandler', (_RenderHandler,), {'service': service})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    logger.info("Serving figures on http://%s:%d (POST /render, GET /metrics)", host, httpd.server_address[1])
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve figure templates over HTTP from warm worker processes.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of worker processes.')
+    parser.add_argument('--font-family', default='sans-serif', choices=['serif', 'sans-serif'])
+    parser.add_argument('--cache-dir', default=None, help='Skip figures whose inputs are unchanged (content-addressed cache).')
+    parser.add_argument('--figure-pool', type=int, default=None, metavar='N',
+                        help='Reuse up to N idle figures of the same size per worker.')
+    parser.add_argument('--max-queue', type=int, default=64, help='Reject requests (503) beyond this many outstanding jobs.')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Seconds to wait for one job.')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Console log level (INFO logs one line per request).')
+    args = parser.parse_args(argv)
+
+    enable_console_logging(level=args.log_level, fmt='%(asctime)s [%(name)s] %(message)s')
+
+    cache_options = {'cache_dir': args.cache_dir} if args.cache_dir else None
+    serve(args.host, args.port, max_workers=args.workers, font_family=args.font_family,
+          cache_options=cache_options, pool_size=args.figure_pool, max_queue=args.max_queue,
+          timeout=args.timeout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
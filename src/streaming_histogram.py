@@ -0,0 +1,221 @@
+# src/streaming_histogram.py
+
+import numpy as np
+
+# ==============================================================================
+# Histogram tích lũy (Streaming histogram accumulator)
+# Cho phép vẽ phân phối của hàng tỷ mẫu (vd: latency của mọi request production)
+# mà không cần giữ dữ liệu gốc trong bộ nhớ. Dữ liệu được đưa vào theo từng lô
+# (batch) từ file, generator hoặc memmap; accumulator chỉ giữ:
+#   - một mảng "bin mịn" (fine bins) có kích thước cố định,
+#   - các thống kê chính xác: số mẫu, tổng, tổng bình phương, min, max.
+# Histogram hiển thị và đường KDE được tính lại từ các bin mịn khi vẽ.
+# ==============================================================================
+
+_UPDATE_BATCH = 1_000_000  # Số mẫu xử lý mỗi lần, để giới hạn bộ nhớ tạm khi đọc memmap
+
+
+class HistogramAccumulator:
+    """
+    Histogram có thể cập nhật tăng dần, dùng được thay cho dữ liệu gốc trong
+    `plot_distribution`.
+
+    Args:
+        bins (int, optional): Số bin hiển thị mặc định. Mặc định là 30.
+        range (tuple, optional): (min, max) cố định. Nếu None, khoảng giá trị được
+                                 mở rộng tự động (adaptive) khi có mẫu nằm ngoài:
+                                 độ rộng bin mịn được nhân đôi và các cặp bin được gộp.
+        resolution (int, optional): Số bin mịn bên trong, quyết định độ chính xác của
+                                    histogram hiển thị và KDE. Mặc định là 2048.
+    """
+
+    def __init__(self, bins: int = 30, range: tuple = None, resolution: int = 2048):
+        self.bins = bins
+        self.fixed_range = None if range is None else (float(range[0]), float(range[1]))
+        if self.fixed_range is not None:
+            # Chọn số bin mịn là bội của `bins` để gộp lại thành histogram hiển thị chính xác
+            resolution = bins * max(1, int(np.ceil(resolution / bins)))
+            self._lo = self.fixed_range[0]
+            self._width = (self.fixed_range[1] - self.fixed_range[0]) / resolution
+        else:
+            resolution += resolution % 2  # Cần số chẵn để gộp từng cặp bin
+            self._lo = None
+            self._width = None
+        self._counts = np.zeros(resolution)
+        self.n = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    # --- Cập nhật ---
+    def update(self, values):
+        """
+        Thêm một lô mẫu. `values` có thể là list, ndarray, pd.Series hoặc np.memmap;
+        mảng lớn được xử lý theo từng đoạn để không tạo bản sao toàn bộ.
+        Các giá trị NaN/inf bị bỏ qua.
+
+        Returns:
+            HistogramAccumulator: Chính đối tượng này (để có thể gọi nối tiếp).
+        """
+        values = np.asarray(values).ravel()
+        for start in range(0, len(values), _UPDATE_BATCH):
+            self._update_batch(np.asarray(values[start:start + _UPDATE_BATCH], dtype=float))
+        return self
+
+    def update_from_iterable(self, batches):
+        """Thêm mẫu từ một iterable các lô (vd: generator đọc từ socket hoặc database)."""
+        for batch in batches:
+            self.update(batch)
+        return self
+
+    def update_from_csv(self, path: str, column: str, chunksize: int = 500_000, **read_csv_kwargs):
+        """Thêm mẫu từ một cột của file CSV, đọc theo từng khối."""
+        from data_loading import iter_columns
+        for chunk in iter_columns(path, [column], chunksize, **read_csv_kwargs):
+            self.update(chunk[column].to_numpy())
+        return self
+
+    def _update_batch(self, values):
+        values = values[np.isfinite(values)]
+        if self.fixed_range is not None:
+            lo, hi = self.fixed_range
+            values = values[(values >= lo) & (values <= hi)]
+        if values.size == 0:
+            return
+
+        v_min, v_max = values.min(), values.max()
+        if self.fixed_range is None:
+            self._ensure_covers(v_min, v_max)
+
+        resolution = len(self._counts)
+        idx = np.clip(((values - self._lo) / self._width).astype(np.int64), 0, resolution - 1)
+        self._counts += np.bincount(idx, minlength=resolution)
+
+        self.n += values.size
+        self._sum += values.sum()
+        self._sum_sq += np.square(values).sum()
+        self.min = min(self.min, v_min)
+        self.max = max(self.max, v_max)
+
+    def _ensure_covers(self, v_min, v_max):
+        """Mở rộng khoảng của các bin mịn (chế độ adaptive) cho tới khi chứa [v_min, v_max]."""
+        resolution = len(self._counts)
+        if self._lo is None:
+            span = v_max - v_min
+            self._lo = v_min
+            # Nới rộng một chút để v_max rơi vào bin cuối thay vì ngay biên
+            self._width = (span * (1 + 1e-9) / resolution) if span > 0 else max(abs(v_min), 1.0) * 1e-9
+            return
+
+        while v_min < self._lo or v_max >= self._lo + resolution * self._width:
+            half = resolution // 2
+            merged = self._counts.reshape(half, 2).sum(axis=1)
+            self._counts = np.zeros(resolution)
+            if v_min < self._lo:
+                # Mở rộng sang trái: dữ liệu cũ nằm ở nửa bên phải
+                self._counts[half:] = merged
+                self._lo -= resolution * self._width
+            else:
+                # Mở rộng sang phải: dữ liệu cũ nằm ở nửa bên trái
+                self._counts[:half] = merged
+            self._width *= 2
+
+    # --- Kết quả ---
+    @property
+    def mean(self):
+        return self._sum / self.n if self.n else np.nan
+
+    @property
+    def std(self):
+        if not self.n:
+            return np.nan
+        return np.sqrt(max(self._sum_sq / self.n - self.mean ** 2, 0.0))
+
+    def _fine_edges(self):
+        return self._lo + self._width * np.arange(len(self._counts) + 1)
+
+    def histogram(self, bins: int = None):
+        """
+        Trả về histogram hiển thị.
+
+        Args:
+            bins (int, optional): Số bin. Mặc định là `self.bins`.
+
+        Returns:
+            tuple: (counts, bin_edges). Với range cố định và `bins` chia hết số bin mịn,
+                   kết quả chính xác tuyệt đối; các trường hợp khác được nội suy từ các
+                   bin mịn (sai số chỉ nằm trong một bin mịn ở mỗi biên).
+        """
+        if self.n == 0:
+            raise ValueError("Accumulator chưa có mẫu nào.")
+        bins = bins or self.bins
+        fine_edges = self._fine_edges()
+        if self.fixed_range is not None:
+            lo, hi = self.fixed_range
+        else:
+            lo, hi = self.min, self.max if self.max > self.min else self.min + self._width
+        edges = np.linspace(lo, hi, bins + 1)
+
+        if self.fixed_range is not None and len(self._counts) % bins == 0:
+            return self._counts.reshape(bins, -1).sum(axis=1), edges
+
+        # Nội suy tuyến tính hàm phân phối tích lũy tại các biên hiển thị
+        # (giả sử mẫu phân bố đều bên trong mỗi bin mịn)
+        cumulative = np.concatenate([[0.0], np.cumsum(self._counts)])
+        at_edges = np.interp(edges, fine_edges, cumulative)
+        # Mọi mẫu được đếm đều nằm trong [lo, hi], nhưng ở chế độ tự co giãn min/max rơi vào
+        # giữa bin mịn: gán lại hai đầu để phần khối lượng đó không bị mất (counts.sum() == n)
+        at_edges[0], at_edges[-1] = 0.0, cumulative[-1]
+        return np.diff(at_edges), edges
+
+    def kde(self, gridsize: int = 200, bandwidth: float = None):
+        """
+        Xấp xỉ KDE Gaussian từ các bin mịn (binned KDE). Bandwidth mặc định theo
+        quy tắc Scott, tính từ độ lệch chuẩn và số mẫu CHÍNH XÁC, không nhỏ hơn độ
+        rộng một bin mịn.
+
+        Returns:
+            tuple: (grid, density) với density có tích phân bằng 1. Lưới trải từ min tới max
+                   của dữ liệu (giống `cut=0` của sns.histplot).
+        """
+        if self.n == 0:
+            raise ValueError("Accumulator chưa có mẫu nào.")
+        if bandwidth is None:
+            bandwidth = max(self.std * self.n ** (-1 / 5), self._width)
+
+        fine_edges = self._fine_edges()
+        centers = (fine_edges[:-1] + fine_edges[1:]) / 2
+        nonzero = self._counts > 0
+        centers, weights = centers[nonzero], self._counts[nonzero]
+
+        grid = np.linspace(self.min, self.max, gridsize)
+        density = np.zeros(gridsize)
+        # Chia nhỏ theo lưới để ma trận tạm (gridsize x n_bins) không quá lớn
+        for start in range(0, gridsize, 64):
+            z = (grid[start:start + 64, None] - centers[None, :]) / bandwidth
+            density[start:start + 64] = np.exp(-0.5 * z ** 2) @ weights
+        density /= self.n * bandwidth * np.sqrt(2 * np.pi)
+        return grid, density
+
+    @classmethod
+    def from_histogram(cls, counts, edges):
+        """
+        Tạo accumulator từ một histogram đã tính sẵn (counts, bin_edges) có bin đều.
+        Các thống kê (mean, std) được xấp xỉ từ tâm bin.
+        """
+        counts = np.asarray(counts, dtype=float)
+        edges = np.asarray(edges, dtype=float)
+        acc = cls(bins=len(counts), range=(edges[0], edges[-1]), resolution=len(counts))
+        acc._counts = counts.copy()
+        centers = (edges[:-1] + edges[1:]) / 2
+        acc.n = counts.sum()
+        acc._sum = (counts * centers).sum()
+        acc._sum_sq = (counts * centers ** 2).sum()
+        nonzero = np.flatnonzero(counts)
+        acc.min, acc.max = (edges[nonzero[0]], edges[nonzero[-1] + 1]) if nonzero.size else (edges[0], edges[-1])
+        return acc
+
+    def __repr__(self):
+        return (f"HistogramAccumulator(n={self.n}, min={self.min:.4g}, max={self.max:.4g}, "
+                f"bins={self.bins}, resolution={len(self._counts)})")
@@ -0,0 +1,85 @@
+# tests/test_array_io.py
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import array_io
+from array_io import block_factors, block_reduce, load_array, save_npz_atomic
+from content_hash import hash_content
+
+
+def test_block_factors_fit_shape():
+    assert block_factors((1000, 30), (300, 300)) == (4, 1)
+
+
+def test_block_reduce_matches_reshape_and_pads_edges():
+    a = np.arange(30, dtype=float).reshape(5, 6)
+    mean = block_reduce(a, (2, 3))
+    assert mean.shape == (3, 2)
+    assert mean[0, 0] == a[:2, :3].mean() and mean[2, 1] == a[4, 3:].mean()
+    assert block_reduce(a, (2, 3), 'max')[1, 1] == a[2:4, 3:].max()
+    assert np.array_equal(block_reduce(np.arange(5.0), (2,)), [0.5, 2.5, 4.0])
+
+
+def test_block_reduce_absmax_keeps_sign():
+    a = np.array([[0.5, -0.9], [0.1, 0.2]])
+    assert block_reduce(a, (2, 2), 'absmax')[0, 0] == -0.9
+
+
+def test_block_reduce_row_and_col_order():
+    a = np.random.default_rng(0).normal(size=(8, 4))
+    rows, cols = np.random.default_rng(1).permutation(8), np.array([3, 2, 1, 0])
+    expected = a[rows][:, cols].reshape(4, 2, 2, 2).mean(axis=(1, 3))
+    assert np.allclose(block_reduce(a, (2, 2), row_order=rows, col_order=cols), expected)
+
+
+def test_block_reduce_memmap_input(tmp_path):
+    path = str(tmp_path / 'm.npy')
+    a = np.random.default_rng(0).normal(size=(64, 16))
+    np.save(path, a)
+    mm = load_array(path)
+    assert isinstance(mm, np.memmap)
+    assert np.allclose(block_reduce(mm, (8, 4)), block_reduce(a, (8, 4)))
+
+
+def test_block_reduce_rejects_unknown_reducer():
+    with pytest.raises(ValueError):
+        block_reduce(np.ones((2, 2)), (1, 1), 'median')
+
+
+def test_save_npz_atomic_roundtrip_and_cleanup(tmp_path, monkeypatch):
+    path = str(tmp_path / 'out.npz')
+    save_npz_atomic(path, a=np.arange(3))
+    with np.load(path) as stored:
+        assert np.array_equal(stored['a'], np.arange(3))
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(array_io.np, 'savez', fail)
+    with pytest.raises(OSError):
+        save_npz_atomic(str(tmp_path / 'other.npz'), a=np.arange(3))
+    assert sorted(os.listdir(tmp_path)) == ['out.npz']
+
+
+def test_memmap_hash_is_independent_of_band_size(tmp_path, monkeypatch):
+    path = str(tmp_path / 'm.npy')
+    np.save(path, np.random.default_rng(0).normal(size=(100, 7)))
+    whole = hash_content(np.load(path, mmap_mode='r'))
+    monkeypatch.setattr('content_hash._HASH_BLOCK_BYTES', 1000)  # Ép băm theo nhiều dải
+    assert hash_content(np.load(path, mmap_mode='r')) == whole
+
+
+def test_npy_path_hash_follows_file_contents(tmp_path):
+    path = str(tmp_path / 'm.npy')
+    np.save(path, np.zeros(4))
+    before = hash_content(path)
+    assert hash_content(path) == before
+    np.save(path, np.ones(4))
+    assert hash_content(path) != before
+    assert hash_content('not-a-file.npy') != hash_content(str(tmp_path / 'missing.npy'))
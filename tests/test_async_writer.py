@@ -0,0 +1,89 @@
+# tests/test_async_writer.py
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from figure_export import AsyncWriter
+
+
+@pytest.fixture
+def writer():
+    writer = AsyncWriter(max_workers=1, max_pending=2)
+    yield writer
+    writer.shutdown()
+
+
+def test_result_is_returned(writer):
+    future = writer.submit(lambda a, b=0: a + b, 1, b=2)
+    assert future.result(timeout=5) == 3
+    writer.wait()
+    assert (writer.completed, writer.failed, writer.pending) == (1, 0, 0)
+
+
+def test_submit_blocks_at_max_pending(writer):
+    gate = threading.Event()
+    futures = [writer.submit(gate.wait, 5) for _ in range(2)]
+    assert writer.pending == 2
+
+    submitted = threading.Event()
+
+    def submit_third():
+        futures.append(writer.submit(lambda: 'third'))
+        submitted.set()
+
+    thread = threading.Thread(target=submit_third)
+    thread.start()
+    assert not submitted.wait(0.2)  # Đủ max_pending công việc: submit bị chặn
+
+    gate.set()
+    assert submitted.wait(5)
+    thread.join()
+    assert futures[-1].result(timeout=5) == 'third'
+    writer.wait()
+    assert writer.pending == 0 and writer.completed == 3
+
+
+def test_error_propagates_to_future(writer):
+    def fail():
+        raise OSError('disk full')
+
+    future = writer.submit(fail)
+    assert isinstance(future.exception(timeout=5), OSError)
+    with pytest.raises(OSError, match='disk full'):
+        future.result()
+    writer.wait()  # Lỗi nằm trong future, wait() không ném ra
+    assert (writer.completed, writer.failed) == (0, 1)
+
+    # Công việc lỗi vẫn trả lại chỗ trong hàng đợi
+    assert [writer.submit(lambda: i).result(timeout=5) for i in range(3)] == [0, 1, 2]
+
+
+def test_wait_runs_done_callbacks_first(writer):
+    seen = []
+    gate = threading.Event()
+    future = writer.submit(gate.wait, 5)
+    future.add_done_callback(lambda f: seen.append(f.result()))
+    gate.set()
+    writer.wait()
+    assert seen == [True]
+
+
+def test_template_returns_future_when_async_save_enabled(tmp_path):
+    import numpy as np
+    from figure_export import disable_async_save, enable_async_save, wait_for_saves
+    from plot_templates import plot_distribution
+
+    enable_async_save(max_workers=1, max_pending=1)
+    try:
+        path = str(tmp_path / 'dist.png')
+        future = plot_distribution(np.random.default_rng(0).normal(size=100), 'x', 'Async', path,
+                                   show_kde=False)
+        wait_for_saves()
+        assert future.result() == (path, os.path.getsize(path))
+    finally:
+        disable_async_save()
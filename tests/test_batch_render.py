@@ -0,0 +1,44 @@
+# tests/test_batch_render.py
+
+import os
+import sys
+
+import matplotlib
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import batch_render
+from batch_render import render_batch, template_names
+
+
+@pytest.fixture(autouse=True)
+def _restore_rc():
+    # executor='thread' áp dụng style cho chính process chạy test
+    with matplotlib.rc_context():
+        yield
+
+
+def test_template_names_computed_once():
+    names = template_names()
+    assert 'plot_distribution' in names and list(names) == sorted(names)
+    assert template_names() is names
+
+
+def test_unknown_template_reported_as_value_error(tmp_path):
+    jobs = [{'template': 'plot_missing', 'output_path': str(tmp_path / 'x.png')}]
+    (result,) = render_batch(jobs, executor='thread', max_workers=1)
+    assert not result['ok']
+    assert result['error_type'] == 'ValueError'
+
+
+def test_executor_failure_keeps_exception_type(tmp_path, monkeypatch):
+    def crash(index, job):
+        raise KeyError(index)
+
+    monkeypatch.setattr(batch_render, '_run_job', crash)
+    jobs = [{'template': 'plot_distribution', 'output_path': str(tmp_path / 'x.png')}]
+    (result,) = render_batch(jobs, executor='thread', max_workers=1)
+    assert not result['ok']
+    assert result['error_type'] == 'KeyError'
+    assert 'KeyError' in result['error']
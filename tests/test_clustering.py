@@ -0,0 +1,146 @@
+# tests/test_clustering.py
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import clustering
+from clustering import clear_cluster_cache, cluster_order
+
+
+@pytest.fixture(autouse=True)
+def _empty_memory_cache():
+    clear_cluster_cache()
+    yield
+    clear_cluster_cache()
+
+
+def _blocks(n_per_block=30, n_blocks=4, n_features=20, seed=0):
+    """Các hàng thuộc `n_blocks` nhóm tách biệt rõ, xáo trộn ngẫu nhiên."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=20.0, size=(n_blocks, n_features))
+    labels = np.repeat(np.arange(n_blocks), n_per_block)
+    data = centers[labels] + rng.normal(size=(len(labels), n_features))
+    perm = rng.permutation(len(labels))
+    return data[perm], labels[perm]
+
+
+def _n_runs(labels):
+    """Số đoạn liên tiếp cùng nhãn."""
+    return int(np.count_nonzero(np.diff(labels)) + 1)
+
+
+@pytest.mark.parametrize('mode', ['exact', 'approximate'])
+def test_order_is_permutation_and_groups_blocks(mode):
+    data, labels = _blocks()
+    order, linkage = cluster_order(data, mode=mode, n_clusters=8)
+    assert sorted(order.tolist()) == list(range(len(data)))
+    assert linkage.shape[1] == 4
+    assert _n_runs(labels[order]) == 4
+
+
+def test_exact_matches_scipy():
+    from scipy.cluster.hierarchy import leaves_list, linkage
+
+    data, _ = _blocks()
+    order, link = cluster_order(data, mode='exact', metric='correlation')
+    expected = linkage(data, method='average', metric='correlation')
+    np.testing.assert_allclose(link, expected)
+    np.testing.assert_array_equal(order, leaves_list(expected))
+
+
+def test_approximate_links_centroids_only():
+    data, _ = _blocks()
+    _, linkage = cluster_order(data, mode='approximate', n_clusters=8)
+    assert len(linkage) <= 8 - 1
+
+
+def test_columns_axis():
+    data, labels = _blocks()
+    order, _ = cluster_order(data.T, axis=1, mode='approximate', n_clusters=8)
+    assert _n_runs(labels[order]) == 4
+
+
+def test_auto_switches_on_max_exact():
+    data, _ = _blocks()
+    exact, _ = cluster_order(data, mode='exact')
+    auto_small, _ = cluster_order(data, mode='auto', max_exact=len(data))
+    np.testing.assert_array_equal(auto_small, exact)
+
+    approx, approx_link = cluster_order(data, mode='approximate', n_clusters=8)
+    auto_large, auto_link = cluster_order(data, mode='auto', max_exact=len(data) - 1, n_clusters=8)
+    np.testing.assert_array_equal(auto_large, approx)
+    assert len(auto_link) == len(approx_link)
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        cluster_order(np.zeros((4, 4)), mode='fast')
+    with pytest.raises(ValueError):
+        cluster_order(np.zeros(4))
+
+
+def test_memmap_input(tmp_path):
+    data, labels = _blocks()
+    path = tmp_path / 'data.npy'
+    np.save(path, data)
+    memmap = np.load(path, mmap_mode='r')
+    order, _ = cluster_order(memmap, mode='approximate', n_clusters=8)
+    in_memory, _ = cluster_order(np.array(memmap), mode='approximate', n_clusters=8)
+    np.testing.assert_array_equal(order, in_memory)
+
+
+def test_disk_cache_hit(tmp_path, monkeypatch):
+    data, _ = _blocks()
+    first, _ = cluster_order(data, mode='exact', cache_dir=str(tmp_path))
+    files = list(tmp_path.glob('cluster-*.npz'))
+    assert len(files) == 1
+
+    clear_cluster_cache()  # Chỉ xóa cache trong bộ nhớ
+    monkeypatch.setattr(clustering, '_exact_order', lambda *args: pytest.fail("cache miss"))
+    second, _ = cluster_order(data, mode='exact', cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(first, second)
+
+
+def test_disk_cache_eviction(tmp_path, monkeypatch):
+    data, _ = _blocks()
+    cluster_order(data, mode='exact', cache_dir=str(tmp_path))
+    (old,) = tmp_path.glob('cluster-*.npz')
+    os.utime(old, (0, 0))
+
+    # Quá tuổi: bị xóa ngay ở lần ghi tiếp theo
+    cluster_order(data[:-1], mode='exact', cache_dir=str(tmp_path))
+    assert not old.exists()
+    assert len(list(tmp_path.glob('cluster-*.npz'))) == 1
+
+    # Quá dung lượng: file ít được dùng gần đây nhất bị xóa trước
+    (kept,) = tmp_path.glob('cluster-*.npz')
+    os.utime(kept, (time.time() - 3600, time.time() - 3600))
+    monkeypatch.setattr(clustering, 'DISK_CACHE_MAX_BYTES', kept.stat().st_size + 1024)
+    cluster_order(data[:-2], mode='exact', cache_dir=str(tmp_path))
+    remaining = list(tmp_path.glob('cluster-*.npz'))
+    assert len(remaining) == 1 and remaining[0] != kept
+
+
+def test_clear_ignores_concurrently_removed_files(tmp_path, monkeypatch):
+    data, _ = _blocks()
+    cluster_order(data, mode='exact', cache_dir=str(tmp_path))
+    (path,) = tmp_path.glob('cluster-*.npz')
+
+    import array_io
+    real_remove = os.remove
+
+    def remove_twice(target):
+        real_remove(target)
+        real_remove(target)  # Giả lập một process khác vừa xóa cùng file
+
+    monkeypatch.setattr(array_io.os, 'remove', remove_twice)
+    clear_cluster_cache(str(tmp_path))
+    assert not path.exists()
+    # Thư mục không tồn tại: không làm gì
+    clear_cluster_cache(str(tmp_path / 'missing'))
@@ -0,0 +1,34 @@
+# tests/test_embeddings.py
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from embeddings import _subsample_indices
+
+
+@pytest.mark.parametrize('n_classes, max_samples', [(4, 1000), (300, 1000), (10_000, 1000)])
+def test_stratified_subsample_never_exceeds_cap(n_classes, max_samples):
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, n_classes, size=50_000)
+    indices = _subsample_indices(len(labels), max_samples, labels, rng)
+    assert len(indices) == max_samples
+    assert len(np.unique(indices)) == max_samples
+
+
+def test_stratified_subsample_keeps_proportions_and_rare_classes():
+    labels = np.repeat([0, 1, 2], [9000, 990, 10])
+    indices = _subsample_indices(len(labels), 1000, labels, np.random.default_rng(0))
+    counts = np.bincount(labels[indices], minlength=3)
+    assert counts.sum() == 1000
+    # Một mẫu mỗi lớp được giữ trước, phần còn lại chia theo tỉ lệ
+    assert abs(counts[0] - 900) <= 2 and abs(counts[1] - 99) <= 2 and counts[2] >= 1
+
+
+def test_unlabelled_subsample_is_sorted_and_unique():
+    indices = _subsample_indices(100, 10, None, np.random.default_rng(0))
+    assert len(indices) == 10 and np.all(np.diff(indices) > 0)
@@ -0,0 +1,70 @@
+# tests/test_figure_cache.py
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from figure_cache import cached_template, disable_figure_cache, enable_figure_cache, template_version
+
+calls = []
+
+
+@cached_template
+def fake_template(values, output_path, ax=None):
+    """Template giả: ghi tham số ra file thay vì vẽ."""
+    calls.append(list(values))
+    for path in ([output_path] if isinstance(output_path, str) else output_path):
+        with open(path, 'w') as f:
+            f.write(repr(np.asarray(values).tolist()) + os.path.splitext(path)[1])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    calls.clear()
+    yield enable_figure_cache(str(tmp_path / 'cache'))
+    disable_figure_cache()
+
+
+def test_second_identical_call_is_a_hit(cache, tmp_path):
+    out = str(tmp_path / 'fig.pdf')
+    fake_template(np.arange(3), out)
+    os.remove(out)
+    assert fake_template(np.arange(3), out) is None
+    assert len(calls) == 1 and (cache.hits, cache.misses) == (1, 1)
+    assert open(out).read() == '[0, 1, 2].pdf'
+
+
+def test_changed_data_or_ax_is_a_miss(cache, tmp_path):
+    out = str(tmp_path / 'fig.pdf')
+    fake_template(np.arange(3), out)
+    fake_template(np.arange(4), out)
+    fake_template(np.arange(3), out, ax=object())  # Vẽ vào ax của người gọi: không qua cache
+    assert len(calls) == 3 and cache.misses == 2
+
+
+def test_invalidate_forces_redraw(cache, tmp_path):
+    out = str(tmp_path / 'fig.pdf')
+    fake_template([1], out)
+    cache.invalidate('other_template')
+    fake_template([1], out)
+    cache.invalidate('fake_template')
+    fake_template([1], out)
+    assert len(calls) == 2 and cache.size_bytes() > 0
+
+
+def test_partial_multi_format_hit_counts_one_miss(cache, tmp_path):
+    pdf, svg = str(tmp_path / 'fig.pdf'), str(tmp_path / 'fig.svg')
+    fake_template([1], pdf)
+    fake_template([1], [pdf, svg])
+    assert (cache.hits, cache.misses) == (0, 2)
+    fake_template([1], [pdf, svg])
+    assert (cache.hits, cache.misses) == (1, 2) and len(calls) == 2
+
+
+def test_code_version_is_part_of_the_key(cache):
+    assert template_version(fake_template.__wrapped__) == template_version(fake_template.__wrapped__)
+    assert cache.make_key('t', {'x': 1}, 'v1') != cache.make_key('t', {'x': 1}, 'v2')
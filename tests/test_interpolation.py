@@ -0,0 +1,80 @@
+# tests/test_interpolation.py
+
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+from scipy.interpolate import griddata
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from interpolation import INTERPOLATION_METHODS, ScatteredInterpolator
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 1, 400), rng.uniform(0, 1, 400)
+    return x, y, np.sin(3 * x) + y ** 2
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic', 'nearest'])
+def test_matches_griddata(samples, method):
+    x, y, z = samples
+    xi, yi, zi = ScatteredInterpolator(x, y, method=method)(z, resolution=30)
+    grid_x, grid_y = np.meshgrid(xi, yi)
+    expected = griddata((x, y), z, (grid_x, grid_y), method=method)
+    assert np.allclose(zi, expected, equal_nan=True)
+
+
+@pytest.mark.parametrize('method', INTERPOLATION_METHODS)
+def test_every_method_reproduces_a_plane(samples, method):
+    x, y, _ = samples
+    interp = ScatteredInterpolator(x, y, method=method)
+    xi, yi = np.linspace(0.3, 0.7, 9), np.linspace(0.3, 0.7, 9)
+    zi = interp.interpolate(2 * x + y, xi, yi)
+    grid_x, grid_y = np.meshgrid(xi, yi)
+    tolerance = {'nearest': 0.2, 'idw': 0.1}.get(method, 1e-6)
+    assert np.nanmax(np.abs(zi - (2 * grid_x + grid_y))) < tolerance
+
+
+def test_idw_returns_sample_value_at_sample_point(samples):
+    x, y, z = samples
+    zi = ScatteredInterpolator(x, y, method='idw').interpolate(z, x[:1], y[:1])
+    assert zi[0, 0] == pytest.approx(z[0])
+
+
+def test_linear_is_nan_outside_hull():
+    interp = ScatteredInterpolator([0, 1, 0, 1], [0, 0, 1, 1], method='linear')
+    zi = interp.interpolate(np.array([0.0, 1, 2, 3]), np.array([0.5, 2.0]), np.array([0.5]))
+    assert np.isfinite(zi[0, 0]) and np.isnan(zi[0, 1])
+
+
+def test_multiple_fields_share_weights(samples):
+    x, y, z = samples
+    interp = ScatteredInterpolator(x, y, method='linear')
+    _, _, stacked = interp(np.stack([z, 2 * z]), resolution=20)
+    _, _, single = interp(z, resolution=20)
+    assert stacked.shape == (2, 20, 20)
+    assert np.allclose(stacked[0], single, equal_nan=True)
+    assert np.allclose(stacked[1], 2 * single, equal_nan=True)
+    assert len(interp._grid_weights) == 1
+
+
+def test_rejects_bad_input(samples):
+    x, y, z = samples
+    with pytest.raises(ValueError):
+        ScatteredInterpolator(x, y, method='spline')
+    with pytest.raises(ValueError):
+        ScatteredInterpolator(x, y)(z[:-1])
+
+
+def test_pickle_drops_derived_structures(samples):
+    x, y, z = samples
+    interp = ScatteredInterpolator(x, y, method='linear')
+    interp(z, resolution=10)
+    clone = pickle.loads(pickle.dumps(interp))
+    assert clone._triangulation is None and not clone._grid_weights
+    assert np.allclose(clone(z, resolution=10)[2], interp(z, resolution=10)[2], equal_nan=True)
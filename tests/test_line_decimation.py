@@ -0,0 +1,49 @@
+# tests/test_line_decimation.py
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from plot_templates import _decimate_minmax
+
+
+def _series(n=100_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), rng.normal(size=n).cumsum()
+
+
+def test_keeps_min_max_of_every_bucket_and_endpoints():
+    x, y = _series()
+    xs, ys, band, _ = _decimate_minmax(x, y, None, 500)
+    assert band is None
+    assert len(xs) <= 2 * 500 + 2
+    assert xs[0] == x[0] and xs[-1] == x[-1] and np.all(np.diff(xs) > 0)
+    bucket = np.minimum((x / x[-1] * 500).astype(int), 499)
+    for b in (0, 123, 499):
+        in_bucket = bucket == b
+        assert y[in_bucket].min() in ys and y[in_bucket].max() in ys
+
+
+def test_error_band_envelopes_original_band():
+    x, y = _series(20_000)
+    err = np.abs(np.random.default_rng(1).normal(size=len(x)))
+    xs, ys, (lower, upper), _ = _decimate_minmax(x, y, err, 200)
+    assert np.all(lower <= ys) and np.all(upper >= ys)
+    assert lower.min() == (y - err).min() and upper.max() == (y + err).max()
+
+
+def test_markers_index_into_kept_points():
+    x, y = _series(5_000)
+    xs, _, _, markevery = _decimate_minmax(x, y, None, 100)
+    assert markevery == sorted(set(markevery)) and max(markevery) < len(xs)
+
+
+def test_unsorted_x_is_left_untouched():
+    x = np.array([0.0, 2.0, 1.0, 3.0])
+    y = np.array([1.0, 2.0, 3.0, 4.0])
+    xs, ys, band, markevery = _decimate_minmax(x, y, np.ones(4), 2)
+    assert xs is x and ys is y and markevery == 10
+    assert np.array_equal(band[0], y - 1)
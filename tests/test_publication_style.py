@@ -0,0 +1,32 @@
+# tests/test_publication_style.py
+
+import os
+import sys
+
+import matplotlib
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from publication_style import FONT_FAMILIES, get_publication_style
+
+
+@pytest.mark.parametrize('font_family', FONT_FAMILIES)
+def test_style_is_cached_and_read_only(font_family):
+    style = get_publication_style(font_family)
+    assert get_publication_style(font_family) is style
+    assert style.params['font.family'] == [font_family]
+    with pytest.raises(TypeError):
+        style.params['font.size'] = 12
+
+
+def test_unknown_font_family_rejected():
+    with pytest.raises(ValueError, match='font_family'):
+        get_publication_style('monospace')
+
+
+def test_context_restores_rc_params():
+    with matplotlib.rc_context({'font.size': 7}):
+        with get_publication_style('serif').context():
+            assert matplotlib.rcParams['font.size'] == 10
+        assert matplotlib.rcParams['font.size'] == 7
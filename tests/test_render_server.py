@@ -0,0 +1,102 @@
+# tests/test_render_server.py
+
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from render_server import RenderService, _RenderHandler
+
+DISTRIBUTION = {'template': 'plot_distribution', 'format': 'png',
+                'kwargs': {'data': [0.1, 0.4, 0.4, 0.7, 0.9], 'x_label': 'x', 'title': 'Test',
+                           'show_kde': False}}
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = RenderService(max_workers=2, timeout=60.0)
+    yield service
+    service.shutdown()
+
+
+@pytest.fixture(scope='module')
+def base_url(service):
+    handler = type('RenderHandler', (_RenderHandler,), {'service': service})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_workers_are_warm(service):
+    # Mỗi worker đã nhận đúng một job khởi động: lần render đầu không phải import lại gì
+    assert service.metrics()['workers'] == 2
+    status, data, result = service.render(DISTRIBUTION)
+    assert status == 200
+    assert data.startswith(b'\x89PNG')
+
+
+@pytest.mark.parametrize('job, message', [
+    ({'template': 'plot_distribution', 'format': 'bmp'}, 'format'),
+    ({'format': 'png'}, "'template'"),
+    ({'template': 'plot_missing'}, 'plot_missing'),
+])
+def test_invalid_job_rejected_before_submit(service, job, message):
+    before = service.metrics()
+    status, data, result = service.render(job)
+    assert status == 400 and data is None
+    assert message in result['error']
+    after = service.metrics()
+    assert (after['completed'], after['failed']) == (before['completed'], before['failed'])
+
+
+def test_template_error_maps_to_400_without_traceback(service):
+    job = dict(DISTRIBUTION, kwargs={'x_label': 'x', 'title': 'Missing data'})  # thiếu `data` -> TypeError
+    status, data, result = service.render(job)
+    assert status == 400
+    assert 'TypeError' in result['error']
+    assert 'Traceback' not in result['error']
+
+
+def test_full_queue_rejected(service):
+    max_queue = service.max_queue
+    service.max_queue = 0
+    try:
+        rejected = service.rejected
+        status, _, _ = service.render(DISTRIBUTION)
+        assert status == 503
+        assert service.rejected == rejected + 1
+    finally:
+        service.max_queue = max_queue
+
+
+def _post(url, body):
+    request = urllib.request.Request(url, data=body, method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.headers, exc.read()
+
+
+def test_http_render_and_validation(base_url):
+    status, headers, body = _post(f"{base_url}/render", json.dumps(DISTRIBUTION).encode())
+    assert status == 200 and headers['Content-Type'] == 'image/png'
+
+    status, _, body = _post(f"{base_url}/render", b'{not json')
+    assert status == 400 and 'JSON' in json.loads(body)['error']
+
+    status, _, body = _post(f"{base_url}/render", b'[1, 2]')
+    assert status == 400
+
+    status, _, _ = _post(f"{base_url}/other", b'{}')
+    assert status == 404
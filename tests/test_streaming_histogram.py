@@ -0,0 +1,46 @@
+# tests/test_streaming_histogram.py
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from streaming_histogram import HistogramAccumulator
+
+
+def test_adaptive_histogram_preserves_total_count():
+    # Dữ liệu đến theo nhiều lô: khoảng giá trị được mở rộng dần, min/max rơi vào giữa bin mịn
+    samples = np.random.default_rng(0).lognormal(size=100_000)
+    acc = HistogramAccumulator()
+    for chunk in np.array_split(samples, 10):
+        acc.update(chunk)
+    counts, edges = acc.histogram()
+    assert np.isclose(counts.sum(), len(samples))
+    assert edges[0] == samples.min() and edges[-1] == samples.max()
+
+
+def test_adaptive_histogram_keeps_outlier():
+    acc = HistogramAccumulator(bins=20)
+    acc.update(np.random.default_rng(1).normal(size=10))
+    acc.update([1e6])
+    counts, _ = acc.histogram()
+    assert np.isclose(counts.sum(), 11)
+    assert np.isclose(counts[-1], 1)
+
+
+def test_distribution_without_layers_does_not_take_pooled_figure(tmp_path):
+    from figure_pool import disable_figure_pool, enable_figure_pool
+    from plot_templates import plot_distribution
+
+    pool = enable_figure_pool()
+    try:
+        output = tmp_path / 'empty.png'
+        result = plot_distribution(np.arange(10.0), 'x', 'Empty', str(output),
+                                   show_hist=False, show_kde=False)
+        assert result is None
+        assert not output.exists()
+        assert pool.misses == 0 and len(pool._in_use) == 0
+    finally:
+        disable_figure_pool()